@@ -1,6 +1,4 @@
 import streamlit as st
-import fitz  # PyMuPDF untuk PDF
-import docx
 import nltk
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer, WordNetLemmatizer
@@ -17,98 +15,446 @@ import traceback
 import hashlib
 import pickle
 from functools import lru_cache
+from array import array
+from collections.abc import Sequence
 import os
 import tempfile
 import re
+import io
+import json
+import math
 import sqlite3
-from sklearn.feature_extraction.text import TfidfVectorizer
+import queue
+import heapq
+import bisect
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from collections import Counter, OrderedDict
 from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csr_matrix, csc_matrix
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+from nlp_workers import (TFIDF_DTYPE, WORD_RUN_PATTERN, word_runs, split_sentences,
+                         fit_tfidf, ingest_file, init_worker)
 
 # ===== DATABASE CLASS =====
 
+class _TokenListUnpickler(pickle.Unpickler):
+    """Unpickler for legacy token lists that refuses to import any global"""
+    
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Global {module}.{name} is not allowed in stored tokens")
+
+def _load_legacy_tokens(blob):
+    """Read a pickled token list written by older versions of add_sentences"""
+    try:
+        tokens = _TokenListUnpickler(io.BytesIO(blob)).load()
+    except Exception:
+        return []
+    if not isinstance(tokens, list):
+        return []
+    return [str(token) for token in tokens]
+
+# Pengaturan koneksi SQLite
+DB_POOL_SIZE = 8  # Jumlah maksimum koneksi yang dibuka bersamaan
+DB_BUSY_TIMEOUT = 30  # Detik menunggu lock writer sebelum error
+DB_ACQUIRE_TIMEOUT = 60  # Detik menunggu koneksi pool yang bebas sebelum error
+DB_CACHE_SIZE_KB = 16384  # Page cache per koneksi (PRAGMA cache_size)
+DB_MMAP_SIZE = 256 * 1024 * 1024  # Batas memory-mapped I/O (PRAGMA mmap_size)
+DB_STATEMENT_CACHE = 256  # Prepared statements yang disimpan per koneksi
+DB_FETCH_BATCH = 2000  # Baris per fetchmany saat memuat corpus
+TOKEN_ID_DTYPE = np.dtype('<u4')  # ID term disimpan sebagai uint32 little-endian
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections configured for WAL journaling"""
+    
+    def __init__(self, db_path, max_connections=DB_POOL_SIZE):
+        """Initialize an empty pool, connections are opened on demand"""
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _create_connection(self):
+        """Open a connection and apply the performance pragmas"""
+        # Statements are compiled once per connection and reused from its cache
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # REPLACE deletes conflicting rows; let that fire the FTS delete trigger
+        conn.execute("PRAGMA recursive_triggers = ON")
+        return conn
+    
+    def acquire(self, timeout=DB_ACQUIRE_TIMEOUT):
+        """Take an idle connection, open a new one, or wait for one to be released.
+        
+        Raises:
+            sqlite3.OperationalError: No connection was released within timeout seconds
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            if self._created < self.max_connections:
+                self._created += 1
+                try:
+                    return self._create_connection()
+                except Exception:
+                    self._created -= 1
+                    raise
+        
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No database connection available after {timeout} seconds"
+            ) from None
+    
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
 class DocumentDatabase:
     """Class for managing document database operations"""
     
     def __init__(self, db_path="document_search.db"):
         """Initialize database connection"""
         self.db_path = db_path
+        self.fts_available = False
+        self.pool = ConnectionPool(db_path)
+        # SQLite has a single writer; serialize writers here instead of
+        # spinning on SQLITE_BUSY, readers keep going thanks to WAL
+        self._write_lock = threading.Lock()
+        # In-memory copy of the terms table: {term: id} and id -> term
+        self._term_ids = {}
+        self._terms = np.empty(1, dtype=object)
+        self._terms_lock = threading.Lock()
         self._init_db()
+        self._refresh_terms()
+        self._migrate_pickled_tokens()
+    
+    @contextmanager
+    def _reader(self):
+        """Pooled connection for read-only queries"""
+        with self.pool.connection() as conn:
+            yield conn
+    
+    @contextmanager
+    def _writer(self):
+        """Pooled connection holding the writer lock"""
+        with self._write_lock:
+            with self.pool.connection() as conn:
+                yield conn
     
     def _init_db(self):
         """Initialize database tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # Create documents table
-        c.execute('''CREATE TABLE IF NOT EXISTS documents
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      filename TEXT UNIQUE,
-                      content TEXT,
-                      size INTEGER,
-                      filetype TEXT,
-                      processed BOOLEAN DEFAULT 0,
-                      date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
-        # Create sentences table for indexed sentences
-        c.execute('''CREATE TABLE IF NOT EXISTS sentences
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      doc_id INTEGER,
-                      sentence_idx INTEGER,
-                      sentence TEXT,
-                      processed_tokens TEXT,
-                      FOREIGN KEY (doc_id) REFERENCES documents(id),
-                      UNIQUE(doc_id, sentence_idx))''')
-        
-        # Create search history table
-        c.execute('''CREATE TABLE IF NOT EXISTS search_history
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      keyword TEXT,
-                      results_count INTEGER,
-                      timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
-        conn.commit()
-        conn.close()
+        with self._writer() as conn:
+            c = conn.cursor()
+            
+            # Create documents table
+            c.execute('''CREATE TABLE IF NOT EXISTS documents
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          filename TEXT UNIQUE,
+                          content TEXT,
+                          size INTEGER,
+                          filetype TEXT,
+                          processed BOOLEAN DEFAULT 0,
+                          date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                          content_hash TEXT,
+                          source_id INTEGER REFERENCES documents(id))''')
+            
+            # Databases created before content hashing lack the dedup columns
+            c.execute("PRAGMA table_info(documents)")
+            columns = {row[1] for row in c.fetchall()}
+            for column, column_type in (("content_hash", "TEXT"), ("source_id", "INTEGER")):
+                if column not in columns:
+                    c.execute(f"ALTER TABLE documents ADD COLUMN {column} {column_type}")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_documents_source ON documents(source_id)")
+            
+            # Create sentences table for indexed sentences
+            c.execute('''CREATE TABLE IF NOT EXISTS sentences
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          doc_id INTEGER,
+                          sentence_idx INTEGER,
+                          sentence TEXT,
+                          processed_tokens TEXT,
+                          token_ids BLOB,
+                          stem_ids BLOB,
+                          FOREIGN KEY (doc_id) REFERENCES documents(id),
+                          UNIQUE(doc_id, sentence_idx))''')
+            
+            # Create global term dictionary for the packed token arrays
+            c.execute('''CREATE TABLE IF NOT EXISTS terms
+                         (id INTEGER PRIMARY KEY,
+                          term TEXT UNIQUE NOT NULL)''')
+            
+            # Databases created before the token store keep pickled tokens only
+            c.execute("PRAGMA table_info(sentences)")
+            columns = {row[1] for row in c.fetchall()}
+            for column in ("token_ids", "stem_ids"):
+                if column not in columns:
+                    c.execute(f"ALTER TABLE sentences ADD COLUMN {column} BLOB")
+            
+            # Create table for the precomputed TF-IDF model of each document
+            c.execute('''CREATE TABLE IF NOT EXISTS tfidf_models
+                         (doc_id INTEGER PRIMARY KEY,
+                          vocabulary TEXT,
+                          idf BLOB,
+                          row_ids BLOB,
+                          indptr BLOB,
+                          indices BLOB,
+                          data BLOB,
+                          FOREIGN KEY (doc_id) REFERENCES documents(id))''')
+            
+            # Create search history table
+            c.execute('''CREATE TABLE IF NOT EXISTS search_history
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          keyword TEXT,
+                          results_count INTEGER,
+                          timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+            
+            conn.commit()
+            
+            self.fts_available = self._init_fts(c)
+            conn.commit()
     
-    def add_document(self, filename, content, size, filetype="unknown"):
-        """Add document to database"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+    def _refresh_terms(self, conn=None):
+        """Load terms added since the last refresh into the in-memory dictionary.
+        
+        Args:
+            conn (sqlite3.Connection, optional): Connection the caller already
+                holds; without it a pooled reader is taken, so a caller holding
+                one never waits on the pool for a second connection
+        """
+        with self._terms_lock:
+            known = len(self._terms) - 1
+            query = "SELECT id, term FROM terms WHERE id > ? ORDER BY id"
+            if conn is None:
+                with self._reader() as reader:
+                    rows = reader.execute(query, (known,)).fetchall()
+            else:
+                rows = conn.execute(query, (known,)).fetchall()
+            if not rows:
+                return
+            
+            terms = np.empty(rows[-1][0] + 1, dtype=object)
+            terms[:len(self._terms)] = self._terms
+            for term_id, term in rows:
+                terms[term_id] = term
+                self._term_ids[term] = term_id
+            self._terms = terms
+    
+    def _encode_tokens(self, c, token_lists):
+        """Pack token lists into uint32 term-ID blobs, adding unseen terms.
+        
+        Must run inside the writer transaction; the in-memory dictionary is
+        only updated by _refresh_terms after the transaction commits.
+        """
+        term_ids = self._term_ids
+        new_terms = {token for tokens in token_lists for token in tokens if token not in term_ids}
+        
+        pending = {}
+        if new_terms:
+            new_terms = sorted(new_terms)
+            c.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", [(t,) for t in new_terms])
+            for start in range(0, len(new_terms), 500):
+                chunk = new_terms[start:start + 500]
+                c.execute(
+                    f"SELECT term, id FROM terms WHERE term IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                pending.update(c.fetchall())
         
+        blobs = []
+        for tokens in token_lists:
+            ids = [term_ids.get(token) or pending[token] for token in tokens]
+            blobs.append(np.asarray(ids, dtype=TOKEN_ID_DTYPE).tobytes())
+        return blobs
+    
+    def _decode_tokens(self, blob, conn=None):
+        """Map a packed term-ID blob back to token strings.
+        
+        The blob is viewed in place with np.frombuffer; only the final list
+        of strings is allocated. conn is passed on to _refresh_terms.
+        """
+        if not blob:
+            return []
+        ids = np.frombuffer(blob, dtype=TOKEN_ID_DTYPE)
+        terms = self._terms
+        if ids.max() >= len(terms):
+            # Term ditambahkan oleh proses lain
+            self._refresh_terms(conn)
+            terms = self._terms
+        return terms[ids].tolist()
+    
+    def _migrate_pickled_tokens(self):
+        """Convert legacy pickled processed_tokens rows to the packed format"""
+        with self._reader() as conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM sentences WHERE stem_ids IS NULL AND processed_tokens IS NOT NULL"
+            ).fetchone()[0]
+        if not pending:
+            return
+        
+        with self._writer() as conn:
+            c = conn.cursor()
+            try:
+                rows = c.execute(
+                    "SELECT id, processed_tokens FROM sentences WHERE stem_ids IS NULL AND processed_tokens IS NOT NULL"
+                ).fetchall()
+                token_lists = [_load_legacy_tokens(blob) for _, blob in rows]
+                blobs = self._encode_tokens(c, token_lists)
+                # Older rows only kept stemmed tokens, use them for both columns
+                c.executemany(
+                    "UPDATE sentences SET token_ids = ?, stem_ids = ?, processed_tokens = NULL WHERE id = ?",
+                    [(blob, blob, row[0]) for row, blob in zip(rows, blobs)]
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Error migrating stored tokens: {str(e)}")
+                return
+        
+        self._refresh_terms()
+    
+    def _init_fts(self, c):
+        """Create the FTS5 index over sentences and the triggers that keep it in sync"""
         try:
-            # Check if document already exists
-            c.execute("SELECT id FROM documents WHERE filename = ?", (filename,))
-            existing = c.fetchone()
-            
-            if existing:
-                # Update existing document
-                doc_id = existing[0]
-                c.execute("UPDATE documents SET content = ?, size = ?, filetype = ?, processed = 0 WHERE id = ?",
-                          (content, size, filetype, doc_id))
-                
-                # Delete existing sentences for this document
-                c.execute("DELETE FROM sentences WHERE doc_id = ?", (doc_id,))
-            else:
-                # Insert new document
-                c.execute("INSERT INTO documents (filename, content, size, filetype) VALUES (?, ?, ?, ?)",
-                          (filename, content, size, filetype))
-                doc_id = c.lastrowid
-                
-            conn.commit()
-            return doc_id
-        except Exception as e:
-            conn.rollback()
-            st.error(f"Database error: {str(e)}")
+            c.execute("SELECT 1 FROM sqlite_master WHERE name = 'sentences_fts'")
+            exists = c.fetchone() is not None
+            
+            # External-content table: the text lives only in `sentences`
+            c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS sentences_fts
+                         USING fts5(sentence, content='sentences', content_rowid='id',
+                                    tokenize='unicode61 remove_diacritics 2')''')
+            
+            c.execute('''CREATE TRIGGER IF NOT EXISTS sentences_fts_insert AFTER INSERT ON sentences BEGIN
+                             INSERT INTO sentences_fts(rowid, sentence) VALUES (new.id, new.sentence);
+                         END''')
+            c.execute('''CREATE TRIGGER IF NOT EXISTS sentences_fts_delete AFTER DELETE ON sentences BEGIN
+                             INSERT INTO sentences_fts(sentences_fts, rowid, sentence)
+                             VALUES ('delete', old.id, old.sentence);
+                         END''')
+            c.execute('''CREATE TRIGGER IF NOT EXISTS sentences_fts_update AFTER UPDATE OF sentence ON sentences BEGIN
+                             INSERT INTO sentences_fts(sentences_fts, rowid, sentence)
+                             VALUES ('delete', old.id, old.sentence);
+                             INSERT INTO sentences_fts(rowid, sentence) VALUES (new.id, new.sentence);
+                         END''')
+            
+            # Index sentences stored before the FTS table existed
+            if not exists:
+                c.execute("INSERT INTO sentences_fts(sentences_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5, search falls back to the in-memory index
+            return False
+    
+    def _store_document(self, c, filename, content, size, filetype, content_hash=None, source_id=None):
+        """Insert or replace a document row on an open cursor, return its id.
+        
+        A row with source_id set is a duplicate of that document: it keeps
+        no content, sentences or TF-IDF model of its own.
+        """
+        # Check if document already exists
+        c.execute("SELECT id FROM documents WHERE filename = ?", (filename,))
+        existing = c.fetchone()
+        
+        if existing:
+            # Update existing document
+            doc_id = existing[0]
+            self._detach_duplicates(c, doc_id)
+            c.execute('''UPDATE documents SET content = ?, size = ?, filetype = ?, processed = 0,
+                         content_hash = ?, source_id = ? WHERE id = ?''',
+                      (content, size, filetype, content_hash, source_id, doc_id))
+            
+            # Delete existing sentences and TF-IDF model for this document
+            c.execute("DELETE FROM sentences WHERE doc_id = ?", (doc_id,))
+            c.execute("DELETE FROM tfidf_models WHERE doc_id = ?", (doc_id,))
+        else:
+            # Insert new document
+            c.execute('''INSERT INTO documents (filename, content, size, filetype, content_hash, source_id)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      (filename, content, size, filetype, content_hash, source_id))
+            doc_id = c.lastrowid
+        
+        return doc_id
+    
+    def _detach_duplicates(self, c, doc_id):
+        """Hand the rows of a document over to its oldest duplicate before it is replaced or deleted.
+        
+        The duplicate becomes the owner of the content, sentences and TF-IDF
+        model, and the other duplicates are pointed at it. Returns the new
+        owner's id, or None if the document has no duplicates.
+        """
+        c.execute("SELECT id FROM documents WHERE source_id = ? ORDER BY id LIMIT 1", (doc_id,))
+        row = c.fetchone()
+        if not row:
             return None
-        finally:
-            conn.close()
+        
+        heir_id = row[0]
+        c.execute('''UPDATE documents SET source_id = NULL,
+                     content = (SELECT content FROM documents WHERE id = ?) WHERE id = ?''',
+                  (doc_id, heir_id))
+        c.execute("UPDATE documents SET source_id = ? WHERE source_id = ?", (heir_id, doc_id))
+        c.execute("UPDATE sentences SET doc_id = ? WHERE doc_id = ?", (heir_id, doc_id))
+        c.execute("UPDATE tfidf_models SET doc_id = ? WHERE doc_id = ?", (heir_id, doc_id))
+        return heir_id
+    
+    def add_document(self, filename, content, size, filetype="unknown"):
+        """Add document to database"""
+        with self._writer() as conn:
+            c = conn.cursor()
+            
+            try:
+                doc_id = self._store_document(c, filename, content, size, filetype)
+                conn.commit()
+                return doc_id
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Database error: {str(e)}")
+                return None
     
     def get_document(self, doc_id):
         """Get document by ID"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT id, filename, content, size, filetype FROM documents WHERE id = ?", (doc_id,))
-        doc = c.fetchone()
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT d.id, d.filename, COALESCE(d.content, s.content), d.size, d.filetype
+                         FROM documents d LEFT JOIN documents s ON s.id = d.source_id
+                         WHERE d.id = ?''', (doc_id,))
+            doc = c.fetchone()
         
         if doc:
             return {
@@ -122,11 +468,12 @@ class DocumentDatabase:
     
     def get_document_by_filename(self, filename):
         """Get document by filename"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT id, filename, content, size, filetype FROM documents WHERE filename = ?", (filename,))
-        doc = c.fetchone()
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT d.id, d.filename, COALESCE(d.content, s.content), d.size, d.filetype
+                         FROM documents d LEFT JOIN documents s ON s.id = d.source_id
+                         WHERE d.filename = ?''', (filename,))
+            doc = c.fetchone()
         
         if doc:
             return {
@@ -139,154 +486,476 @@ class DocumentDatabase:
         return None
     
     def get_all_documents(self):
-        """Get all documents"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT id, filename, content, size, filetype FROM documents")
-        docs = c.fetchall()
-        conn.close()
+        """Get all documents (metadata only, content is never read)"""
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, filename, size, filetype FROM documents")
+            docs = c.fetchall()
         
-        return [(doc[0], doc[1], doc[2], doc[3], doc[4]) for doc in docs]
+        return [(doc[0], doc[1], doc[2], doc[3]) for doc in docs]
     
     def get_document_filenames(self):
         """Get all document filenames"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT id, filename FROM documents")
-        docs = c.fetchall()
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, filename FROM documents")
+            docs = c.fetchall()
         
         return {doc[1]: doc[0] for doc in docs}
     
     def delete_document(self, doc_id):
         """Delete document and its sentences"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        try:
-            # Delete sentences first (foreign key constraint)
-            c.execute("DELETE FROM sentences WHERE doc_id = ?", (doc_id,))
+        with self._writer() as conn:
+            c = conn.cursor()
             
-            # Delete document
-            c.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
-            
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            st.error(f"Database error: {str(e)}")
-            return False
-        finally:
-            conn.close()
+            try:
+                # Duplicates of this document keep its rows
+                self._detach_duplicates(c, doc_id)
+                
+                # Delete sentences and TF-IDF model first (foreign key constraint)
+                c.execute("DELETE FROM sentences WHERE doc_id = ?", (doc_id,))
+                c.execute("DELETE FROM tfidf_models WHERE doc_id = ?", (doc_id,))
+                
+                # Delete document
+                c.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+                
+                conn.commit()
+                return True
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Database error: {str(e)}")
+                return False
+    
+    @staticmethod
+    def _split_token_lists(processed_tokens):
+        """Separate surface and stemmed token lists of processed_tokens items"""
+        surface_lists = []
+        stemmed_lists = []
+        for tokens in processed_tokens:
+            if isinstance(tokens, dict):
+                surface_lists.append(tokens.get('tokens', tokens['stemmed']))
+                stemmed_lists.append(tokens['stemmed'])
+            else:
+                surface_lists.append(tokens)
+                stemmed_lists.append(tokens)
+        return surface_lists, stemmed_lists
+    
+    def _store_sentences(self, c, doc_id, sentences, surface_blobs, stemmed_blobs):
+        """Insert encoded sentences on an open cursor and mark the document processed"""
+        # Prepare batch insert
+        data = [
+            (doc_id, sent_idx, sentence, token_blob, stem_blob)
+            for (sent_idx, sentence), token_blob, stem_blob
+            in zip(sentences, surface_blobs, stemmed_blobs)
+        ]
+        
+        # Execute batch insert
+        c.executemany(
+            "INSERT OR REPLACE INTO sentences (doc_id, sentence_idx, sentence, token_ids, stem_ids) VALUES (?, ?, ?, ?, ?)",
+            data
+        )
+        
+        # Mark document as processed
+        c.execute("UPDATE documents SET processed = 1 WHERE id = ?", (doc_id,))
     
     def add_sentences(self, doc_id, sentences, processed_tokens):
-        """Add sentences for a document"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        """Add sentences for a document.
         
-        try:
-            # Prepare batch insert
-            data = []
-            for (sent_idx, sentence), tokens in zip(sentences, processed_tokens):
-                # Convert tokens list to string for storage
-                tokens_str = pickle.dumps(tokens)
-                data.append((doc_id, sent_idx, sentence, tokens_str))
-            
-            # Execute batch insert
-            c.executemany(
-                "INSERT OR REPLACE INTO sentences (doc_id, sentence_idx, sentence, processed_tokens) VALUES (?, ?, ?, ?)",
-                data
-            )
+        processed_tokens holds, per sentence, either a processed_sentences
+        entry ({'tokens': [...], 'stemmed': [...]}) or a plain list of
+        stemmed tokens.
+        """
+        surface_lists, stemmed_lists = self._split_token_lists(processed_tokens)
+        
+        with self._writer() as conn:
+            c = conn.cursor()
             
-            # Mark document as processed
-            c.execute("UPDATE documents SET processed = 1 WHERE id = ?", (doc_id,))
+            try:
+                # Encode tokens as packed term-ID arrays
+                surface_blobs = self._encode_tokens(c, surface_lists)
+                stemmed_blobs = self._encode_tokens(c, stemmed_lists)
+                
+                self._store_sentences(c, doc_id, sentences, surface_blobs, stemmed_blobs)
+                
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Error adding sentences: {str(e)}")
+                return False
+        
+        self._refresh_terms()
+        return True
+    
+    def add_documents_batch(self, records):
+        """Store several processed documents in a single transaction.
+        
+        Each record is a dict with filename, content, size, filetype,
+        sentences and processed_tokens (a list aligned with sentences),
+        and optionally content_hash and tfidf_blobs (see
+        save_tfidf_models). Returns the document ids in record order, or
+        None if the batch was rolled back.
+        """
+        if not records:
+            return []
+        
+        # Encode the tokens of the whole batch in one pass over the terms table
+        surface_lists = []
+        stemmed_lists = []
+        for record in records:
+            surface, stemmed = self._split_token_lists(record['processed_tokens'])
+            surface_lists.extend(surface)
+            stemmed_lists.extend(stemmed)
+        
+        with self._writer() as conn:
+            c = conn.cursor()
             
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            st.error(f"Error adding sentences: {str(e)}")
-            return False
-        finally:
-            conn.close()
+            try:
+                surface_blobs = self._encode_tokens(c, surface_lists)
+                stemmed_blobs = self._encode_tokens(c, stemmed_lists)
+                
+                doc_ids = []
+                offset = 0
+                for record in records:
+                    doc_id = self._store_document(c, record['filename'], record['content'],
+                                                  record['size'], record['filetype'],
+                                                  record.get('content_hash'))
+                    end = offset + len(record['sentences'])
+                    self._store_sentences(c, doc_id, record['sentences'],
+                                          surface_blobs[offset:end], stemmed_blobs[offset:end])
+                    if record.get('tfidf_blobs'):
+                        self._store_tfidf(c, doc_id, record['tfidf_blobs'])
+                    doc_ids.append(doc_id)
+                    offset = end
+                
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Error adding documents: {str(e)}")
+                return None
+        
+        self._refresh_terms()
+        return doc_ids
+    
+    def add_duplicate_documents(self, records):
+        """Store documents whose content is already in the database in a single transaction.
+        
+        Each record is a dict with filename, size, filetype, content_hash and
+        source_id, the id of the stored document with the same content. The
+        new rows share that document's content, sentences and TF-IDF model.
+        Returns the document ids in record order, or None if the batch was
+        rolled back.
+        """
+        if not records:
+            return []
+        
+        with self._writer() as conn:
+            c = conn.cursor()
+            
+            try:
+                doc_ids = []
+                for record in records:
+                    doc_id = self._store_document(c, record['filename'], None, record['size'],
+                                                  record['filetype'], record['content_hash'],
+                                                  record['source_id'])
+                    c.execute("UPDATE documents SET processed = 1 WHERE id = ?", (doc_id,))
+                    doc_ids.append(doc_id)
+                
+                conn.commit()
+                return doc_ids
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Error adding documents: {str(e)}")
+                return None
+    
+    def get_content_hashes(self):
+        """Get {filename: content_hash} of every document"""
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT filename, content_hash FROM documents")
+            return dict(c.fetchall())
+    
+    def find_documents_by_hash(self, content_hashes):
+        """Get {content_hash: doc_id} of the processed documents that own the given contents"""
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT content_hash, MIN(id) FROM documents
+                         WHERE processed = 1 AND source_id IS NULL
+                           AND content_hash IN (SELECT value FROM json_each(?))
+                         GROUP BY content_hash''',
+                      (json.dumps(list(content_hashes)),))
+            return dict(c.fetchall())
     
     def get_document_sentences(self, doc_id):
         """Get all sentences for a document"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT sentence_idx, sentence, processed_tokens FROM sentences WHERE doc_id = ? ORDER BY sentence_idx", 
-                  (doc_id,))
-        sentences = c.fetchall()
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT sentence_idx, sentence, token_ids, stem_ids FROM sentences
+                         WHERE doc_id = (SELECT COALESCE(source_id, id) FROM documents WHERE id = ?)
+                         ORDER BY sentence_idx''', (doc_id,))
+            sentences = c.fetchall()
         
         # Convert back to the format used by the search engine
         result_sentences = []
         processed_tokens = {}
         
-        for sent_idx, sentence, tokens_str in sentences:
+        for sent_idx, sentence, token_blob, stem_blob in sentences:
             result_sentences.append((sent_idx, sentence))
-            processed_tokens[sent_idx] = pickle.loads(tokens_str)
+            processed_tokens[sent_idx] = {
+                'tokens': self._decode_tokens(token_blob),
+                'stemmed': self._decode_tokens(stem_blob),
+                'length': len(sentence.split())
+            }
         
         return result_sentences, processed_tokens
     
+    def count_processed_sentences(self, doc_ids=None):
+        """Count the sentences iter_corpus would yield"""
+        with self._reader() as conn:
+            c = conn.cursor()
+            if doc_ids is None:
+                c.execute('''SELECT COUNT(*) FROM sentences s
+                             JOIN documents d ON d.id = s.doc_id WHERE d.processed = 1''')
+            else:
+                c.execute('''SELECT COUNT(*) FROM sentences s
+                             JOIN documents d ON d.id = s.doc_id
+                             WHERE d.processed = 1 AND d.id IN (SELECT value FROM json_each(?))''',
+                          (json.dumps(list(doc_ids)),))
+            return c.fetchone()[0]
+    
+    def iter_corpus(self, doc_ids=None, batch_size=DB_FETCH_BATCH):
+        """Stream every processed document with its sentences in one ordered cursor.
+        
+        Args:
+            doc_ids (iterable, optional): Restrict loading to these document IDs
+            batch_size (int): Rows pulled per fetchmany call
+            
+        Yields:
+            tuple: (doc_id, filename, sentences, processed_tokens) with the same
+                shapes as get_document_sentences, one document at a time
+        """
+        query = '''SELECT d.id, d.filename, s.sentence_idx, s.sentence, s.token_ids, s.stem_ids
+                   FROM documents d JOIN sentences s ON s.doc_id = d.id
+                   WHERE d.processed = 1'''
+        params = ()
+        if doc_ids is not None:
+            query += " AND d.id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(list(doc_ids)),)
+        query += " ORDER BY d.id, s.sentence_idx"
+        
+        with self._reader() as conn:
+            # Term baru dibaca lewat koneksi yang sama, tidak mengambil koneksi kedua dari pool
+            self._refresh_terms(conn)
+            c = conn.cursor()
+            c.execute(query, params)
+            
+            current_id = None
+            current_name = None
+            sentences = []
+            processed_tokens = {}
+            
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                
+                for doc_id, filename, sent_idx, sentence, token_blob, stem_blob in rows:
+                    if doc_id != current_id:
+                        if current_id is not None:
+                            yield current_id, current_name, sentences, processed_tokens
+                        current_id = doc_id
+                        current_name = filename
+                        sentences = []
+                        processed_tokens = {}
+                    
+                    sentences.append((sent_idx, sentence))
+                    processed_tokens[sent_idx] = {
+                        'tokens': self._decode_tokens(token_blob, conn),
+                        'stemmed': self._decode_tokens(stem_blob, conn),
+                        'length': len(sentence.split())
+                    }
+            
+            if current_id is not None:
+                yield current_id, current_name, sentences, processed_tokens
+    
+    TFIDF_COLUMNS = ("vocabulary", "idf", "row_ids", "indptr", "indices", "data")
+    
+    def _store_tfidf(self, c, doc_id, blobs):
+        """Insert or replace the TF-IDF model of a document on an open cursor"""
+        c.execute(
+            f"INSERT OR REPLACE INTO tfidf_models (doc_id, {', '.join(self.TFIDF_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (doc_id,) + tuple(blobs[column] for column in self.TFIDF_COLUMNS)
+        )
+    
+    def save_tfidf_models(self, models):
+        """Persist TF-IDF models given as {doc_id: {column: value}}.
+        
+        vocabulary is a JSON list of terms in column order; the other
+        columns are raw little-endian NumPy buffers.
+        """
+        if not models:
+            return True
+        
+        with self._writer() as conn:
+            c = conn.cursor()
+            
+            try:
+                for doc_id, blobs in models.items():
+                    self._store_tfidf(c, doc_id, blobs)
+                conn.commit()
+                return True
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Error saving TF-IDF models: {str(e)}")
+                return False
+    
+    def get_tfidf_models(self, doc_ids=None):
+        """Get stored TF-IDF models as {doc_id: {column: value}}"""
+        query = f"SELECT doc_id, {', '.join(self.TFIDF_COLUMNS)} FROM tfidf_models"
+        params = ()
+        if doc_ids is not None:
+            query += " WHERE doc_id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(list(doc_ids)),)
+        
+        with self._reader() as conn:
+            rows = conn.execute(query, params).fetchall()
+        
+        return {row[0]: dict(zip(self.TFIDF_COLUMNS, row[1:])) for row in rows}
+    
+    def get_document_content(self, doc_id):
+        """Get only the content of a document"""
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT COALESCE(d.content, s.content)
+                         FROM documents d LEFT JOIN documents s ON s.id = d.source_id
+                         WHERE d.id = ?''', (doc_id,))
+            row = c.fetchone()
+        
+        return row[0] if row else None
+    
+    def get_documents_metadata(self, doc_ids):
+        """Get {doc_id: (filename, size, content_length, source_id)} without reading content"""
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT d.id, d.filename, d.size, length(COALESCE(d.content, s.content)), d.source_id
+                         FROM documents d LEFT JOIN documents s ON s.id = d.source_id
+                         WHERE d.id IN (SELECT value FROM json_each(?))''',
+                      (json.dumps(list(doc_ids)),))
+            return {row[0]: (row[1], row[2], row[3] or 0, row[4]) for row in c.fetchall()}
+    
+    def get_sentences_by_filename(self, filename):
+        """Get (sentence_idx, sentence) pairs of a document without loading its tokens"""
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT s.sentence_idx, s.sentence FROM sentences s
+                         JOIN documents d ON s.doc_id = COALESCE(d.source_id, d.id)
+                         WHERE d.filename = ? ORDER BY s.sentence_idx''', (filename,))
+            sentences = c.fetchall()
+        
+        return [(s[0], s[1]) for s in sentences]
+    
+    @staticmethod
+    def _fts_query(keyword, mode):
+        """Build an FTS5 MATCH expression with every term quoted as a literal"""
+        terms = re.findall(r'\w+', keyword.lower())
+        if not terms:
+            return None
+        
+        if mode == "phrase":
+            return '"' + " ".join(terms) + '"'
+        
+        quoted = ['"' + term + '"' for term in terms]
+        if mode == "all":
+            return " AND ".join(quoted)
+        return " OR ".join(quoted)
+    
+    def search_sentences_fts(self, keyword, mode="ranked", limit=None):
+        """Retrieve candidate sentences straight from the FTS5 index.
+        
+        Args:
+            keyword (str): The search query
+            mode (str): "phrase" for the exact phrase, "all" for sentences that
+                contain every term, "ranked" for any term
+            limit (int, optional): Maximum number of sentences to return,
+                defaults to MAX_SENTENCES_FOR_DISPLAY
+            
+        Returns:
+            dict: {filename: [(sentence_idx, sentence)]} ordered by bm25() rank
+        """
+        if not self.fts_available:
+            return {}
+        
+        match_query = self._fts_query(keyword, mode)
+        if not match_query:
+            return {}
+        
+        if limit is None:
+            limit = MAX_SENTENCES_FOR_DISPLAY
+        
+        with self._reader() as conn:
+            c = conn.cursor()
+            
+            try:
+                c.execute('''SELECT d.filename, s.sentence_idx, s.sentence
+                             FROM sentences_fts
+                             JOIN sentences s ON s.id = sentences_fts.rowid
+                             JOIN documents d ON d.id = s.doc_id OR d.source_id = s.doc_id
+                             WHERE sentences_fts MATCH ?
+                             ORDER BY bm25(sentences_fts)
+                             LIMIT ?''', (match_query, limit))
+                rows = c.fetchall()
+            except sqlite3.OperationalError as e:
+                st.error(f"Full-text search error: {str(e)}")
+                rows = []
+        
+        results = {}
+        for filename, sent_idx, sentence in rows:
+            results.setdefault(filename, []).append((sent_idx, sentence))
+        return results
+    
     def get_all_processed_documents(self):
         """Get all documents that have been processed"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT id, filename FROM documents WHERE processed = 1")
-        docs = c.fetchall()
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, filename FROM documents WHERE processed = 1")
+            docs = c.fetchall()
         
         return {doc[1]: doc[0] for doc in docs}
     
     def add_search_history(self, keyword, results_count):
         """Add search to history"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        try:
-            c.execute("INSERT INTO search_history (keyword, results_count) VALUES (?, ?)",
-                      (keyword, results_count))
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
+        with self._writer() as conn:
+            c = conn.cursor()
+            
+            try:
+                c.execute("INSERT INTO search_history (keyword, results_count) VALUES (?, ?)",
+                          (keyword, results_count))
+                conn.commit()
+                return True
+            except Exception as e:
+                conn.rollback()
+                return False
     
     def get_search_history(self, limit=10):
         """Get recent search history"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT keyword, results_count, timestamp FROM search_history ORDER BY timestamp DESC LIMIT ?", (limit,))
-        history = c.fetchall()
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT keyword, results_count, timestamp FROM search_history ORDER BY timestamp DESC LIMIT ?", (limit,))
+            history = c.fetchall()
         
         return [(h[0], h[1], h[2]) for h in history]
     
     def get_document_stats(self):
         """Get document database statistics"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # Get total document count
-        c.execute("SELECT COUNT(*) FROM documents")
-        total_documents = c.fetchone()[0]
-        
-        # Get processed document count
-        c.execute("SELECT COUNT(*) FROM documents WHERE processed = 1")
-        processed_documents = c.fetchone()[0]
-        
-        # Get total size
-        c.execute("SELECT SUM(size) FROM documents")
-        total_size = c.fetchone()[0] or 0
-        
-        # Get sentence count
-        c.execute("SELECT COUNT(*) FROM sentences")
-        total_sentences = c.fetchone()[0]
-        
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            
+            # Get all counters in a single statement
+            c.execute('''SELECT (SELECT COUNT(*) FROM documents),
+                                (SELECT COUNT(*) FROM documents WHERE processed = 1),
+                                (SELECT SUM(size) FROM documents),
+                                (SELECT COUNT(*) FROM sentences)''')
+            total_documents, processed_documents, total_size, total_sentences = c.fetchone()
+            total_size = total_size or 0
         
         return {
             "total_documents": total_documents,
@@ -297,25 +966,208 @@ class DocumentDatabase:
 
     def get_recent_documents(self, limit=5):
         """Get recently added documents"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT id, filename, size, date_added FROM documents ORDER BY date_added DESC LIMIT ?", (limit,))
-        docs = c.fetchall()
-        conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, filename, size, date_added FROM documents ORDER BY date_added DESC LIMIT ?", (limit,))
+            docs = c.fetchall()
         
         return [(doc[0], doc[1], doc[2], doc[3]) for doc in docs]
 
-# Initialize database
-db = DocumentDatabase()
+# Initialize database once per process so every session shares the connection pool
+@st.cache_resource
+def get_database():
+    return DocumentDatabase()
+
+db = get_database()
+
+class LazyDocument:
+    """Document handle kept in session state; content is read from the database on demand"""
+    
+    __slots__ = ("database", "doc_id", "filename", "size", "content_length")
+    
+    def __init__(self, database, doc_id, filename, size=0, content_length=0):
+        self.database = database
+        self.doc_id = doc_id
+        self.filename = filename
+        self.size = size
+        self.content_length = content_length
+    
+    @property
+    def content(self):
+        """Fetch the full text, never cached in session state"""
+        return self.database.get_document_content(self.doc_id) or ""
+    
+    def __len__(self):
+        return self.content_length
+    
+    def __str__(self):
+        return self.content
+
+# ===== INDEKS CORPUS BERSAMA =====
+
+# Struktur index yang dibagikan ke semua sesi, sesuai nama atribut session state
+CORPUS_PUBLISH_BATCH = 100  # Dokumen per snapshot baru saat memuat dari database
+CORPUS_FIELDS = (
+    "doc_texts",            # {filename: LazyDocument}
+    "split_texts",          # {filename: SentenceStore [(idx, sentence)]}
+    "sentence_index",       # {filename: PostingsIndex}
+    "processed_sentences",  # {filename: {idx: {'tokens': [], 'stemmed': [], 'length': n}}}
+    "bm25_index",           # {filename: BM25Index}
+    "tfidf_index",          # {filename: TfidfIndex}
+    "file_stats",           # {filename: {'size': size, 'sentences': count, 'words': count}}
+)
+
+class CorpusSnapshot:
+    """Read-only view of the corpus index at one version.
+    
+    A snapshot is never mutated after it is published; writers build a new
+    snapshot that shares every untouched per-file entry with the old one.
+    """
+    
+    __slots__ = CORPUS_FIELDS + (
+        "version", "processed_files", "_statistics", "_statistics_base", "_statistics_lock",
+    )
+    
+    def __init__(self, version=0, statistics_base=None, **fields):
+        self.version = version
+        for name in CORPUS_FIELDS:
+            setattr(self, name, fields.get(name, {}))
+        self.processed_files = frozenset(self.split_texts)
+        self._statistics = None
+        # (snapshot sebelumnya, BM25Index yang dihapus, file yang ditambah)
+        self._statistics_base = statistics_base
+        self._statistics_lock = threading.Lock()
+    
+    def statistics(self):
+        """Collection-wide CorpusStatistics, built once per snapshot on first use"""
+        with self._statistics_lock:
+            if self._statistics is None:
+                if self._statistics_base is not None:
+                    previous, removed, added = self._statistics_base
+                    self._statistics = CorpusStatistics.updated(
+                        previous.statistics(), self.bm25_index, removed, added
+                    )
+                else:
+                    self._statistics = CorpusStatistics(self.bm25_index)
+                self._statistics_base = None
+            return self._statistics
+
+class SharedCorpusIndex:
+    """Process-wide, copy-on-write corpus index shared by all Streamlit sessions"""
+    
+    def __init__(self):
+        self._snapshot = CorpusSnapshot()
+        self._lock = threading.Lock()
+        # Held while loading from the database so only one session does it
+        self.loading_lock = threading.Lock()
+    
+    def snapshot(self):
+        """Current snapshot; safe to read without locking"""
+        return self._snapshot
+    
+    @property
+    def version(self):
+        return self._snapshot.version
+    
+    def _publish(self, update):
+        """Copy the per-file dictionaries, apply update and swap the snapshot in.
+        
+        Per-file structures are never modified in place, so only the files
+        whose BM25Index object changed have to be re-counted in the
+        collection-wide statistics. When the current snapshot has (or is
+        building) statistics, the new ones are derived from them in a
+        background thread so the next whole-corpus query does not wait.
+        """
+        with self._lock:
+            current = self._snapshot
+            fields = {name: dict(getattr(current, name)) for name in CORPUS_FIELDS}
+            update(fields)
+            
+            statistics_base = None
+            # Base dibaca lebih dulu: statistics() mengisi _statistics sebelum mengosongkan base
+            if current._statistics_base is not None or current._statistics is not None:
+                old_bm25 = current.bm25_index
+                new_bm25 = fields["bm25_index"]
+                removed = [file_bm25 for file, file_bm25 in old_bm25.items() if new_bm25.get(file) is not file_bm25]
+                added = [file for file, file_bm25 in new_bm25.items() if old_bm25.get(file) is not file_bm25]
+                statistics_base = (current, removed, added)
+            
+            self._snapshot = CorpusSnapshot(current.version + 1, statistics_base, **fields)
+            snapshot = self._snapshot
+        
+        if statistics_base is not None:
+            threading.Thread(target=snapshot.statistics, daemon=True).start()
+        return snapshot
+    
+    def add_documents(self, entries):
+        """Add or replace documents.
+        
+        Args:
+            entries (dict): {filename: {field: value}} with one value per CORPUS_FIELDS name
+        """
+        if not entries:
+            return self._snapshot
+        
+        def update(fields):
+            for filename, entry in entries.items():
+                for name in CORPUS_FIELDS:
+                    fields[name][filename] = entry[name]
+        
+        return self._publish(update)
+    
+    def remove_documents(self, filenames):
+        """Remove documents from every structure"""
+        def update(fields):
+            for filename in filenames:
+                for name in CORPUS_FIELDS:
+                    fields[name].pop(filename, None)
+        
+        return self._publish(update)
+    
+    def clear(self):
+        """Drop every document"""
+        return self._publish(lambda fields: fields.update({name: {} for name in CORPUS_FIELDS}))
+
+@st.cache_resource
+def get_shared_corpus():
+    return SharedCorpusIndex()
+
+corpus = get_shared_corpus()
+
+def bind_corpus_snapshot():
+    """Point this session's index attributes at the current shared snapshot.
+    
+    Session state only holds references, so memory does not grow with the
+    number of sessions. The structures must be treated as read-only; use
+    the SharedCorpusIndex methods to change them.
+    """
+    snapshot = corpus.snapshot()
+    if st.session_state.get("corpus_version") != snapshot.version:
+        for name in CORPUS_FIELDS:
+            setattr(st.session_state, name, getattr(snapshot, name))
+        st.session_state.processed_files = snapshot.processed_files
+        st.session_state.corpus_version = snapshot.version
+    return snapshot
 
 # ===== KONFIGURASI DAN PENGATURAN AWAL =====
 
 # Konfigurasi untuk caching
 CACHE_DIR = os.path.join(tempfile.gettempdir(), "doc_search_cache")
 os.makedirs(CACHE_DIR, exist_ok=True)
+CACHE_DB_PATH = os.path.join(CACHE_DIR, "cache.sqlite3")  # Satu file untuk semua entri cache
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Batas ukuran nilai yang disimpan sebelum eviksi LRU
+CACHE_EVICT_TARGET = 0.9  # Eviksi sampai ukuran turun ke fraksi ini dari batas
+CACHE_DEFAULT_TTL = 7 * 24 * 3600  # Detik sebelum entri kedaluwarsa
+CACHE_TTLS = {"sentences": 30 * 24 * 3600}  # TTL per namespace (prefix kunci)
+CACHE_TOUCH_BATCH = 256  # Akses yang dikumpulkan sebelum last_access ditulis
+CACHE_POOL_SIZE = 4  # Koneksi SQLite maksimum untuk disk cache
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024  # Batas LRU di memori (nilai ter-pickle) di depan disk cache
+CACHE_WRITE_BATCH = 128  # Entri per transaksi writer background
+CACHE_WRITE_QUEUE = 4096  # Entri yang boleh menunggu ditulis ke disk
 
 # Konstanta untuk optimasi
 MAX_WORKERS = min(32, os.cpu_count() + 4)  # Jumlah optimal worker threads
+PROCESS_WORKERS = os.cpu_count() or 1  # Jumlah worker proses untuk pekerjaan CPU-bound
 CHUNK_SIZE = 1000  # Ukuran chunk untuk pembagian dokumen besar
 MAX_SYNONYM_CACHE_SIZE = 10000  # Batasan ukuran cache sinonim
 MAX_SENTENCES_FOR_DISPLAY = 100  # Batasan jumlah kalimat untuk ditampilkan
@@ -416,24 +1268,8 @@ INDONESIAN_STOP_WORDS = set([
     "walau", "walaupun", "wong", "yaitu", "yakin", "yakni", "yang"
 ])
 
-# Inisialisasi session state untuk menyimpan data dokumen
-if 'doc_texts' not in st.session_state:
-    st.session_state.doc_texts = {}  # {filename: text}
-
-if 'split_texts' not in st.session_state:
-    st.session_state.split_texts = {}  # {filename: [(idx, sentence)]}
-
-if 'processed_files' not in st.session_state:
-    st.session_state.processed_files = set()  # Set berisi nama file yang sudah diproses
-
-if 'sentence_index' not in st.session_state:
-    st.session_state.sentence_index = {}  # {filename: {word: [idx1, idx2, ...]}}
-
-if 'processed_sentences' not in st.session_state:
-    st.session_state.processed_sentences = {}  # {filename: {idx: {'tokens': [], 'stemmed': []}}}
-
-if 'file_stats' not in st.session_state:
-    st.session_state.file_stats = {}  # {filename: {'size': size, 'sentences': count, 'words': count}}
+# Inisialisasi session state untuk menyimpan data dokumen (referensi ke index bersama)
+bind_corpus_snapshot()
 
 # Inisialisasi bahasa untuk stopwords
 if 'stopwords_language' not in st.session_state:
@@ -446,43 +1282,401 @@ def get_file_hash(file_content):
     """Menghasilkan hash untuk isi file sebagai kunci cache"""
     return hashlib.md5(file_content).hexdigest()
 
+HASH_CHUNK_SIZE = 1024 * 1024  # Byte per potongan saat menghitung hash isi file
+
+def get_content_hash(file_obj, chunk_size=HASH_CHUNK_SIZE):
+    """Hash BLAKE2b isi file unggahan, dibaca per potongan agar file besar tidak disalin utuh"""
+    hasher = hashlib.blake2b(digest_size=32)
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+        hasher.update(chunk)
+    file_obj.seek(0)
+    return hasher.hexdigest()
+
 def cache_key(prefix, *args):
     """Membuat kunci cache dengan prefix dan argumen"""
     key_parts = [str(arg) for arg in args]
     return f"{prefix}_{'_'.join(key_parts)}"
 
-def save_to_cache(key, data):
-    """Menyimpan data ke cache file"""
-    try:
-        cache_path = os.path.join(CACHE_DIR, f"{key}.pickle")
-        with open(cache_path, 'wb') as f:
-            pickle.dump(data, f)
-        return True
-    except:
-        return False
+EVAL_CACHE_VERSION = 1  # Naikkan saat algoritma ROUGE/METEOR/evaluasi berubah agar entri lama tidak terpakai
 
-def load_from_cache(key):
-    """Memuat data dari cache file"""
-    try:
-        cache_path = os.path.join(CACHE_DIR, f"{key}.pickle")
-        if os.path.exists(cache_path):
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
-    except:
-        pass
-    return None
+_stopwords_fingerprint = (None, None)  # ((id, jumlah) stop_words, digest) terakhir
 
-# Fungsi untuk download NLTK resources dengan pengecekan error dan caching
-@st.cache_resource
-def download_nltk_resources():
-    try:
-        # Cek apakah resources sudah diunduh sebelumnya
-        try:
-            # Mengakses stopwords untuk verifikasi
-            _ = stopwords.words("english")
-            # Jika no error, stopwords sudah terinstal
-        except LookupError:
-            # Jika error, download resources
+def stopwords_fingerprint():
+    """Hash pendek dari stopwords aktif, berubah bersama bahasa stopwords"""
+    global _stopwords_fingerprint
+    key = (id(stop_words), len(stop_words))
+    if _stopwords_fingerprint[0] != key:
+        digest = hashlib.blake2b("\n".join(sorted(stop_words)).encode("utf-8"), digest_size=8).hexdigest()
+        _stopwords_fingerprint = (key, digest)
+    return _stopwords_fingerprint[1]
+
+def evaluation_cache_key(prefix, *parts):
+    """Kunci cache evaluasi yang sama di semua proses, replika dan deploy.
+    
+    BLAKE2b atas versi algoritma, stopwords aktif dan input yang sudah
+    dinormalisasi; hash() bawaan Python diacak per proses (PYTHONHASHSEED)
+    sehingga tidak bisa dipakai untuk cache persisten.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    for part in (EVAL_CACHE_VERSION, stopwords_fingerprint()) + parts:
+        data = str(part).encode("utf-8")
+        hasher.update(len(data).to_bytes(8, "little"))
+        hasher.update(data)
+    return f"{prefix}_{hasher.hexdigest()}"
+
+class DiskCache:
+    """Bounded persistent cache in a single SQLite file.
+    
+    Keys are grouped into namespaces by their prefix (sentences_, rouge_,
+    meteor_, eval_). Entries expire after the TTL of their namespace, and
+    once the stored values exceed max_bytes the least recently used ones
+    are evicted. Hit and miss counters are kept per namespace for the
+    lifetime of the process.
+    """
+
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES, ttls=None):
+        """Open (or create) the cache file"""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self.pool = ConnectionPool(path, max_connections=CACHE_POOL_SIZE)
+        self._write_lock = threading.Lock()
+        # Statistik per proses: {namespace: count}
+        self._stats_lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+        # Akses yang belum ditulis ke last_access: {(namespace, key): timestamp}
+        self._touched = {}
+        
+        with self._writer() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS cache_entries
+                            (namespace TEXT NOT NULL,
+                             key TEXT NOT NULL,
+                             value BLOB,
+                             size INTEGER,
+                             expires_at REAL,
+                             last_access REAL,
+                             PRIMARY KEY (namespace, key))''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access)")
+            conn.commit()
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+    
+    @contextmanager
+    def _reader(self):
+        """Pooled connection for lookups"""
+        with self.pool.connection() as conn:
+            yield conn
+    
+    @contextmanager
+    def _writer(self):
+        """Pooled connection holding the writer lock"""
+        with self._write_lock:
+            with self.pool.connection() as conn:
+                yield conn
+    
+    @staticmethod
+    def split_key(key):
+        """Namespace is the key prefix up to the first underscore"""
+        namespace, separator, name = key.partition("_")
+        if not separator:
+            return "default", key
+        return namespace, name
+    
+    def expiry(self, key, ttl=None, now=None):
+        """Expiry timestamp for a new entry; ttl in seconds overrides the namespace TTL (0 = never)"""
+        if ttl is None:
+            ttl = self.ttls.get(self.split_key(key)[0], CACHE_DEFAULT_TTL)
+        if not ttl:
+            return None
+        return (time.time() if now is None else now) + ttl
+    
+    def get_blob(self, key):
+        """Return (pickled value, expires_at), or None on a miss or an expired entry"""
+        namespace, name = self.split_key(key)
+        now = time.time()
+        with self._reader() as conn:
+            row = conn.execute("SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                               (namespace, name)).fetchone()
+        
+        with self._stats_lock:
+            if row is None or (row[1] is not None and row[1] <= now):
+                self.misses[namespace] += 1
+                return None
+            self.hits[namespace] += 1
+            self._touched[(namespace, name)] = now
+            flush = len(self._touched) >= CACHE_TOUCH_BATCH
+        
+        # Recency is written in batches so a hit does not cost a write transaction
+        if flush:
+            with self._writer() as conn:
+                self._flush_touches(conn)
+                conn.commit()
+        return row
+    
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry"""
+        entry = self.get_blob(key)
+        if entry is None:
+            return None
+        try:
+            return pickle.loads(entry[0])
+        except Exception:
+            return None
+    
+    def set_blobs(self, entries):
+        """Store already pickled values given as (key, blob, expires_at) in one transaction"""
+        now = time.time()
+        rows = []
+        for key, blob, expires_at in entries:
+            namespace, name = self.split_key(key)
+            rows.append((namespace, name, blob, len(blob), expires_at, now))
+        if not rows:
+            return True
+        
+        with self._writer() as conn:
+            conn.executemany('''INSERT OR REPLACE INTO cache_entries
+                                (namespace, key, value, size, expires_at, last_access)
+                                VALUES (?, ?, ?, ?, ?, ?)''', rows)
+            # Perkiraan (entri yang ditimpa tidak dikurangi); dihitung ulang saat eviksi
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn, now)
+            conn.commit()
+        return True
+    
+    def set(self, key, value, ttl=None):
+        """Store a value; ttl in seconds overrides the namespace TTL (0 = never expires)"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return self.set_blobs([(key, blob, self.expiry(key, ttl))])
+    
+    def _flush_touches(self, conn):
+        """Write the batched access times on an open writer connection"""
+        with self._stats_lock:
+            touched, self._touched = self._touched, {}
+        conn.executemany("UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                         [(timestamp, namespace, name) for (namespace, name), timestamp in touched.items()])
+    
+    def _evict(self, conn, now):
+        """Drop expired entries, then least recently used ones down to CACHE_EVICT_TARGET of max_bytes"""
+        self._flush_touches(conn)
+        evicted = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)).rowcount
+        
+        # Keep the most recently used entries whose cumulative size fits the target
+        evicted += conn.execute('''DELETE FROM cache_entries WHERE rowid IN (
+                                       SELECT entry_id FROM (
+                                           SELECT rowid AS entry_id,
+                                                  SUM(size) OVER (ORDER BY last_access DESC, rowid DESC) AS kept
+                                           FROM cache_entries)
+                                       WHERE kept > ?)''',
+                                  (int(self.max_bytes * CACHE_EVICT_TARGET),)).rowcount
+        
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        with self._stats_lock:
+            self.evictions += evicted
+    
+    def clear(self):
+        """Remove every entry; hit and miss counters are kept"""
+        with self._writer() as conn:
+            conn.execute("DELETE FROM cache_entries")
+            conn.commit()
+            self._total_bytes = 0
+        with self._stats_lock:
+            self._touched = {}
+    
+    def stats(self):
+        """Return {namespace: {'entries', 'bytes', 'hits', 'misses'}} plus totals under 'total'"""
+        with self._reader() as conn:
+            rows = conn.execute('''SELECT namespace, COUNT(*), COALESCE(SUM(size), 0)
+                                   FROM cache_entries GROUP BY namespace''').fetchall()
+        
+        stats = {}
+        for namespace, entries, size in rows:
+            stats[namespace] = {'entries': entries, 'bytes': size, 'hits': 0, 'misses': 0}
+        with self._stats_lock:
+            for namespace in set(self.hits) | set(self.misses):
+                counters = stats.setdefault(namespace, {'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0})
+                counters['hits'] = self.hits[namespace]
+                counters['misses'] = self.misses[namespace]
+            evictions = self.evictions
+        
+        stats['total'] = {
+            field: sum(counters[field] for counters in stats.values())
+            for field in ('entries', 'bytes', 'hits', 'misses')
+        }
+        stats['total']['evictions'] = evictions
+        return stats
+
+class TieredCache:
+    """In-process LRU in front of a DiskCache, with write-behind.
+    
+    Values are pickled when they are stored, so callers never share
+    mutable objects with the cache. Lookups are served from memory when
+    possible and disk hits are promoted; writes land in memory at once
+    and are persisted by a background thread in batched transactions.
+    """
+    
+    def __init__(self, disk, max_bytes=MEMORY_CACHE_BYTES, batch_size=CACHE_WRITE_BATCH):
+        self.disk = disk
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        # {key: (blob, expires_at)} dalam urutan akses, yang paling lama di depan
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = Counter()
+        # Antrian berbatas: kalau writer tertinggal, penulis berikutnya menunggu
+        self._pending = queue.Queue(maxsize=CACHE_WRITE_QUEUE)
+        self._writer_thread = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer_thread.start()
+    
+    def _remember(self, key, blob, expires_at):
+        """Put an entry at the most recent end of the LRU and evict down to max_bytes"""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (blob, expires_at)
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+    
+    def get(self, key):
+        """Return the cached value from memory or disk, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                self._entries.move_to_end(key)
+                self.memory_hits[DiskCache.split_key(key)[0]] += 1
+            else:
+                entry = None
+        
+        if entry is None:
+            entry = self.disk.get_blob(key)
+            if entry is None:
+                return None
+            self._remember(key, entry[0], entry[1])
+        
+        try:
+            return pickle.loads(entry[0])
+        except Exception:
+            return None
+    
+    def set(self, key, value, ttl=None):
+        """Store a value in memory and queue it for the disk writer"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires_at = self.disk.expiry(key, ttl)
+        self._remember(key, blob, expires_at)
+        self._pending.put((key, blob, expires_at))
+        return True
+    
+    def _write_behind(self):
+        """Background writer: persist queued entries in batches"""
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                self.disk.set_blobs(batch)
+            except Exception:
+                # Cache bersifat best effort; entri tetap ada di memori
+                pass
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+    
+    def flush(self):
+        """Wait until every queued write has reached the disk"""
+        self._pending.join()
+    
+    def clear(self):
+        """Drop every entry from memory and disk"""
+        self.flush()
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self.disk.clear()
+    
+    def stats(self):
+        """DiskCache.stats() with memory hits counted as hits (also reported as 'memory_hits')"""
+        stats = self.disk.stats()
+        total = stats.pop('total')
+        with self._lock:
+            memory_hits = dict(self.memory_hits)
+            memory_bytes = self._bytes
+            memory_entries = len(self._entries)
+        
+        for namespace, counters in stats.items():
+            counters['memory_hits'] = 0
+        for namespace, hits in memory_hits.items():
+            counters = stats.setdefault(namespace, {'entries': 0, 'bytes': 0, 'hits': 0,
+                                                    'misses': 0, 'memory_hits': 0})
+            counters['hits'] += hits
+            counters['memory_hits'] = hits
+        
+        total['hits'] += sum(memory_hits.values())
+        total['memory_hits'] = sum(memory_hits.values())
+        total['memory_entries'] = memory_entries
+        total['memory_bytes'] = memory_bytes
+        total['pending_writes'] = self._pending.qsize()
+        stats['total'] = total
+        return stats
+
+# Satu cache per proses, dibagi semua sesi
+@st.cache_resource
+def get_disk_cache():
+    return TieredCache(DiskCache(CACHE_DB_PATH))
+
+disk_cache = get_disk_cache()
+
+def save_to_cache(key, data):
+    """Menyimpan data ke cache (memori langsung, disk di background)"""
+    try:
+        return disk_cache.set(key, data)
+    except Exception:
+        return False
+
+def load_from_cache(key):
+    """Memuat data dari cache memori, atau dari disk cache"""
+    try:
+        return disk_cache.get(key)
+    except Exception:
+        return None
+
+# Fungsi untuk membuat process pool
+def create_process_pool(max_workers, initializer=None, initargs=()):
+    """Process pool untuk pekerjaan CPU-bound dengan worker "spawn".
+    
+    Server Streamlit multi-thread: proses hasil fork bisa mewarisi lock
+    yang sedang dipegang thread lain dan koneksi SQLite yang terbuka.
+    Worker spawn memulai interpreter baru, jadi fungsi yang dikirim ke
+    pool harus berasal dari nlp_workers (tanpa efek samping saat di-import),
+    bukan dari skrip Streamlit ini.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=initializer,
+        initargs=initargs
+    )
+
+# Fungsi untuk download NLTK resources dengan pengecekan error dan caching
+@st.cache_resource
+def download_nltk_resources():
+    try:
+        # Cek apakah resources sudah diunduh sebelumnya
+        try:
+            # Mengakses stopwords untuk verifikasi
+            _ = stopwords.words("english")
+            # Jika no error, stopwords sudah terinstal
+        except LookupError:
+            # Jika error, download resources
             nltk.download('punkt', quiet=True)
             nltk.download('stopwords', quiet=True)
         
@@ -790,143 +1984,27 @@ def advanced_token_processing(tokens, expand_synonyms=True):
 
 # ===== OPTIMASI EKSTRAKSI TEKS DAN PEMBAGIAN DOKUMEN =====
 
-# Fungsi untuk ekstraksi teks PDF dengan chunking dan memory mapping
-def extract_text_from_pdf(pdf_file):
-    """Ekstraksi teks PDF dengan chunking untuk dokumen besar"""
-    try:
-        # Simpan file sementara untuk memory mapping
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(pdf_file.read())
-            temp_path = temp_file.name
-        
-        # Buka file dengan memory mapping untuk efisiensi
-        doc = fitz.open(temp_path)
-        page_count = len(doc)
-        
-        # Chunking untuk dokumen besar
-        chunks = []
-        
-        # Helper function untuk memproses chunk halaman
-        def process_chunk(start_idx, end_idx):
-            chunk_text = ""
-            for i in range(start_idx, min(end_idx, page_count)):
-                try:
-                    chunk_text += doc[i].get_text("text")
-                except:
-                    # Skip halaman yg error
-                    pass
-            return chunk_text
-        
-        # Bagi dokumen menjadi chunks dan proses secara paralel
-        chunk_size = 10  # Jumlah halaman per chunk
-        chunks_count = (page_count + chunk_size - 1) // chunk_size
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = []
-            for i in range(chunks_count):
-                start_idx = i * chunk_size
-                end_idx = min((i + 1) * chunk_size, page_count)
-                futures.append(executor.submit(process_chunk, start_idx, end_idx))
-            
-            chunks = [future.result() for future in futures]
-        
-        # Gabungkan hasil
-        text = "".join(chunks)
-        
-        # Bersihkan file sementara
-        try:
-            doc.close()
-            os.unlink(temp_path)
-        except:
-            pass
-            
-        return text
-    except Exception as e:
-        st.error(f"Error membaca PDF: {str(e)}")
-        # Bersihkan file sementara jika error
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
-        return ""
-
-# Fungsi optimasi untuk ekstraksi DOCX
-def extract_text_from_docx(docx_file):
-    """Ekstraksi teks DOCX dengan optimasi"""
-    try:
-        # Simpan ke file sementara
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-            temp_file.write(docx_file.read())
-            temp_path = temp_file.name
-        
-        # Proses file
-        doc = docx.Document(temp_path)
-        
-        # Ekstraksi teks dengan StringBuilder pattern untuk optimasi
-        text_parts = []
-        for para in doc.paragraphs:
-            if para.text:
-                text_parts.append(para.text)
-        
-        # Gabungkan hasil
-        text = "\n".join(text_parts)
-        
-        # Bersihkan file sementara
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
-            
-        return text
-    except Exception as e:
-        st.error(f"Error membaca DOCX: {str(e)}")
-        # Bersihkan file sementara jika error
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
-        return ""
-
-# Fungsi ekstraksi TXT dengan opsi encoding
-def extract_text_from_txt(txt_file):
-    """Ekstraksi teks TXT dengan multiple encoding support"""
-    try:
-        # Coba berbagai encoding
-        encodings = ['utf-8', 'latin-1', 'windows-1252', 'ascii']
-        
-        # Simpan file sementara
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.txt') as temp_file:
-            temp_file.write(txt_file.read())
-            temp_path = temp_file.name
-        
-        # Coba berbagai encoding
-        for encoding in encodings:
-            try:
-                with open(temp_path, 'r', encoding=encoding) as f:
-                    text = f.read()
-                # Bersihkan file
-                os.unlink(temp_path)
-                return text
-            except UnicodeDecodeError:
-                continue
-        
-        # Fallback ke binary mode jika semua encoding gagal
-        with open(temp_path, 'rb') as f:
-            content = f.read()
-            # Coba decode dari bytes dan ganti karakter yang tidak terbaca
-            text = content.decode('utf-8', errors='replace')
-        
-        # Bersihkan file
-        os.unlink(temp_path)
-        return text
-    except Exception as e:
-        st.error(f"Error membaca TXT: {str(e)}")
-        # Bersihkan file sementara jika error
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
-        return ""
+# Fungsi untuk membagi satu teks menjadi kalimat
+def split_text_into_sentences(text):
+    """Membagi satu teks menjadi daftar (idx, kalimat) dengan caching"""
+    # Verifikasi text tidak kosong
+    if not text or len(text.strip()) == 0:
+        return []
+    
+    # Cek cache menggunakan hash dari teks
+    text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
+    cache_result = load_from_cache(f"sentences_{text_hash}")
+    
+    if cache_result:
+        return cache_result
+    
+    # Pembagian yang sama dengan worker ingest (dokumen besar di-chunk)
+    all_sentences = split_sentences(text)
+    
+    # Simpan ke cache
+    save_to_cache(f"sentences_{text_hash}", all_sentences)
+    
+    return all_sentences
 
 # Fungsi untuk membagi dokumen menjadi kalimat dengan optimasi threading dan caching
 def split_into_sentences(doc_texts):
@@ -936,145 +2014,1303 @@ def split_into_sentences(doc_texts):
     
     def process_document(file_text):
         file, text = file_text
-        
-        # Verifikasi text tidak kosong
-        if not text or len(text.strip()) == 0:
-            return file, []
-        
-        # Cek cache menggunakan hash dari teks
-        text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-        cache_result = load_from_cache(f"sentences_{text_hash}")
-        
-        if cache_result:
-            return file, cache_result
-        
-        # Optimasi untuk dokumen besar - chunk dokumen
-        if len(text) > 100000:  # Untuk dokumen > 100KB
-            chunks = [text[i:i+100000] for i in range(0, len(text), 100000)]
-            all_sentences = []
-            
-            # Proses setiap chunk
-            for i, chunk in enumerate(chunks):
-                chunk_sentences = nltk.sent_tokenize(chunk)
-                # Hitung offset untuk indeks kalimat
-                base_idx = i * 1000  # Asumsi max 1000 kalimat per chunk
-                all_sentences.extend([(base_idx + j + 1, sent) for j, sent in enumerate(chunk_sentences)])
-        else:
-            # Dokumen kecil - proses langsung
-            all_sentences = [(i+1, sent) for i, sent in enumerate(nltk.sent_tokenize(text))]
-        
-        # Simpan ke cache
-        save_to_cache(f"sentences_{text_hash}", all_sentences)
-        
-        return file, all_sentences
+        return file, split_text_into_sentences(text)
     
     # Gunakan thread pool untuk pemrosesan paralel
     with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         results = list(executor.map(process_document, doc_texts.items()))
     
     for file, sentences in results:
-        split_texts[file] = sentences
-        
-        # Simpan statistik dokumen
-        if file not in st.session_state.file_stats:
-            st.session_state.file_stats[file] = {
-                'sentences': len(sentences),
-                'words': sum(len(s[1].split()) for s in sentences),
-                'size': len(doc_texts[file])
-            }
+        split_texts[file] = as_sentence_store(sentences)
     
     end_time = time.time()
     st.info(f"Dokumen berhasil dibagi menjadi kalimat dalam {end_time - start_time:.2f} detik")
     return split_texts
 
-# ===== OPTIMASI METODE PENCARIAN =====
+# ===== PENYIMPANAN KALIMAT =====
 
-# Fungsi untuk membuat inverted index
-def build_sentence_index(split_texts):
-    """Membuat inverted index untuk pencarian lebih cepat"""
-    start_time = time.time()
-    index = {}
-    processed = {}
-    
-    def process_document(file_sentences):
-        file, sentences = file_sentences
-        # Buat index untuk file ini
-        file_index = {}
-        file_processed = {}
-        
+class SentenceStore(Sequence):
+    """Sentences of a single document with O(1) lookup by sentence_idx.
+
+    Behaves like the [(idx, sentence), ...] list it replaces in
+    split_texts, but keeps all sentence text in one string with an offset
+    table. Lookups by idx are plain arithmetic when the ids are dense
+    (the usual 1..n numbering) and a dictionary lookup otherwise.
+    """
+
+    __slots__ = ("ids", "offsets", "text", "_first_id", "_id_positions")
+
+    def __init__(self, sentences=()):
+        self.ids = array('q')
+        self.offsets = array('q', [0])
+        parts = []
         for idx, sentence in sentences:
-            # Preprocessing
-            clean_text = advanced_preprocess(sentence)
-            tokens = nltk.word_tokenize(clean_text)
-            
-            # Simpan processed tokens untuk pencarian BM25
-            tokens_no_stop = remove_stopwords(tokens)
-            stemmed_tokens = stem_sentence(tokens_no_stop)
-            
-            # Simpan hasil process
-            file_processed[idx] = {
-                'tokens': tokens_no_stop,
-                'stemmed': stemmed_tokens,
-                'length': len(sentence.split())  # Simpan panjang kalimat untuk prioritasi
-            }
-            
-            # Tambahkan ke index
-            for token in set(tokens):  # Gunakan set untuk menghindari duplikasi
+            self.ids.append(idx)
+            self.offsets.append(self.offsets[-1] + len(sentence))
+            parts.append(sentence)
+        self.text = "".join(parts)
+
+        self._first_id = self.ids[0] if self.ids else 0
+        dense = all(idx == self._first_id + position for position, idx in enumerate(self.ids))
+        self._id_positions = None
+        if not dense:
+            # Simpan posisi pertama untuk idx yang muncul lebih dari sekali
+            self._id_positions = {}
+            for position, idx in enumerate(self.ids):
+                self._id_positions.setdefault(idx, position)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _sentence_at(self, position):
+        return self.text[self.offsets[position]:self.offsets[position + 1]]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("sentence position out of range")
+        return self.ids[position], self._sentence_at(position)
+
+    def __iter__(self):
+        text = self.text
+        offsets = self.offsets
+        for position, idx in enumerate(self.ids):
+            yield idx, text[offsets[position]:offsets[position + 1]]
+
+    def position_of(self, idx):
+        """Position of a sentence_idx in the store, or None"""
+        if self._id_positions is not None:
+            return self._id_positions.get(idx)
+        position = idx - self._first_id
+        if 0 <= position < len(self.ids):
+            return position
+        return None
+
+    def get(self, idx, default=None):
+        """Sentence text for a sentence_idx"""
+        position = self.position_of(int(idx))
+        if position is None:
+            return default
+        return self._sentence_at(position)
+
+    def __contains__(self, item):
+        if isinstance(item, tuple) and len(item) == 2:
+            return self.get(item[0]) == item[1]
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple)) or hasattr(other, "position_of"):
+            return len(self) == len(other) and all(a == tuple(b) for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+def as_sentence_store(sentences):
+    """Wrap a [(idx, sentence)] list in a SentenceStore unless it already is one"""
+    # Duck typing: store dari rerun sebelumnya adalah instance kelas SentenceStore yang lain
+    if hasattr(sentences, "position_of"):
+        return sentences
+    return SentenceStore(sentences)
+
+# ===== INVERTED INDEX (POSTINGS) =====
+
+POSTING_DTYPE = np.int32  # Tipe data sentence idx, tf dan posisi di postings
+
+class PostingsIndex:
+    """Inverted index for the sentences of a single document.
+
+    Postings of all terms live in flat int32 arrays: term slot t owns
+    doc_ids[offsets[t]:offsets[t + 1]] (sorted sentence idx) with the
+    matching tfs, and posting p owns positions[pos_offsets[p]:pos_offsets[p + 1]]
+    (token positions inside that sentence). The index is immutable once
+    built, so it can be shared between corpus snapshots.
+    """
+
+    __slots__ = ("term_slots", "offsets", "doc_ids", "tfs", "pos_offsets", "positions")
+
+    def __init__(self, term_slots, offsets, doc_ids, tfs, pos_offsets, positions):
+        self.term_slots = term_slots  # {term: slot}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.pos_offsets = pos_offsets
+        self.positions = positions
+
+    @classmethod
+    def build(cls, tokenized_sentences):
+        """Build the index from (idx, tokens) pairs in one linear pass.
+
+        Tokens are lowercased; positions count every token that is passed
+        in. Sentences are expected in ascending idx order (split_texts
+        order) and are only sorted when they are not.
+        """
+        tokenized_sentences = list(tokenized_sentences)
+        if any(tokenized_sentences[i][0] > tokenized_sentences[i + 1][0]
+               for i in range(len(tokenized_sentences) - 1)):
+            tokenized_sentences.sort(key=lambda item: item[0])
+
+        # One bucket of occurrences per term, appended in sentence order
+        term_slots = {}
+        occ_idx = []
+        occ_pos = []
+        for idx, tokens in tokenized_sentences:
+            for position, token in enumerate(tokens):
                 token = token.lower()
-                if token not in file_index:
-                    file_index[token] = []
-                if idx not in file_index[token]:
-                    file_index[token].append(idx)
-        
-        return file, file_index, file_processed
+                slot = term_slots.get(token)
+                if slot is None:
+                    slot = term_slots[token] = len(occ_idx)
+                    occ_idx.append(array('i'))
+                    occ_pos.append(array('i'))
+                occ_idx[slot].append(idx)
+                occ_pos[slot].append(position)
+
+        if not term_slots:
+            empty = np.zeros(0, dtype=POSTING_DTYPE)
+            return cls({}, np.zeros(1, dtype=np.int64), empty, empty, np.zeros(1, dtype=np.int64), empty)
+
+        bucket_sizes = np.fromiter((len(bucket) for bucket in occ_idx), dtype=np.int64, count=len(occ_idx))
+        occ_offsets = np.concatenate(([0], np.cumsum(bucket_sizes)))
+        all_idx = np.concatenate([np.frombuffer(bucket, dtype=np.intc) for bucket in occ_idx]).astype(POSTING_DTYPE)
+        all_pos = np.concatenate([np.frombuffer(bucket, dtype=np.intc) for bucket in occ_pos]).astype(POSTING_DTYPE)
+
+        # A posting starts at every term boundary and every change of sentence
+        starts_posting = np.ones(len(all_idx), dtype=bool)
+        starts_posting[1:] = all_idx[1:] != all_idx[:-1]
+        starts_posting[occ_offsets[:-1]] = True
+
+        posting_starts = np.flatnonzero(starts_posting)
+        pos_offsets = np.append(posting_starts, len(all_idx)).astype(np.int64)
+        postings_per_term = np.add.reduceat(starts_posting.astype(np.int64), occ_offsets[:-1])
+
+        return cls(
+            term_slots,
+            np.concatenate(([0], np.cumsum(postings_per_term))).astype(np.int64),
+            all_idx[posting_starts],
+            np.diff(pos_offsets).astype(POSTING_DTYPE),
+            pos_offsets,
+            all_pos,
+        )
+
+    def __len__(self):
+        return len(self.term_slots)
+
+    def __contains__(self, term):
+        return term in self.term_slots
+
+    def __iter__(self):
+        return iter(self.term_slots)
+
+    def keys(self):
+        return self.term_slots.keys()
+
+    def _range(self, term):
+        slot = self.term_slots.get(term)
+        if slot is None:
+            return 0, 0
+        return self.offsets[slot], self.offsets[slot + 1]
+
+    def postings(self, term):
+        """Sorted sentence idx array for a term (empty if unknown)"""
+        start, end = self._range(term)
+        return self.doc_ids[start:end]
+
+    def get(self, term, default=None):
+        """Dict-style lookup returning the postings array"""
+        if term not in self.term_slots:
+            return default
+        return self.postings(term)
+
+    def __getitem__(self, term):
+        if term not in self.term_slots:
+            raise KeyError(term)
+        return self.postings(term)
+
+    def document_frequency(self, term):
+        start, end = self._range(term)
+        return int(end - start)
+
+    def term_frequencies(self, term):
+        """tf per sentence, aligned with postings(term)"""
+        start, end = self._range(term)
+        return self.tfs[start:end]
+
+    def token_positions(self, term, idx):
+        """Token positions of a term inside one sentence (empty if absent)"""
+        start, end = self._range(term)
+        i = start + np.searchsorted(self.doc_ids[start:end], idx)
+        if i >= end or self.doc_ids[i] != idx:
+            return self.positions[:0]
+        return self.positions[self.pos_offsets[i]:self.pos_offsets[i + 1]]
+
+    def _expand_run(self, run, partial_start, partial_end):
+        """Index terms a query run can stand for; partial runs may be cut off inside a token"""
+        if partial_start and partial_end:
+            return [term for term in self.term_slots if run in term]
+        if partial_start:
+            return [term for term in self.term_slots if term.endswith(run)]
+        if partial_end:
+            return [term for term in self.term_slots if term.startswith(run)]
+        return [run] if run in self.term_slots else []
+
+    def match_run_sequence(self, runs, partial_start=False, partial_end=False):
+        """Sorted idx of sentences containing runs as consecutive tokens.
+
+        With partial_start the first run may be the tail of a longer token,
+        with partial_end the last run may be the head of one (substring
+        matching). Only the postings of the query terms are touched.
+        """
+        last = len(runs) - 1
+        slots = [
+            self._expand_run(run, partial_start and j == 0, partial_end and j == last)
+            for j, run in enumerate(runs)
+        ]
+        if not runs or not all(slots):
+            return self.doc_ids[:0]
+
+        if len(runs) == 1:
+            terms = slots[0]
+            if len(terms) == 1:
+                return self.postings(terms[0])
+            return np.unique(np.concatenate([self.postings(term) for term in terms]))
+
+        # Setiap kemunculan run ke-j menjadi kunci (idx, posisi awal phrase);
+        # irisan kunci semua run = phrase utuh. Mulai dari run paling jarang.
+        slot_keys = [
+            np.concatenate([self._occurrence_keys(term, last - j) for term in terms])
+            for j, terms in enumerate(slots)
+        ]
+        matched = None
+        for keys in sorted(slot_keys, key=len):
+            matched = np.unique(keys) if matched is None else np.intersect1d(matched, keys)
+            if len(matched) == 0:
+                return self.doc_ids[:0]
+        return np.unique(matched >> 32).astype(POSTING_DTYPE)
+
+    def _occurrence_keys(self, term, shift):
+        """(idx << 32 | position + shift) for every occurrence of a term"""
+        start, end = self._range(term)
+        doc_ids = np.repeat(self.doc_ids[start:end].astype(np.int64), self.tfs[start:end])
+        positions = self.positions[self.pos_offsets[start]:self.pos_offsets[end]].astype(np.int64)
+        return (doc_ids << 32) | (positions + shift)
+
+# ===== INDEKS BM25 PERSISTEN =====
+
+BM25_MAX_KEYWORD_BONUS = 1.5  # Bonus skor untuk kalimat yang mengandung keyword asli
+BM25_BLOCK_SIZE = 64  # Jumlah posting per blok untuk batas atas block-max WAND
+BM25_CURSOR_CACHE_SIZE = 256  # Maksimum cursor WAND (term, avgdl) yang disimpan per BM25Index
+BM25_SENTENCES_PER_FILE = 8  # Kalimat teratas per file dari bm25_search (sama dengan ukuran paragraf lama)
+
+class BM25Index:
+    """Inverted BM25 index for the sentences of a single document.
+
+    Statistics follow rank_bm25.BM25Okapi (same IDF and epsilon floor), but
+    postings are kept per term so a query only touches the sentences that
+    contain at least one query term.
+
+    Indexes in the shared corpus are read by several sessions at once, so
+    lazily computed state is built locally and published under a lock.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, epsilon=0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.postings = {}  # {term: {sentence_idx: tf}}
+        self.sentence_lengths = {}  # {sentence_idx: jumlah token stemmed}
+        self.word_counts = {}  # {sentence_idx: jumlah kata kalimat asli, untuk length bonus}
+        self.positions = {}  # {sentence_idx: posisi dalam split_texts[file]}
+        self.total_length = 0
+        self.last_position = -1
+        self.idf = {}
+        self._idf_dirty = True
+        self._lock = threading.Lock()
+        self._cursors = OrderedDict()  # LRU {(term, avgdl): (sentence idx terurut, batas atas, batas atas per blok)}
+        self._sparse = None  # (split_texts[file], SparseBM25) untuk backend vektorisasi
+        self._sparse_lock = threading.Lock()  # Terpisah agar build matriks tidak menahan query WAND
+
+    @classmethod
+    def from_processed(cls, sentences, file_processed, **params):
+        """Build the index from split_texts[file] and processed_sentences[file]"""
+        index = cls(**params)
+        for position, (idx, sentence) in enumerate(sentences):
+            if idx in file_processed:
+                word_count = file_processed[idx].get('length', len(sentence.split()))
+                index.add_sentence(idx, file_processed[idx]['stemmed'], position, word_count)
+        return index
+
+    @property
+    def corpus_size(self):
+        return len(self.sentence_lengths)
+
+    def add_sentence(self, idx, stemmed_tokens, position, word_count=None):
+        """Add one sentence; IDF is recomputed lazily on the next query"""
+        if idx in self.sentence_lengths:
+            self.remove_sentence(idx)
+
+        for term, tf in Counter(stemmed_tokens).items():
+            self.postings.setdefault(term, {})[idx] = tf
+
+        self.sentence_lengths[idx] = len(stemmed_tokens)
+        self.word_counts[idx] = len(stemmed_tokens) if word_count is None else word_count
+        self.positions[idx] = position
+        self.total_length += len(stemmed_tokens)
+        self.last_position = max(self.last_position, position)
+        self._idf_dirty = True
+        self._cursors = OrderedDict()
+        self._sparse = None
+
+    def remove_sentence(self, idx):
+        """Remove one sentence and its postings"""
+        length = self.sentence_lengths.pop(idx, None)
+        if length is None:
+            return
+
+        for term in list(self.postings):
+            term_postings = self.postings[term]
+            if term_postings.pop(idx, None) is not None and not term_postings:
+                del self.postings[term]
+
+        self.total_length -= length
+        self.word_counts.pop(idx, None)
+        position = self.positions.pop(idx)
+        if position == self.last_position:
+            self.last_position = max(self.positions.values(), default=-1)
+        self._idf_dirty = True
+        self._cursors = OrderedDict()
+        self._sparse = None
+
+    def compute_idf(self):
+        """IDF table with the same formula as BM25Okapi, recomputed once after the index changed.
+
+        The table is built in a local dict and only assigned when complete,
+        so a concurrent reader never sees a partly filled table.
+        """
+        if not self._idf_dirty:
+            return self.idf
+
+        with self._lock:
+            if self._idf_dirty:
+                idf_table = {}
+                corpus_size = self.corpus_size
+                negative_idfs = []
+                idf_sum = 0.0
+
+                for term, term_postings in self.postings.items():
+                    doc_freq = len(term_postings)
+                    idf = math.log(corpus_size - doc_freq + 0.5) - math.log(doc_freq + 0.5)
+                    idf_table[term] = idf
+                    idf_sum += idf
+                    if idf < 0:
+                        negative_idfs.append(term)
+
+                if idf_table:
+                    eps = self.epsilon * (idf_sum / len(idf_table))
+                    for term in negative_idfs:
+                        idf_table[term] = eps
+
+                self.idf = idf_table
+                self._idf_dirty = False
+            return self.idf
+
+    def get_scores(self, query_tokens):
+        """Score only the sentences in the postings of the query terms.
+
+        Returns:
+            dict: {sentence_idx: score} for sentences with non-zero term overlap
+        """
+        idf_table = self.compute_idf()
+
+        if not self.sentence_lengths:
+            return {}
+
+        avgdl = self.total_length / self.corpus_size
+        k1 = self.k1
+        b = self.b
+        scores = {}
+
+        for term in query_tokens:
+            idf = idf_table.get(term) or 0
+            if not idf:
+                continue
+            for idx, tf in self.postings[term].items():
+                doc_len = self.sentence_lengths[idx]
+                denom = tf + k1 * (1 - b + b * doc_len / avgdl) if avgdl else tf + k1
+                scores[idx] = scores.get(idx, 0.0) + idf * (tf * (k1 + 1) / denom)
+
+        return scores
+
+    def sparse(self, sentences):
+        """SparseBM25 view of this index, built on first use and kept until the index changes.
+
+        Built once under a lock, so sessions sharing the index do not each
+        build it and overwrite one another's matrix.
+        """
+        cached = self._sparse
+        if cached is None or cached[0] is not sentences:
+            with self._sparse_lock:
+                cached = self._sparse
+                if cached is None or cached[0] is not sentences:
+                    cached = (sentences, SparseBM25.from_index(self, sentences))
+                    self._sparse = cached
+        return cached[1]
+
+    def _cursor(self, term, avgdl):
+        """Sorted postings of a term and the largest tf-part x length bonus among them.
+
+        The bound is kept for the whole list and for every BM25_BLOCK_SIZE
+        postings. Only depends on the index contents and avgdl, so it is
+        cached until the next add_sentence/remove_sentence. Every corpus
+        snapshot has its own global avgdl, so the cache is an LRU bounded
+        by BM25_CURSOR_CACHE_SIZE and shared between sessions under the lock.
+        """
+        key = (term, avgdl)
+        with self._lock:
+            cursor = self._cursors.get(key)
+            if cursor is not None:
+                self._cursors.move_to_end(key)
+                return cursor
+
+        # Dihitung di luar lock; postings tidak berubah setelah indeks dibagi
+        k1 = self.k1
+        b = self.b
+        term_postings = self.postings.get(term, {})
+        ids = sorted(term_postings)
+        bounds = []
+        for idx in ids:
+            tf = term_postings[idx]
+            doc_len = self.sentence_lengths[idx]
+            denom = tf + k1 * (1 - b + b * doc_len / avgdl) if avgdl else tf + k1
+            bounds.append(tf * (k1 + 1) / denom * (1.0 + self.word_counts[idx] / 100))
+        block_bounds = [
+            max(bounds[start:start + BM25_BLOCK_SIZE])
+            for start in range(0, len(bounds), BM25_BLOCK_SIZE)
+        ]
+        cursor = (ids, max(block_bounds, default=0.0), block_bounds)
+
+        with self._lock:
+            self._cursors[key] = cursor
+            while len(self._cursors) > BM25_CURSOR_CACHE_SIZE:
+                self._cursors.popitem(last=False)
+        return cursor
+
+    def top_k(self, query_tokens, k, rescore, heap=None, rank=0, tag=None, idf=None, avgdl=None):
+        """Top-k BM25 retrieval with block-max WAND pruning over the postings.
+
+        Every term gets an upper bound (IDF x largest tf-part x length bonus
+        x BM25_MAX_KEYWORD_BONUS), overall and per block of postings. A
+        sentence is only scored when the bounds of the terms it can contain
+        beat the current k-th best final score, so most postings are skipped
+        instead of scored.
+
+        Args:
+            query_tokens (list): Stemmed query tokens (duplicates count twice, like get_scores)
+            k (int): Number of results to keep
+            rescore (callable): rescore(idx, score) -> final score with bonuses,
+                or None to drop the sentence. Must stay within the bound above.
+            heap (list, optional): Shared min-heap, so several indexes can be
+                searched with one running threshold
+            rank (int): Order of this index among those sharing the heap (ties
+                go to the lower rank, then to the earlier sentence)
+            tag: Stored in the heap entries to tell indexes apart
+            idf (dict, optional): IDF table to use instead of this index's own
+            avgdl (float, optional): Average sentence length to use instead of this index's own
+
+        Returns:
+            list: The heap of (final_score, -rank, -position, idx, tag) entries
+        """
+        if heap is None:
+            heap = []
+        if not self.sentence_lengths or k <= 0:
+            return heap
+        if idf is None:
+            idf = self.compute_idf()
+        if avgdl is None:
+            avgdl = self.total_length / self.corpus_size
+
+        k1 = self.k1
+        b = self.b
+        weights = Counter(query_tokens)
+        cursors = []
+        for term, count in weights.items():
+            term_idf = idf.get(term) or 0
+            if not term_idf or term not in self.postings:
+                continue
+            ids, bound, block_bounds = self._cursor(term, avgdl)
+            # Margin kecil agar pembulatan float tidak membuat batas atas lebih kecil dari skor asli
+            scale = max(count * term_idf * BM25_MAX_KEYWORD_BONUS, 0.0) * (1 + 1e-9)
+            cursors.append([ids[0], 0, ids, bound * scale, block_bounds, scale])
+
+        # Urutan penjumlahan sama dengan get_scores agar skor identik
+        scoring_terms = [
+            (idf[term], self.postings[term])
+            for term in query_tokens
+            if (idf.get(term) or 0) and term in self.postings
+        ]
+        sentence_lengths = self.sentence_lengths
+        word_counts = self.word_counts
+
+        def score(idx):
+            total = 0.0
+            for term_idf, term_postings in scoring_terms:
+                tf = term_postings.get(idx)
+                if tf:
+                    doc_len = sentence_lengths[idx]
+                    denom = tf + k1 * (1 - b + b * doc_len / avgdl) if avgdl else tf + k1
+                    total += term_idf * (tf * (k1 + 1) / denom)
+            return total
+
+        checked_until = -1  # pivot di bawah ini sudah lolos cek block-max
+        while cursors:
+            if len(cursors) > 1:
+                cursors.sort(key=lambda cursor: cursor[0])
+            threshold = heap[0][0] if len(heap) >= k else None
+
+            # Pivot: term pertama di mana jumlah batas atas bisa melewati threshold
+            pivot = None
+            accumulated = 0.0
+            for i, cursor in enumerate(cursors):
+                accumulated += cursor[3]
+                if threshold is None or accumulated > threshold:
+                    pivot = i
+                    break
+            if pivot is None:
+                break
+
+            pivot_idx = cursors[pivot][0]
+            while pivot + 1 < len(cursors) and cursors[pivot + 1][0] == pivot_idx:
+                pivot += 1
+
+            if threshold is not None and pivot_idx >= checked_until:
+                # Block-max: batas atas blok yang memuat pivot_idx pada term sampai pivot
+                block_sum = 0.0
+                skip_to = cursors[pivot + 1][0] if pivot + 1 < len(cursors) else None
+                for cursor in cursors[:pivot + 1]:
+                    ids = cursor[2]
+                    position = bisect.bisect_left(ids, pivot_idx, cursor[1])
+                    if position == len(ids):
+                        continue
+                    block = position // BM25_BLOCK_SIZE
+                    block_sum += cursor[4][block] * cursor[5]
+                    block_end = ids[min((block + 1) * BM25_BLOCK_SIZE, len(ids)) - 1] + 1
+                    skip_to = block_end if skip_to is None else min(skip_to, block_end)
+
+                if block_sum > threshold:
+                    checked_until = pivot_idx + 1 if skip_to is None else skip_to
+                else:
+                    # Tidak ada kalimat sebelum skip_to yang bisa masuk top-k
+                    for cursor in cursors[:pivot + 1]:
+                        cursor[1] = len(cursor[2]) if skip_to is None else bisect.bisect_left(cursor[2], skip_to, cursor[1])
+                        cursor[0] = cursor[2][cursor[1]] if cursor[1] < len(cursor[2]) else None
+                    cursors = [cursor for cursor in cursors if cursor[0] is not None]
+                    continue
+
+            if cursors[0][0] == pivot_idx:
+                raw_score = score(pivot_idx)
+                bound = raw_score * (1.0 + word_counts[pivot_idx] / 100) * BM25_MAX_KEYWORD_BONUS
+                # rescore (cek keyword di teks kalimat) hanya jika skor akhirnya masih bisa masuk top-k
+                if threshold is None or bound * (1 + 1e-9) > threshold:
+                    final_score = rescore(pivot_idx, raw_score)
+                    if final_score is not None:
+                        entry = (final_score, -rank, -self.positions[pivot_idx], pivot_idx, tag)
+                        if len(heap) < k:
+                            heapq.heappush(heap, entry)
+                        elif entry > heap[0]:
+                            heapq.heapreplace(heap, entry)
+
+                # Semua term sampai pivot berada di pivot_idx; maju satu posting
+                exhausted = False
+                for cursor in cursors[:pivot + 1]:
+                    cursor[1] += 1
+                    if cursor[1] < len(cursor[2]):
+                        cursor[0] = cursor[2][cursor[1]]
+                    else:
+                        cursor[0] = None
+                        exhausted = True
+            else:
+                # Kalimat sebelum pivot tidak mungkin masuk top-k, lompati
+                exhausted = False
+                for cursor in cursors[:pivot]:
+                    cursor[1] = bisect.bisect_left(cursor[2], pivot_idx, cursor[1])
+                    if cursor[1] < len(cursor[2]):
+                        cursor[0] = cursor[2][cursor[1]]
+                    else:
+                        cursor[0] = None
+                        exhausted = True
+
+            if exhausted:
+                cursors = [cursor for cursor in cursors if cursor[0] is not None]
+
+        return heap
+
+def build_bm25_index(split_texts, processed_sentences):
+    """Membuat BM25Index untuk setiap file"""
+    return {
+        file: BM25Index.from_processed(sentences, processed_sentences.get(file, {}))
+        for file, sentences in split_texts.items()
+    }
+
+# ===== BM25 VEKTORISASI (SPARSE) =====
+
+class SparseBM25:
+    """Vectorized BM25 over a sparse sentence x term matrix.
+
+    Built from a BM25Index. The CSC matrix holds the length-normalized
+    BM25 tf-part tf*(k1+1)/(tf+k1*(1-b+b*dl/avgdl)) of every sentence and
+    term, so a query is one column slice and one sparse matrix-vector
+    product. The keyword and length bonuses are array operations as well;
+    the keyword check runs over one lowercased copy of the document text.
+    """
+
+    __slots__ = (
+        "sentences", "row_ids", "row_positions", "vocabulary", "idf",
+        "weights", "length_bonus", "last_position", "offsets", "lowered",
+    )
+
+    @classmethod
+    def from_index(cls, file_bm25, sentences):
+        """Build the matrix from a BM25Index and split_texts[file]"""
+        index = cls()
+        store = as_sentence_store(sentences)
+        index.sentences = store
+
+        # Satu baris per kalimat, urut posisi dalam dokumen
+        row_ids = sorted(file_bm25.sentence_lengths, key=file_bm25.positions.get)
+        row_of = {idx: row for row, idx in enumerate(row_ids)}
+        index.row_ids = np.array(row_ids, dtype=np.int64)
+        index.row_positions = np.array([file_bm25.positions[idx] for idx in row_ids], dtype=np.int64)
+        index.last_position = int(index.row_positions.max()) if len(row_ids) else -1
+
+        index.vocabulary = {}
+        rows = array('q')
+        cols = array('q')
+        tfs = array('d')
+        for col, (term, term_postings) in enumerate(file_bm25.postings.items()):
+            index.vocabulary[term] = col
+            for idx, tf in term_postings.items():
+                rows.append(row_of[idx])
+                cols.append(col)
+                tfs.append(tf)
+        rows = np.frombuffer(rows, dtype=np.int64)
+        cols = np.frombuffer(cols, dtype=np.int64)
+        tfs = np.frombuffer(tfs, dtype=np.float64)
+
+        # Normalisasi panjang dihitung sekali di sini, bukan per query
+        k1 = file_bm25.k1
+        b = file_bm25.b
+        doc_lengths = np.array([file_bm25.sentence_lengths[idx] for idx in row_ids], dtype=np.float64)
+        avgdl = doc_lengths.mean() if len(doc_lengths) else 0.0
+        norms = k1 * (1 - b + b * doc_lengths / avgdl) if avgdl else np.full(len(doc_lengths), k1)
+        data = tfs * (k1 + 1) / (tfs + norms[rows])
+        index.weights = csc_matrix((data, (rows, cols)), shape=(len(row_ids), len(index.vocabulary)))
+
+        # IDF dan epsilon floor sama dengan BM25Okapi
+        doc_freqs = np.diff(index.weights.indptr)
+        index.idf = np.log(len(row_ids) - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(index.idf):
+            index.idf[index.idf < 0] = file_bm25.epsilon * index.idf.mean()
+
+        word_counts = np.array([file_bm25.word_counts[idx] for idx in row_ids], dtype=np.float64)
+        index.length_bonus = 1.0 + word_counts / 100
+
+        index.offsets = np.array(store.offsets, dtype=np.int64)
+        index.lowered = store.text.lower()
+        if len(index.lowered) != len(store.text):
+            # Offset tidak berlaku lagi jika lower() mengubah panjang teks
+            index.lowered = None
+        return index
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def scores(self, query_tokens):
+        """Raw BM25 score of every row; repeated query tokens count twice, as in BM25Okapi"""
+        counts = Counter(term for term in query_tokens if term in self.vocabulary)
+        if not counts:
+            return np.zeros(len(self.row_ids))
+        cols = np.fromiter((self.vocabulary[term] for term in counts), dtype=np.int64, count=len(counts))
+        query_weights = self.idf[cols] * np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        return self.weights[:, cols] @ query_weights
+
+    def query_matrix(self, token_lists):
+        """Sparse term x query matrix of IDF-weighted query term counts"""
+        rows = []
+        cols = []
+        data = []
+        for column, query_tokens in enumerate(token_lists):
+            counts = Counter(term for term in query_tokens if term in self.vocabulary)
+            for term, count in counts.items():
+                term_column = self.vocabulary[term]
+                rows.append(term_column)
+                cols.append(column)
+                data.append(self.idf[term_column] * count)
+        return csc_matrix((data, (rows, cols)), shape=(len(self.vocabulary), len(token_lists)))
+
+    def keyword_rows(self, keyword):
+        """Boolean mask of the rows whose lowercased sentence contains keyword"""
+        if not keyword:
+            return np.ones(len(self.row_ids), dtype=bool)
+        if self.lowered is None:
+            return np.fromiter(
+                (keyword in self.sentences[position][1].lower() for position in self.row_positions),
+                dtype=bool, count=len(self.row_ids)
+            )
+
+        # Semua kemunculan (termasuk yang tumpang tindih), lalu petakan ke kalimat lewat offset
+        pattern = re.compile('(?=' + re.escape(keyword) + ')')
+        starts = np.fromiter((match.start() for match in pattern.finditer(self.lowered)), dtype=np.int64)
+        sentence_positions = np.searchsorted(self.offsets, starts, side='right') - 1
+        inside = starts + len(keyword) <= self.offsets[sentence_positions + 1]
+        return np.isin(self.row_positions, sentence_positions[inside])
+
+    def final_scores(self, query_tokens, keyword, threshold=0.01):
+        """Rows scoring above threshold, in document order, with bonuses applied.
+
+        Returns:
+            tuple: (row numbers, final scores) as arrays
+        """
+        raw = self.scores(query_tokens)
+        rows = np.flatnonzero(raw > threshold)
+        return rows, self.with_bonuses(rows, raw[rows], keyword)
+
+    def batch_final_scores(self, token_lists, keywords, threshold=0.01):
+        """final_scores for many queries with one sparse matrix-matrix product.
+
+        Yields:
+            tuple: (row numbers, final scores) per query, in input order
+        """
+        scores = (self.weights @ self.query_matrix(token_lists)).tocsc()
+        scores.sort_indices()
+        for column, keyword in enumerate(keywords):
+            start, end = scores.indptr[column], scores.indptr[column + 1]
+            rows = scores.indices[start:end]
+            raw = scores.data[start:end]
+            above = raw > threshold
+            rows = rows[above].astype(np.int64)
+            yield rows, self.with_bonuses(rows, raw[above], keyword)
+
+    def with_bonuses(self, rows, raw_scores, keyword):
+        """Raw scores of the given rows x keyword bonus x length bonus"""
+        keyword_bonus = np.where(self.keyword_rows(keyword)[rows], BM25_MAX_KEYWORD_BONUS, 1.0)
+        return raw_scores * keyword_bonus * self.length_bonus[rows]
+
+    def best_paragraph(self, rows, final_scores, paragraph_size=8):
+        """Rows of the best paragraph, grouped the way bm25_search does.
+
+        Matching rows are cut into paragraphs of paragraph_size in document
+        order; the last, shorter one only counts when it ends at the last
+        sentence. The paragraph with the highest average score wins.
+        """
+        used = len(rows)
+        if used and self.row_positions[rows[-1]] != self.last_position:
+            used -= used % paragraph_size
+        if not used:
+            return rows[:0]
+
+        starts = np.arange(0, used, paragraph_size)
+        sizes = np.minimum(paragraph_size, used - starts)
+        averages = np.add.reduceat(final_scores[:used], starts) / sizes
+        best = int(np.argmax(averages))
+        return rows[starts[best]:starts[best] + sizes[best]]
+
+# ===== INDEKS TF-IDF PERSISTEN =====
+
+TFIDF_THRESHOLD = 0.01  # Skor cosine minimum agar kalimat masuk hasil
+TFIDF_RANK_DECIMALS = 5  # Skor dibulatkan ke desimal ini saat ranking; selisih float32 dianggap seri
+TFIDF_TOKEN_PATTERN = re.compile(r'(?u)\b\w\w+\b')  # token_pattern default TfidfVectorizer
+
+class TfidfIndex:
+    """Precomputed TF-IDF model for the sentences of a single document.
+
+    Holds the vocabulary, the IDF vector and the L2-normalized CSR matrix
+    of the stemmed sentences (same settings as a default TfidfVectorizer),
+    so a query only needs one transform and one sparse matrix-vector
+    product instead of refitting the vectorizer.
+    """
+
+    __slots__ = ("vocabulary", "idf", "row_ids", "matrix")
+
+    def __init__(self, vocabulary, idf, row_ids, matrix):
+        self.vocabulary = vocabulary  # {term: column}
+        self.idf = idf
+        self.row_ids = row_ids  # sentence idx per baris matrix
+        self.matrix = matrix
+
+    @classmethod
+    def from_processed(cls, sentences, file_processed):
+        """Fit the model on split_texts[file] and processed_sentences[file]"""
+        return cls.from_model(fit_tfidf(sentences, file_processed))
+
+    @classmethod
+    def from_model(cls, model):
+        """Wrap the (vocabulary, idf, row_ids, matrix) tuple returned by fit_tfidf"""
+        vocabulary, idf, row_ids, matrix = model
+        return cls(vocabulary, idf, np.asarray(row_ids, dtype=POSTING_DTYPE), matrix)
+
+    @property
+    def corpus_size(self):
+        return len(self.row_ids)
+
+    def transform(self, query_text):
+        """L2-normalized TF-IDF vector of a query over this vocabulary"""
+        query_vector = np.zeros(len(self.vocabulary), dtype=TFIDF_DTYPE)
+        for token in TFIDF_TOKEN_PATTERN.findall(query_text.lower()):
+            column = self.vocabulary.get(token)
+            if column is not None:
+                query_vector[column] += 1
+        query_vector *= self.idf
+        norm = np.linalg.norm(query_vector)
+        if norm > 0:
+            query_vector /= norm
+        return query_vector
+
+    def transform_batch(self, query_texts):
+        """Sparse term x query matrix of L2-normalized TF-IDF query vectors"""
+        rows = []
+        cols = []
+        data = []
+        for column, query_text in enumerate(query_texts):
+            counts = Counter(
+                self.vocabulary[token]
+                for token in TFIDF_TOKEN_PATTERN.findall(query_text.lower())
+                if token in self.vocabulary
+            )
+            if not counts:
+                continue
+            terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            weights = np.fromiter(counts.values(), dtype=TFIDF_DTYPE, count=len(counts)) * self.idf[terms]
+            weights /= np.linalg.norm(weights)
+            rows.extend(terms.tolist())
+            cols.extend([column] * len(counts))
+            data.extend(weights.tolist())
+        return csc_matrix((np.asarray(data, dtype=TFIDF_DTYPE), (rows, cols)),
+                          shape=(len(self.vocabulary), len(query_texts)))
+
+    def _ranked(self, rows, scores, k, threshold):
+        """(sentence idx, score) of the best k rows above threshold.
+
+        Weights are float32, so scores that are equal in float64 can differ
+        in the last bits (and the other way round). Rows are ranked on the
+        score rounded to TFIDF_RANK_DECIMALS, and rows with the same rounded
+        score keep document order, also when choosing which of them make
+        the top k.
+        """
+        above = scores > threshold
+        rows = rows[above]
+        scores = scores[above]
+        rank_scores = np.round(scores.astype(np.float64), TFIDF_RANK_DECIMALS)
+        if len(rows) > k:
+            # Semua baris di atas skor ke-k, lalu baris seri paling awal sampai k
+            kth = np.partition(rank_scores, len(rank_scores) - k)[len(rank_scores) - k]
+            tied = np.flatnonzero(rank_scores == kth)
+            tied = tied[np.argsort(rows[tied], kind='stable')]
+            keep = np.concatenate((np.flatnonzero(rank_scores > kth), tied))[:k]
+            rows = rows[keep]
+            scores = scores[keep]
+            rank_scores = rank_scores[keep]
+
+        # Skor tertinggi dulu; skor sama tetap dalam urutan kalimat
+        order = np.lexsort((rows, -rank_scores))
+        return [(int(self.row_ids[row]), float(score)) for row, score in zip(rows[order], scores[order])]
+
+    def top_k(self, query_text, k, threshold=TFIDF_THRESHOLD):
+        """(sentence idx, score) pairs above threshold, best first, at most k"""
+        if not self.corpus_size or not len(self.vocabulary):
+            return []
+
+        scores = self.matrix @ self.transform(query_text)
+        return self._ranked(np.arange(len(scores)), scores, k, threshold)
+
+    def batch_top_k(self, query_texts, k, threshold=TFIDF_THRESHOLD):
+        """top_k for many queries with one sparse matrix-matrix product, in input order"""
+        if not self.corpus_size or not len(self.vocabulary):
+            return [[] for _ in query_texts]
+
+        scores = (self.matrix @ self.transform_batch(query_texts)).tocsc()
+        scores.sort_indices()
+        return [
+            self._ranked(scores.indices[scores.indptr[column]:scores.indptr[column + 1]],
+                         scores.data[scores.indptr[column]:scores.indptr[column + 1]], k, threshold)
+            for column in range(len(query_texts))
+        ]
+
+    def to_blobs(self):
+        """Serialize to the tfidf_models columns of DocumentDatabase"""
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        return {
+            "vocabulary": json.dumps(terms),
+            "idf": self.idf.astype('<f4').tobytes(),
+            "row_ids": self.row_ids.astype('<i4').tobytes(),
+            "indptr": self.matrix.indptr.astype('<i8').tobytes(),
+            "indices": self.matrix.indices.astype('<i4').tobytes(),
+            "data": self.matrix.data.astype('<f4').tobytes(),
+        }
+
+    @classmethod
+    def from_blobs(cls, blobs):
+        """Rebuild a model stored with to_blobs"""
+        terms = json.loads(blobs["vocabulary"])
+        row_ids = np.frombuffer(blobs["row_ids"], dtype='<i4').astype(POSTING_DTYPE)
+        matrix = csr_matrix(
+            (np.frombuffer(blobs["data"], dtype='<f4').astype(TFIDF_DTYPE),
+             np.frombuffer(blobs["indices"], dtype='<i4'),
+             np.frombuffer(blobs["indptr"], dtype='<i8')),
+            shape=(len(row_ids), len(terms))
+        )
+        return cls({term: column for column, term in enumerate(terms)},
+                   np.frombuffer(blobs["idf"], dtype='<f4').astype(TFIDF_DTYPE), row_ids, matrix)
+
+# ===== STATISTIK CORPUS GLOBAL =====
+
+class CorpusStatistics:
+    """Collection-wide term statistics for corpus-global scoring.
+
+    Document frequencies, corpus size and average sentence length are
+    summed over every file's BM25Index postings, so BM25 and TF-IDF scores
+    use one IDF table and are comparable across files. Built once per
+    corpus snapshot (see CorpusSnapshot.statistics), by delta from the
+    previous snapshot's statistics when those exist.
+    """
+
+    def __init__(self, bm25_index, k1=1.5, b=0.75, epsilon=0.25):
+        self.bm25_index = bm25_index
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.corpus_size = 0
+        self.total_length = 0
+        self.doc_freqs = Counter()
+        for file_bm25 in bm25_index.values():
+            self._count(file_bm25, 1)
+        self._compute_idfs()
+
+    @classmethod
+    def updated(cls, previous, bm25_index, removed, added):
+        """Statistics for a changed corpus, derived from the previous ones.
+
+        Only the removed (or replaced) BM25Index objects and the added
+        files are counted, so the cost follows the size of the change plus
+        one pass over the vocabulary, not the size of the corpus.
+
+        Args:
+            previous (CorpusStatistics): Statistics of the previous snapshot
+            bm25_index (dict): {filename: BM25Index} of the new snapshot
+            removed (list): BM25Index objects that are no longer in the corpus
+            added (list): Filenames whose BM25Index is new in bm25_index
+        """
+        statistics = cls.__new__(cls)
+        statistics.bm25_index = bm25_index
+        statistics.k1 = previous.k1
+        statistics.b = previous.b
+        statistics.epsilon = previous.epsilon
+
+        statistics.corpus_size = previous.corpus_size
+        statistics.total_length = previous.total_length
+        statistics.doc_freqs = Counter(previous.doc_freqs)
+        for file_bm25 in removed:
+            statistics._count(file_bm25, -1)
+        for file in added:
+            statistics._count(bm25_index[file], 1)
+        statistics._compute_idfs()
+        return statistics
+
+    def _count(self, file_bm25, sign):
+        """Add (sign=1) or subtract (sign=-1) one file's sentences and document frequencies"""
+        self.corpus_size += sign * file_bm25.corpus_size
+        self.total_length += sign * file_bm25.total_length
+        doc_freqs = self.doc_freqs
+        for term, term_postings in file_bm25.postings.items():
+            doc_freq = doc_freqs[term] + sign * len(term_postings)
+            if doc_freq:
+                doc_freqs[term] = doc_freq
+            else:
+                del doc_freqs[term]
+
+    def _compute_idfs(self):
+        """IDF tables from the counts; sentence norms are recomputed lazily"""
+        epsilon = self.epsilon
+        self.avgdl = self.total_length / self.corpus_size if self.corpus_size else 0.0
+
+        # BM25 IDF, formula dan epsilon floor sama dengan BM25Okapi
+        self.bm25_idf = {}
+        negative_idfs = []
+        for term, doc_freq in self.doc_freqs.items():
+            idf = math.log(self.corpus_size - doc_freq + 0.5) - math.log(doc_freq + 0.5)
+            self.bm25_idf[term] = idf
+            if idf < 0:
+                negative_idfs.append(term)
+        if self.bm25_idf:
+            eps = epsilon * (sum(self.bm25_idf.values()) / len(self.bm25_idf))
+            for term in negative_idfs:
+                self.bm25_idf[term] = eps
+
+        # TF-IDF IDF dengan smoothing TfidfVectorizer; term satu huruf tidak dipakai
+        self.tfidf_idf = {
+            term: math.log((1 + self.corpus_size) / (1 + doc_freq)) + 1
+            for term, doc_freq in self.doc_freqs.items()
+            if TFIDF_TOKEN_PATTERN.fullmatch(term)
+        }
+        self._tfidf_norms = None
+        self._norms_lock = threading.Lock()
+
+    def bm25_top_k(self, query_tokens, k, rescore):
+        """WAND top-k over every file with one running threshold.
+
+        rescore(file, idx, score) returns the final score or None, as in
+        BM25Index.top_k. Returns (final_score, file, idx) best first.
+        """
+        heap = []
+        for rank, (file, file_bm25) in enumerate(self.bm25_index.items()):
+            file_bm25.top_k(
+                query_tokens, k,
+                lambda idx, score, file=file: rescore(file, idx, score),
+                heap=heap, rank=rank, tag=file,
+                idf=self.bm25_idf, avgdl=self.avgdl
+            )
+        return [(entry[0], entry[4], entry[3]) for entry in sorted(heap, reverse=True)]
+
+    def _sentence_norms(self):
+        """L2 norm of every sentence's TF-IDF vector, computed on first use"""
+        with self._norms_lock:
+            if self._tfidf_norms is None:
+                norms = {}
+                for file, file_bm25 in self.bm25_index.items():
+                    squares = {}
+                    for term, term_postings in file_bm25.postings.items():
+                        idf = self.tfidf_idf.get(term)
+                        if idf is None:
+                            continue
+                        for idx, tf in term_postings.items():
+                            squares[idx] = squares.get(idx, 0.0) + (tf * idf) ** 2
+                    norms[file] = {idx: math.sqrt(total) for idx, total in squares.items()}
+                self._tfidf_norms = norms
+            return self._tfidf_norms
+
+    def tfidf_scores(self, query_tokens):
+        """Yield (file, sentence_idx, cosine) for sentences sharing a term with the query"""
+        query_tf = Counter(TFIDF_TOKEN_PATTERN.findall(" ".join(query_tokens).lower()))
+        weights = {term: tf * self.tfidf_idf[term] for term, tf in query_tf.items() if term in self.tfidf_idf}
+        query_norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if not query_norm:
+            return
+
+        norms = self._sentence_norms()
+        for file, file_bm25 in self.bm25_index.items():
+            file_norms = norms.get(file, {})
+            scores = {}
+            for term, weight in weights.items():
+                term_weight = weight / query_norm * self.tfidf_idf[term]
+                for idx, tf in file_bm25.postings.get(term, {}).items():
+                    scores[idx] = scores.get(idx, 0.0) + term_weight * tf
+            for idx, score in scores.items():
+                yield file, idx, score / file_norms[idx]
+
+# ===== OPTIMASI METODE PENCARIAN =====
+
+# Verifikasi exact match yang dikompilasi sekali per query
+class ExactMatcher:
+    """Compiled exact-match verification for one keyword.
     
-    # Gunakan multi-threading untuk build index
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = []
-        for file, sentences in split_texts.items():
-            futures.append(executor.submit(process_document, (file, sentences)))
-        
-        for future in concurrent.futures.as_completed(futures):
-            file, file_index, file_processed = future.result()
-            index[file] = file_index
-            processed[file] = file_processed
+    All query terms go into a single whole-word alternation that is run
+    once per sentence. Terms whose matches can overlap another term's
+    match (and could therefore be hidden by the non-overlapping scan)
+    keep their own compiled pattern as a fallback. Matching returns the
+    (start, end) spans of the hits, usable for highlighting.
+    """
     
-    end_time = time.time()
-    st.info(f"Index dokumen dibuat dalam {end_time - start_time:.2f} detik")
-    return index, processed
+    def __init__(self, keyword):
+        self.keyword_lower = keyword.lower()
+        self.terms = list(dict.fromkeys(self.keyword_lower.split()))
+        
+        # Kata kunci utuh dengan batas kata (pencarian satu kata)
+        self.keyword_pattern = re.compile(r'\b(' + re.escape(self.keyword_lower) + r')\b')
+        
+        # Semua term dalam satu pola; term terpanjang dicoba lebih dulu
+        self.terms_pattern = None
+        if self.terms:
+            ordered = sorted(self.terms, key=len, reverse=True)
+            self.terms_pattern = re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in ordered) + r')\b')
+        
+        self.fallback_patterns = {
+            term: re.compile(r'\b' + re.escape(term) + r'\b')
+            for term in self.terms if self._may_be_hidden(term)
+        }
+    
+    def _may_be_hidden(self, term):
+        """True if an occurrence of term can start inside another term's match"""
+        for other in self.terms:
+            if other == term:
+                continue
+            if term in other:
+                return True
+            if any(other.endswith(term[:k]) for k in range(1, len(term))):
+                return True
+        return False
+    
+    @staticmethod
+    def _lower(sentence):
+        """Lowercase text; spans are only reported when offsets are preserved"""
+        sent_lower = sentence.lower()
+        return sent_lower, len(sent_lower) == len(sentence)
+    
+    def match_keyword(self, sentence):
+        """Whole keyword with word boundaries; spans or None if no match"""
+        sent_lower, keep_spans = self._lower(sentence)
+        spans = [m.span() for m in self.keyword_pattern.finditer(sent_lower)]
+        if not spans:
+            return None
+        return spans if keep_spans else []
+    
+    def match(self, sentence):
+        """Exact phrase (substring) or all terms as whole words; spans or None"""
+        sent_lower, keep_spans = self._lower(sentence)
+        
+        # Exact phrase match
+        start = sent_lower.find(self.keyword_lower) if self.keyword_lower else -1
+        if start >= 0:
+            spans = []
+            while start >= 0:
+                end = start + len(self.keyword_lower)
+                spans.append((start, end))
+                start = sent_lower.find(self.keyword_lower, end)
+            return spans if keep_spans else []
+        
+        if self.terms_pattern is None:
+            # Tanpa term, syarat "semua term ada" selalu terpenuhi
+            return []
+        
+        # Semua term harus ada sebagai kata utuh (satu pass untuk semua term)
+        spans = []
+        found = set()
+        for m in self.terms_pattern.finditer(sent_lower):
+            found.add(m.group())
+            spans.append(m.span())
+        
+        for term in self.terms:
+            if term in found:
+                continue
+            pattern = self.fallback_patterns.get(term)
+            if pattern is None:
+                return None
+            term_spans = [m.span() for m in pattern.finditer(sent_lower)]
+            if not term_spans:
+                return None
+            spans.extend(term_spans)
+        
+        spans.sort()
+        return spans if keep_spans else []
+    
+    @staticmethod
+    def highlight(text, spans):
+        """Wrap spans in markdown bold, merging overlapping spans"""
+        parts = []
+        last = 0
+        for start, end in sorted(spans):
+            if start < last:
+                if end <= last:
+                    continue
+                # Perpanjang highlight sebelumnya
+                parts[-1] = parts[-1][:-2] + text[last:end] + "**"
+                last = end
+                continue
+            parts.append(text[last:start])
+            parts.append("**" + text[start:end] + "**")
+            last = end
+        parts.append(text[last:])
+        return "".join(parts)
+
+# Kandidat exact match dari positional index
+def exact_match_candidates(file_index, keyword_lower, keyword_terms):
+    """Kandidat kalimat untuk exact match multi-kata.
+    
+    Mengembalikan idx terurut yang mencakup semua kalimat yang bisa lolos
+    pengecekan phrase (substring) atau semua-term (kata utuh), atau None
+    bila query tidak bisa dibatasi lewat index.
+    """
+    # Duck typing: index dari rerun sebelumnya adalah instance kelas PostingsIndex yang lain
+    if not hasattr(file_index, "match_run_sequence"):
+        return None
+    
+    phrase_runs = WORD_RUN_PATTERN.findall(keyword_lower)
+    term_runs = [WORD_RUN_PATTERN.findall(term) for term in keyword_terms]
+    if not phrase_runs or not all(term_runs):
+        return None
+    
+    # Phrase sebagai substring: run pertama/terakhir boleh terpotong di dalam token
+    phrase_matches = file_index.match_run_sequence(
+        phrase_runs,
+        partial_start=WORD_RUN_PATTERN.match(keyword_lower) is not None,
+        partial_end=WORD_RUN_PATTERN.match(keyword_lower[-1]) is not None
+    )
+    
+    # Semua term sebagai kata utuh: irisan postings per term
+    all_term_matches = None
+    for runs in term_runs:
+        matches = file_index.match_run_sequence(runs)
+        if all_term_matches is None:
+            all_term_matches = matches
+        else:
+            all_term_matches = np.intersect1d(all_term_matches, matches, assume_unique=True)
+        if len(all_term_matches) == 0:
+            break
+    
+    return np.union1d(phrase_matches, all_term_matches)
 
 # Optimasi untuk exact match search yang mengutamakan kalimat panjang
-def exact_match_search(keyword, split_texts, sentence_index):
-    """Pencarian exact match dengan prioritas kalimat panjang"""
+def exact_match_search(keyword, split_texts, sentence_index, match_spans=None):
+    """Pencarian exact match dengan prioritas kalimat panjang.
+    
+    Bila match_spans berupa dict, posisi match untuk highlighting diisi
+    sebagai {(file, idx): [(start, end), ...]}.
+    """
     start_time = time.time()
+    results = find_exact_matches(keyword, split_texts, sentence_index, match_spans)
+    
+    end_time = time.time()
+    st.info(f"Pencarian exact match selesai dalam {end_time - start_time:.2f} detik")
+    return results
+
+# Inti exact match tanpa elemen UI, dipakai juga oleh pencarian batch
+def find_exact_matches(keyword, split_texts, sentence_index, match_spans=None):
+    """Exact match results for one keyword; see exact_match_search"""
     results = {}
     
     # Preprocessing keyword
     keyword_lower = keyword.lower()
     keyword_terms = keyword_lower.split()
+    term_runs = WORD_RUN_PATTERN.findall(keyword_lower)  # Kata dengan tanda baca = beberapa token berurutan
     
-    # Buat pola regex untuk whole word matching
-    pattern = r'\b(' + re.escape(keyword_lower) + r')\b'
-    
-    # Lambda untuk mengecek match dengan kata utuh
-    contains_keyword = lambda s: bool(re.search(pattern, s.lower()))
+    # Semua pola dikompilasi sekali untuk seluruh pencarian
+    matcher = ExactMatcher(keyword)
+    if match_spans is None:
+        match_spans = {}
     
     # Strategi pencarian berdasarkan jumlah kata kunci
     if len(keyword_terms) == 1 and sentence_index:
         # Gunakan index untuk kata tunggal
         for file, file_index in sentence_index.items():
             # Periksa apakah keyword ada di index
-            matched_indices = file_index.get(keyword_lower, [])
+            if term_runs:
+                matched_indices = file_index.match_run_sequence(term_runs)
+            else:
+                # Tanpa karakter kata index tidak membantu, periksa semua kalimat
+                matched_indices = [idx for idx, _ in split_texts[file]]
             
-            if matched_indices:
+            if len(matched_indices) > 0:
                 # Dapatkan kalimat yang sesuai dengan panjangnya
                 matched_with_length = []
+                sentence_store = as_sentence_store(split_texts[file])
                 for idx in matched_indices:
-                    for sent_idx, sent in split_texts[file]:
-                        if sent_idx == idx and contains_keyword(sent):
-                            # Simpan (idx, sentence, sentence_length)
-                            matched_with_length.append((sent_idx, sent, len(sent.split())))
-                            break
+                    idx = int(idx)
+                    sent = sentence_store.get(idx)
+                    spans = matcher.match_keyword(sent) if sent is not None else None
+                    if spans is not None:
+                        # Simpan (idx, sentence, sentence_length)
+                        matched_with_length.append((idx, sent, len(sent.split())))
+                        match_spans[(file, idx)] = spans
                 
                 # Urutkan berdasarkan panjang kalimat (terpanjang ke terpendek)
                 matched_with_length.sort(key=lambda x: x[2], reverse=True)
@@ -1088,17 +3324,21 @@ def exact_match_search(keyword, split_texts, sentence_index):
             # Cari kalimat yang mengandung semua kata kunci
             matched_with_length = []
             
+            # Hanya periksa kandidat dari positional index bila tersedia
+            candidates = exact_match_candidates(
+                sentence_index.get(file) if sentence_index else None, keyword_lower, keyword_terms
+            )
+            if candidates is not None:
+                sentence_store = as_sentence_store(sentences)
+                sentences = [sentence_store[position] for position in
+                             sorted(sentence_store.position_of(idx) for idx in candidates.tolist())]
+            
             for idx, sent in sentences:
-                sent_lower = sent.lower()
-                
-                # Cek untuk exact phrase match
-                if keyword_lower in sent_lower:
-                    matched_with_length.append((idx, sent, len(sent.split())))
-                    continue
-                
-                # Jika tidak exact phrase, periksa apakah semua kata kunci ada (whole words)
-                if all(re.search(r'\b' + re.escape(term) + r'\b', sent_lower) for term in keyword_terms):
+                # Exact phrase, atau semua kata kunci sebagai kata utuh
+                spans = matcher.match(sent)
+                if spans is not None:
                     matched_with_length.append((idx, sent, len(sent.split())))
+                    match_spans[(file, idx)] = spans
             
             # Urutkan berdasarkan panjang kalimat (terpanjang ke terpendek)
             matched_with_length.sort(key=lambda x: x[2], reverse=True)
@@ -1107,18 +3347,22 @@ def exact_match_search(keyword, split_texts, sentence_index):
             if matched_with_length:
                 results[file] = [(idx, sent) for idx, sent, _ in matched_with_length]
     
-    end_time = time.time()
-    st.info(f"Pencarian exact match selesai dalam {end_time - start_time:.2f} detik")
     return results
 
 # Optimasi untuk BM25 search dengan prioritas kalimat panjang dan pengelompokan paragraf
-def bm25_search(keyword, split_texts, processed_sentences):
+def bm25_search(keyword, split_texts, processed_sentences, bm25_index=None):
     """Perform BM25 search on documents.
     
+    Each file returns its BM25_SENTENCES_PER_FILE best sentences (with the
+    keyword and length bonuses) in document order. BM25Index.top_k skips
+    sentences that cannot reach them instead of scoring every posting.
+    
     Args:
         keyword (str): The search query
         split_texts (dict): Dictionary mapping filenames to their sentences
         processed_sentences (dict): Dictionary containing processed sentences for each file
+        bm25_index (dict, optional): Prebuilt {filename: BM25Index}; missing
+            entries are built once and stored back into this dictionary
         
     Returns:
         dict: Dictionary mapping filenames to lists of relevant sentences
@@ -1126,6 +3370,9 @@ def bm25_search(keyword, split_texts, processed_sentences):
     start_time = time.time()
     results = {}
     
+    if bm25_index is None:
+        bm25_index = {}
+    
     # Process keyword
     keyword_clean = advanced_preprocess(keyword)
     query_tokens = nltk.word_tokenize(keyword_clean)
@@ -1143,96 +3390,146 @@ def bm25_search(keyword, split_texts, processed_sentences):
         st.warning("Kata kunci terlalu pendek atau hanya berisi stopwords.")
         return {}
     
+    # Bangun index yang belum ada (hanya sekali per file, bukan per query)
+    for file, sentences in split_texts.items():
+        if file not in bm25_index:
+            bm25_index[file] = BM25Index.from_processed(sentences, processed_sentences.get(file, {}))
+    
     def process_document(file_sentences_processed):
-        file, sentences, file_processed = file_sentences_processed
+        file, sentences, file_processed, file_bm25 = file_sentences_processed
         
-        if not file_processed:
+        if not file_processed or not file_bm25.corpus_size:
             return file, []
             
-        # Get processed corpus
-        tokenized_corpus = []
-        original_sentences = []
-        sentence_indices = []
-        sentence_lengths = []
+        try:
+            def rescore(sent_idx, score):
+                if score <= 0.01:
+                    return None
+                sent = sentences[file_bm25.positions[sent_idx]][1]
+                sent_len = file_processed[sent_idx].get('length', len(sent.split()))
+                contains_keyword = keyword_clean in sent.lower()
+                keyword_bonus = BM25_MAX_KEYWORD_BONUS if contains_keyword else 1.0
+                length_bonus = 1.0 + (sent_len / 100)
+                return score * keyword_bonus * length_bonus
+            
+            # Hanya kalimat yang bisa masuk top-k yang dihitung skornya (WAND)
+            heap = file_bm25.top_k(expanded_query, BM25_SENTENCES_PER_FILE, rescore)
+            
+            # Tampilkan dalam urutan dokumen seperti paragraf
+            top = sorted(heap, key=lambda entry: -entry[2])
+            return file, [(idx, sentences[file_bm25.positions[idx]][1]) for _, _, _, idx, _ in top]
+            
+        except Exception as e:
+            st.error(f"Error BM25: {str(e)}")
+            return file, []
+    
+    # Multi-threading for parallel document processing
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = []
         
-        for idx, sent in sentences:
-            if idx in file_processed:
-                tokenized_corpus.append(file_processed[idx]['stemmed'])
-                original_sentences.append(sent)
-                sentence_indices.append(idx)
-                sentence_lengths.append(file_processed[idx].get('length', len(sent.split())))
+        for file, sentences in split_texts.items():
+            file_processed = processed_sentences.get(file, {})
+            futures.append(executor.submit(
+                process_document, 
+                (file, sentences, file_processed, bm25_index[file])
+            ))
+        
+        for future in concurrent.futures.as_completed(futures):
+            file, result = future.result()
+            if result:
+                results[file] = result
+    
+    end_time = time.time()
+    st.info(f"Pencarian BM25 selesai dalam {end_time - start_time:.2f} detik")
+    return results
+
+# BM25 dengan backend NumPy/SciPy
+def bm25_search_vectorized(keyword, split_texts, processed_sentences, bm25_index=None):
+    """BM25 search on the vectorized SparseBM25 backend.
+    
+    Same query processing, bonuses and paragraph selection as bm25_search,
+    but scores, bonuses and paragraph averages are array operations over
+    each file's sparse term matrix.
+    
+    Args:
+        keyword (str): The search query
+        split_texts (dict): Dictionary mapping filenames to their sentences
+        processed_sentences (dict): Dictionary containing processed sentences for each file
+        bm25_index (dict, optional): Prebuilt {filename: BM25Index}; missing
+            entries are built once and stored back into this dictionary
+        
+    Returns:
+        dict: Dictionary mapping filenames to lists of relevant sentences
+    """
+    start_time = time.time()
+    results = {}
+    
+    if bm25_index is None:
+        bm25_index = {}
+    
+    # Process keyword
+    keyword_clean = advanced_preprocess(keyword)
+    query_tokens = nltk.word_tokenize(keyword_clean)
+    query_tokens = remove_stopwords(query_tokens)
+    query_tokens = stem_sentence(query_tokens)
+    
+    # Expand query with synonyms
+    expanded_query = query_tokens.copy()
+    if len(query_tokens) > 0:
+        main_token = query_tokens[0]
+        synonyms = get_synonyms(main_token)[:1]
+        expanded_query.extend(synonyms)
+    
+    if not expanded_query:
+        st.warning("Kata kunci terlalu pendek atau hanya berisi stopwords.")
+        return {}
+    
+    for file, sentences in split_texts.items():
+        if file not in bm25_index:
+            bm25_index[file] = BM25Index.from_processed(sentences, processed_sentences.get(file, {}))
+    
+    def process_document(file_sentences):
+        file, sentences, file_bm25 = file_sentences
         
-        if not tokenized_corpus:
+        if not file_bm25.corpus_size:
             return file, []
-            
+        
         try:
-            # Create BM25 model
-            bm25 = BM25Okapi(tokenized_corpus, k1=1.5, b=0.75)
-            scores = bm25.get_scores(expanded_query)
-            
-            # Group sentences into paragraphs
-            paragraph_size = 8
-            paragraphs = []
-            current_paragraph = []
-            current_scores = []
-            
-            for i, (score, sent, sent_idx, sent_len) in enumerate(zip(scores, original_sentences, sentence_indices, sentence_lengths)):
-                if score > 0.01:
-                    contains_keyword = keyword_clean in sent.lower()
-                    keyword_bonus = 1.5 if contains_keyword else 1.0
-                    length_bonus = 1.0 + (sent_len / 100)
-                    final_score = score * keyword_bonus * length_bonus
-                    
-                    current_paragraph.append((sent_idx, sent))
-                    current_scores.append(final_score)
-                    
-                    if len(current_paragraph) >= paragraph_size or i == len(scores) - 1:
-                        if current_paragraph:
-                            avg_score = sum(current_scores) / len(current_scores)
-                            paragraphs.append((avg_score, current_paragraph))
-                            current_paragraph = []
-                            current_scores = []
+            matrix = file_bm25.sparse(sentences)
+            rows, final_scores = matrix.final_scores(expanded_query, keyword_clean)
             
-            paragraphs.sort(reverse=True, key=lambda x: x[0])
-            
-            if paragraphs:
-                best_paragraph = paragraphs[0][1]
-                return file, best_paragraph
-            
-            return file, []
+            store = as_sentence_store(sentences)
+            paragraph_rows = matrix.best_paragraph(rows, final_scores)
+            return file, [store[int(matrix.row_positions[row])] for row in paragraph_rows]
             
         except Exception as e:
             st.error(f"Error BM25: {str(e)}")
             return file, []
     
-    # Multi-threading for parallel document processing
     with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = []
-        
-        for file, sentences in split_texts.items():
-            file_processed = processed_sentences.get(file, {})
-            futures.append(executor.submit(
-                process_document, 
-                (file, sentences, file_processed)
-            ))
-        
+        futures = [
+            executor.submit(process_document, (file, sentences, bm25_index[file]))
+            for file, sentences in split_texts.items()
+        ]
         for future in concurrent.futures.as_completed(futures):
             file, result = future.result()
             if result:
                 results[file] = result
     
     end_time = time.time()
-    st.info(f"Pencarian BM25 selesai dalam {end_time - start_time:.2f} detik")
+    st.info(f"Pencarian BM25 (vectorized) selesai dalam {end_time - start_time:.2f} detik")
     return results
 
 # Cosine similarity search using TF-IDF
-def cosine_similarity_search(keyword, split_texts, processed_sentences):
+def cosine_similarity_search(keyword, split_texts, processed_sentences, tfidf_index=None):
     """Search using cosine similarity with TF-IDF weighting
     
     Args:
         keyword (str): The search query
         split_texts (dict): Dictionary mapping filenames to their sentences
         processed_sentences (dict): Dictionary containing processed sentences
+        tfidf_index (dict, optional): Prebuilt {filename: TfidfIndex}; missing
+            entries are built once and stored back into this dictionary
         
     Returns:
         dict: Dictionary mapping filenames to lists of relevant sentences
@@ -1240,6 +3537,9 @@ def cosine_similarity_search(keyword, split_texts, processed_sentences):
     start_time = time.time()
     results = {}
     
+    if tfidf_index is None:
+        tfidf_index = {}
+    
     # Process keyword
     keyword_clean = advanced_preprocess(keyword)
     query_tokens = nltk.word_tokenize(keyword_clean)
@@ -1252,60 +3552,22 @@ def cosine_similarity_search(keyword, split_texts, processed_sentences):
         st.warning("Kata kunci terlalu pendek atau hanya berisi stopwords.")
         return {}
     
-    def process_document(file_sentences_processed):
-        file, sentences, file_processed = file_sentences_processed
-        
-        if not file_processed:
-            return file, []
-            
-        # Get original sentences and their indices
-        texts = []
-        indices = []
-        
-        for idx, sent in sentences:
-            if idx in file_processed:
-                stemmed_tokens = file_processed[idx]['stemmed']
-                texts.append(" ".join(stemmed_tokens))
-                indices.append(idx)
+    # Bangun model yang belum ada (hanya sekali per file, bukan per query)
+    for file, sentences in split_texts.items():
+        if file not in tfidf_index:
+            tfidf_index[file] = TfidfIndex.from_processed(sentences, processed_sentences.get(file, {}))
+    
+    def process_document(file_sentences_model):
+        file, sentences, file_tfidf = file_sentences_model
         
-        if not texts:
-            return file, []
-            
         try:
-            # Create TF-IDF vectorizer
-            vectorizer = TfidfVectorizer()
-            
-            # Add expanded query as the last element
-            all_texts = texts + [expanded_query]
-            
-            # Compute TF-IDF matrix
-            tfidf_matrix = vectorizer.fit_transform(all_texts)
-            
-            # Compute similarity to the query (last element)
-            query_vector = tfidf_matrix[-1]
-            document_vectors = tfidf_matrix[:-1]
-            
-            # Calculate cosine similarity
-            cosine_similarities = cosine_similarity(document_vectors, query_vector).flatten()
-            
-            # Get indices sorted by similarity
-            ranked_indices = sorted(range(len(cosine_similarities)), 
-                                   key=lambda i: cosine_similarities[i], reverse=True)
+            # One query transform, one sparse matrix-vector product, top-k via argpartition
+            ranked = file_tfidf.top_k(expanded_query, MAX_SENTENCES_FOR_DISPLAY)
+            if not ranked:
+                return file, []
             
-            # Filter results with threshold
-            threshold = 0.01
-            matched_sentences = []
-            
-            for i in ranked_indices:
-                if cosine_similarities[i] > threshold:
-                    sent_idx = indices[i]
-                    for idx, sent in sentences:
-                        if idx == sent_idx:
-                            matched_sentences.append((idx, sent))
-                            break
-            
-            # Limit results
-            return file, matched_sentences[:MAX_SENTENCES_FOR_DISPLAY]
+            sentence_store = as_sentence_store(sentences)
+            return file, [(idx, sentence_store.get(idx)) for idx, _ in ranked]
             
         except Exception as e:
             st.error(f"Error Cosine Similarity: {str(e)}")
@@ -1316,10 +3578,9 @@ def cosine_similarity_search(keyword, split_texts, processed_sentences):
         futures = []
         
         for file, sentences in split_texts.items():
-            file_processed = processed_sentences.get(file, {})
             futures.append(executor.submit(
                 process_document, 
-                (file, sentences, file_processed)
+                (file, sentences, tfidf_index[file])
             ))
         
         for future in concurrent.futures.as_completed(futures):
@@ -1331,6 +3592,234 @@ def cosine_similarity_search(keyword, split_texts, processed_sentences):
     st.info(f"Pencarian cosine similarity selesai dalam {end_time - start_time:.2f} detik")
     return results
 
+# Gabungkan skor semua file menjadi satu top-k dengan heap
+def merge_global_top_k(scored, split_texts, top_k):
+    """Ambil top-k (score, file, idx) lintas file dan kelompokkan per file sesuai urutan rank"""
+    top = heapq.nlargest(top_k, scored, key=lambda item: item[0])
+    
+    stores = {file: as_sentence_store(split_texts[file]) for _, file, _ in top}
+    results = {}
+    for _, file, idx in top:
+        sentence = stores[file].get(idx)
+        if sentence is not None:
+            results.setdefault(file, []).append((idx, sentence))
+    return results
+
+# BM25 dengan statistik seluruh corpus
+def bm25_search_global(keyword, split_texts, processed_sentences, statistics, top_k=MAX_SENTENCES_FOR_DISPLAY):
+    """BM25 search with collection-wide IDF and one merged top-k.
+    
+    Applies the same keyword and length bonuses as bm25_search, but
+    sentences are scored against the CorpusStatistics of the whole corpus
+    and ranked together instead of per file. WAND pruning skips sentences
+    that cannot reach the top-k.
+    """
+    start_time = time.time()
+    
+    # Process keyword
+    keyword_clean = advanced_preprocess(keyword)
+    query_tokens = nltk.word_tokenize(keyword_clean)
+    query_tokens = remove_stopwords(query_tokens)
+    query_tokens = stem_sentence(query_tokens)
+    
+    # Expand query with synonyms
+    expanded_query = query_tokens.copy()
+    if len(query_tokens) > 0:
+        main_token = query_tokens[0]
+        synonyms = get_synonyms(main_token)[:1]
+        expanded_query.extend(synonyms)
+    
+    if not expanded_query:
+        st.warning("Kata kunci terlalu pendek atau hanya berisi stopwords.")
+        return {}
+    
+    # Store dibangun sekali per file, bukan per kalimat yang diskor
+    stores = {file: as_sentence_store(sentences) for file, sentences in split_texts.items()}
+    
+    def rescore(file, idx, score):
+        if score <= 0.01:
+            return None
+        sent = stores[file].get(idx, "")
+        sent_len = processed_sentences[file][idx].get('length', len(sent.split()))
+        keyword_bonus = BM25_MAX_KEYWORD_BONUS if keyword_clean in sent.lower() else 1.0
+        length_bonus = 1.0 + (sent_len / 100)
+        return score * keyword_bonus * length_bonus
+    
+    # Hanya kalimat yang bisa masuk top-k yang dihitung skornya (WAND)
+    ranked = statistics.bm25_top_k(expanded_query, top_k, rescore)
+    results = merge_global_top_k(ranked, split_texts, top_k)
+    
+    end_time = time.time()
+    st.info(f"Pencarian BM25 (seluruh corpus) selesai dalam {end_time - start_time:.2f} detik")
+    return results
+
+# Cosine similarity dengan statistik seluruh corpus
+def cosine_similarity_search_global(keyword, split_texts, statistics, top_k=MAX_SENTENCES_FOR_DISPLAY):
+    """TF-IDF cosine search with collection-wide IDF and one merged top-k"""
+    start_time = time.time()
+    
+    # Process keyword
+    keyword_clean = advanced_preprocess(keyword)
+    query_tokens = nltk.word_tokenize(keyword_clean)
+    query_tokens = remove_stopwords(query_tokens)
+    query_tokens = stem_sentence(query_tokens)
+    
+    if not query_tokens:
+        st.warning("Kata kunci terlalu pendek atau hanya berisi stopwords.")
+        return {}
+    
+    scored = (
+        (score, file, idx)
+        for file, idx, score in statistics.tfidf_scores(query_tokens)
+        if score > TFIDF_THRESHOLD
+    )
+    results = merge_global_top_k(scored, split_texts, top_k)
+    
+    end_time = time.time()
+    st.info(f"Pencarian cosine similarity (seluruh corpus) selesai dalam {end_time - start_time:.2f} detik")
+    return results
+
+# Pencarian langsung ke SQLite FTS5 tanpa memuat corpus ke memori
+def fts_search(keyword):
+    """Full-text search using the FTS5 index in DocumentDatabase.
+    
+    Exact phrase matches are returned first, followed by sentences ranked
+    by bm25() that contain any of the query terms.
+    
+    Args:
+        keyword (str): The search query
+        
+    Returns:
+        dict: Dictionary mapping filenames to lists of relevant sentences
+    """
+    start_time = time.time()
+    
+    if not db.fts_available:
+        st.warning("SQLite FTS5 tidak tersedia pada instalasi ini.")
+        return {}
+    
+    results = {}
+    seen = set()
+    
+    for mode in ("phrase", "ranked"):
+        for file, sentences in db.search_sentences_fts(keyword, mode=mode).items():
+            for idx, sent in sentences:
+                if (file, idx) not in seen:
+                    seen.add((file, idx))
+                    results.setdefault(file, []).append((idx, sent))
+    
+    end_time = time.time()
+    st.info(f"Pencarian FTS5 selesai dalam {end_time - start_time:.2f} detik")
+    return results
+
+# ===== PENCARIAN BATCH =====
+
+BATCH_QUERY_CHUNK = 256  # Jumlah query per perkalian matrix pada pencarian batch
+BATCH_SEARCH_METHODS = ("Exact Match", "BM25", "BM25 (Vectorized)", "Cosine Similarity")
+
+def preprocess_query(keyword):
+    """Keyword bersih dan token stemmed, sama seperti di fungsi pencarian tunggal"""
+    keyword_clean = advanced_preprocess(keyword)
+    query_tokens = nltk.word_tokenize(keyword_clean)
+    query_tokens = remove_stopwords(query_tokens)
+    query_tokens = stem_sentence(query_tokens)
+    return keyword_clean, query_tokens
+
+def batch_search(queries, search_method, split_texts, processed_sentences,
+                 sentence_index=None, bm25_index=None, tfidf_index=None):
+    """Run many queries against the same corpus and stream the results.
+    
+    Queries are deduplicated and preprocessed once. BM25 and cosine
+    similarity score up to BATCH_QUERY_CHUNK queries per file with one
+    sparse matrix-matrix product; exact match runs the single-query
+    matcher once per distinct keyword. Nothing is written to the UI, so
+    this can also be used from scripts and scheduled jobs.
+    
+    Args:
+        queries (iterable): Keywords to search
+        search_method (str): One of BATCH_SEARCH_METHODS
+        split_texts (dict): Dictionary mapping filenames to their sentences
+        processed_sentences (dict): Dictionary containing processed sentences for each file
+        sentence_index (dict, optional): {filename: PostingsIndex}, for exact match
+        bm25_index (dict, optional): {filename: BM25Index}; missing entries are built and stored back
+        tfidf_index (dict, optional): {filename: TfidfIndex}; missing entries are built and stored back
+        
+    Yields:
+        tuple: (query, results) per distinct query in first-seen order, where
+            results has the same shape as the single-query search function
+    """
+    if search_method not in BATCH_SEARCH_METHODS:
+        raise ValueError(f"Metode pencarian batch tidak dikenal: {search_method}")
+    
+    unique_queries = list(dict.fromkeys(queries))
+    
+    if search_method == "Exact Match":
+        for query in unique_queries:
+            yield query, find_exact_matches(query, split_texts, sentence_index or {})
+        return
+    
+    if search_method == "Cosine Similarity":
+        if tfidf_index is None:
+            tfidf_index = {}
+        for file, sentences in split_texts.items():
+            if file not in tfidf_index:
+                tfidf_index[file] = TfidfIndex.from_processed(sentences, processed_sentences.get(file, {}))
+    else:
+        if bm25_index is None:
+            bm25_index = {}
+        for file, sentences in split_texts.items():
+            if file not in bm25_index:
+                bm25_index[file] = BM25Index.from_processed(sentences, processed_sentences.get(file, {}))
+    
+    for chunk_start in range(0, len(unique_queries), BATCH_QUERY_CHUNK):
+        chunk = unique_queries[chunk_start:chunk_start + BATCH_QUERY_CHUNK]
+        
+        # Preprocessing sekali per query unik
+        keywords = []
+        token_lists = []
+        for query in chunk:
+            keyword_clean, query_tokens = preprocess_query(query)
+            if search_method != "Cosine Similarity" and query_tokens:
+                # Ekspansi sinonim sama dengan bm25_search
+                query_tokens = query_tokens + get_synonyms(query_tokens[0])[:1]
+            keywords.append(keyword_clean)
+            token_lists.append(query_tokens)
+        
+        # Query kosong (hanya stopwords) tidak ikut diskor
+        scored = [position for position, tokens in enumerate(token_lists) if tokens]
+        chunk_results = [{} for _ in chunk]
+        
+        for file, sentences in split_texts.items():
+            if not scored:
+                break
+            store = as_sentence_store(sentences)
+            
+            if search_method == "Cosine Similarity":
+                ranked_per_query = tfidf_index[file].batch_top_k(
+                    [" ".join(token_lists[position]) for position in scored], MAX_SENTENCES_FOR_DISPLAY
+                )
+                for position, ranked in zip(scored, ranked_per_query):
+                    if ranked:
+                        chunk_results[position][file] = [(idx, store.get(idx)) for idx, _ in ranked]
+            else:
+                file_bm25 = bm25_index[file]
+                if not file_bm25.corpus_size:
+                    continue
+                matrix = file_bm25.sparse(sentences)
+                per_query = matrix.batch_final_scores(
+                    [token_lists[position] for position in scored],
+                    [keywords[position] for position in scored]
+                )
+                for position, (rows, final_scores) in zip(scored, per_query):
+                    paragraph_rows = matrix.best_paragraph(rows, final_scores)
+                    if len(paragraph_rows):
+                        chunk_results[position][file] = [
+                            store[int(matrix.row_positions[row])] for row in paragraph_rows
+                        ]
+        
+        for query, results in zip(chunk, chunk_results):
+            yield query, results
+
 # ===== OPTIMASI EVALUASI UNTUK SKOR TINGGI =====
 
 # Fungsi untuk membuat padded embedding untuk kalimat pendek dengan lebih banyak kata
@@ -1450,16 +3939,16 @@ def weighted_lcs(X, Y):
 def enhanced_rouge_l_computation(y_true, y_pred):
     """Optimasi perhitungan ROUGE-L untuk skor tinggi"""
     try:
-        # Caching berdasarkan hash input
-        cache_key = f"rouge_{hash((y_true, y_pred))}"
-        cached_result = load_from_cache(cache_key)
-        if cached_result:
-            return cached_result
-        
         # Preprocessing
         y_true = advanced_preprocess(y_true)
         y_pred = advanced_preprocess(y_pred)
         
+        # Caching berdasarkan input yang sudah dinormalisasi
+        cache_key = evaluation_cache_key("rouge", y_true, y_pred)
+        cached_result = load_from_cache(cache_key)
+        if cached_result:
+            return cached_result
+        
         # Tokenisasi dengan caching
         y_true_tokens = list(cached_tokenize(y_true))
         y_pred_tokens = list(cached_tokenize(y_pred))
@@ -1542,16 +4031,16 @@ def enhanced_rouge_l_computation(y_true, y_pred):
 def enhanced_meteor_computation(y_true, y_pred):
     """Optimasi perhitungan METEOR untuk skor tinggi"""
     try:
-        # Caching berdasarkan hash input
-        cache_key = f"meteor_{hash((y_true, y_pred))}"
-        cached_result = load_from_cache(cache_key)
-        if cached_result:
-            return cached_result
-        
         # Preprocessing dengan batasan ukuran
         y_true = advanced_preprocess(y_true)[:1000]
         y_pred = advanced_preprocess(y_pred)[:1000]
         
+        # Caching berdasarkan input yang sudah dinormalisasi
+        cache_key = evaluation_cache_key("meteor", y_true, y_pred)
+        cached_result = load_from_cache(cache_key)
+        if cached_result:
+            return cached_result
+        
         # Deteksi kalimat pendek
         is_short_sentence = len(y_true.split()) < 5 or len(y_pred.split()) < 5
         
@@ -1702,8 +4191,18 @@ def evaluate_against_ground_truth_optimized(matched_sentence, all_sentences, mat
         # Deteksi kalimat pendek
         is_short_sentence = len(matched_sentence.split()) < 5
         
-        # Caching evaluation berdasarkan matched sentence
-        cache_key = f"eval_{hash((matched_sentence, matched_idx))}"
+        # Kalimat pembanding dipilih lebih dulu karena hasil evaluasi bergantung pada isinya:
+        # kalimat terpanjang dalam dokumen selain kalimat yang cocok
+        compare_sentences = []
+        if len(all_sentences) > 1:
+            for idx, sent in all_sentences:
+                if idx != matched_idx:
+                    compare_sentences.append((idx, sent, len(sent.split())))
+            compare_sentences.sort(key=lambda x: x[2], reverse=True)
+            compare_sentences = [(idx, sent) for idx, sent, _ in compare_sentences[:5]]
+        
+        # Caching evaluation berdasarkan isi kalimat yang cocok dan kalimat pembanding
+        cache_key = evaluation_cache_key("eval", matched_sentence, *(sent for _, sent in compare_sentences))
         cached_result = load_from_cache(cache_key)
         if cached_result:
             return cached_result
@@ -1758,19 +4257,7 @@ def evaluate_against_ground_truth_optimized(matched_sentence, all_sentences, mat
                 "meteor_metrics": meteor_metrics
             }
         else:
-            # Bandingkan dengan kalimat lain dalam dokumen
-            compare_sentences = []
-            for idx, sent in all_sentences:
-                if idx != matched_idx:
-                    compare_sentences.append((idx, sent, len(sent.split())))
-            
-            # Urutkan berdasarkan panjang (prioritaskan kalimat panjang)
-            compare_sentences.sort(key=lambda x: x[2], reverse=True)
-            
-            # Ambil beberapa kalimat terpanjang
-            compare_sentences = [(idx, sent) for idx, sent, _ in compare_sentences[:5]]
-            
-            # Evaluasi terhadap setiap kalimat pembanding
+            # Evaluasi terhadap setiap kalimat pembanding dalam dokumen
             for idx, ground_truth_sentence in compare_sentences:
                 rouge_metrics, meteor_metrics = evaluate_sentence_with_metrics(
                     ground_truth_sentence, matched_sentence
@@ -1856,8 +4343,13 @@ def sort_by_evaluation_batched(results, split_texts, eval_method):
         # Process batch secara sekuensial
         for file, idx, sentence, length in batch:
             try:
+                file_sentences = split_texts.get(file)
+                if file_sentences is None:
+                    # Hasil FTS5 dari file yang belum dimuat ke session state
+                    file_sentences = db.get_sentences_by_filename(file)
+                
                 best_rouge, best_meteor, best_explanation = evaluate_against_ground_truth_optimized(
-                    sentence, split_texts[file], idx
+                    sentence, file_sentences, idx
                 )
                 
                 # Tidak ada bonus panjang kalimat, gunakan skor asli
@@ -1911,39 +4403,25 @@ def sort_by_evaluation_batched(results, split_texts, eval_method):
 
 # Fungsi untuk memeriksa perubahan file dengan optimasi
 def have_files_changed(uploaded_files):
-    """Periksa perubahan file dengan optimasi hashing"""
+    """Periksa perubahan file dengan membandingkan hash isi file dengan database"""
     if not uploaded_files:
         return False
     
-    # Ambil nama dan ukuran file untuk identifikasi cepat
-    current_files_info = {(file.name, file.size) for file in uploaded_files}
-    processed_files_info = set()
-    
-    # Build info untuk file yang sudah diproses
-    for file_name in st.session_state.processed_files:
-        if file_name in st.session_state.file_stats:
-            file_size = st.session_state.file_stats[file_name].get('size', 0)
-            processed_files_info.add((file_name, file_size))
-        else:
-            # Jika tidak ada info size, hanya gunakan nama
-            processed_files_info.add((file_name, 0))
-    
-    # Bandingkan dengan file yang sudah diproses
-    return current_files_info != processed_files_info
+    stored_hashes = db.get_content_hashes()
+    return any(stored_hashes.get(file.name) != get_content_hash(file) for file in uploaded_files)
 
 # Fungsi untuk reset cache dokumen
 def reset_document_cache():
     """Reset semua cache dokumen dan file cache"""
-    # Reset session state
-    st.session_state.doc_texts = {}
-    st.session_state.split_texts = {}
-    st.session_state.processed_files = set()
-    st.session_state.sentence_index = {}
-    st.session_state.processed_sentences = {}
-    st.session_state.file_stats = {}
-    
-    # Hapus file cache
+    # Reset shared corpus index (reloaded from the database on the next run)
+    corpus.clear()
+    bind_corpus_snapshot()
+    
+    # Kosongkan disk cache, juga file pickle dari cache per file versi lama
+    disk_cache.clear()
     for filename in os.listdir(CACHE_DIR):
+        if not filename.endswith(".pickle"):
+            continue
         file_path = os.path.join(CACHE_DIR, filename)
         try:
             if os.path.isfile(file_path):
@@ -1953,176 +4431,295 @@ def reset_document_cache():
     
     st.success("Cache dokumen telah direset!")
 
+# ===== PIPELINE INGESTI PARALEL =====
+
+DB_WRITE_BATCH = 32  # Dokumen maksimum per transaksi writer
+
+def run_ingest_writer(write_queue, stored):
+    """Thread writer tunggal: commit hasil worker ke database per batch"""
+    finished = False
+    while not finished:
+        record = write_queue.get()
+        if record is None:
+            break
+        
+        # Ambil semua hasil yang sudah menunggu, sampai ukuran batch
+        batch = [record]
+        while len(batch) < DB_WRITE_BATCH:
+            try:
+                record = write_queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is None:
+                finished = True
+                break
+            batch.append(record)
+        
+        for record in batch:
+            record['processed_tokens'] = [record['processed_sentences'][idx] for idx, _ in record['sentences']]
+            record['tfidf_index'] = TfidfIndex.from_model(record.pop('tfidf_model'))
+            record['tfidf_blobs'] = record['tfidf_index'].to_blobs()
+        
+        doc_ids = db.add_documents_batch(batch)
+        if doc_ids:
+            stored.extend(zip(batch, doc_ids))
+
+def build_corpus_entry(document, sentences, processed_tokens, tfidf_index=None):
+    """Bangun entri indeks corpus (inverted index, BM25, TF-IDF, statistik) untuk satu dokumen"""
+    if tfidf_index is None:
+        tfidf_index = TfidfIndex.from_processed(sentences, processed_tokens)
+    
+    file_index = PostingsIndex.build((idx, word_runs(sentence)) for idx, sentence in sentences)
+    file_bm25 = BM25Index()
+    for position, (idx, sentence) in enumerate(sentences):
+        file_bm25.add_sentence(idx, processed_tokens[idx]['stemmed'], position, processed_tokens[idx]['length'])
+    # Entri dibagi antar sesi setelah dipublikasikan, jadi IDF dihitung sekarang
+    file_bm25.compute_idf()
+    
+    return {
+        "doc_texts": document,
+        "split_texts": as_sentence_store(sentences),
+        "processed_sentences": processed_tokens,
+        "sentence_index": file_index,
+        "bm25_index": file_bm25,
+        "tfidf_index": tfidf_index,
+        "file_stats": {
+            'sentences': len(sentences),
+            'words': sum(entry['length'] for entry in processed_tokens.values()),
+            'size': len(document)
+        }
+    }
+
+def duplicate_corpus_entries(snapshot, duplicates):
+    """Entri corpus untuk dokumen duplikat: semua struktur indeks dibagi dengan dokumen pemilik isinya.
+    
+    Args:
+        snapshot (CorpusSnapshot): Snapshot yang memuat dokumen pemilik
+        duplicates (list): (record, doc_id) dengan filename, size dan source_id di record
+    """
+    owner_files = {document.doc_id: filename for filename, document in snapshot.doc_texts.items()}
+    entries = {}
+    for record, doc_id in duplicates:
+        owner = owner_files.get(record['source_id'])
+        if owner is None:
+            # Owner removed by another session meanwhile; do not keep a row without a corpus entry
+            db.delete_document(doc_id)
+            st.warning(f"Could not add {record['filename']}: its source document was removed")
+            continue
+        
+        entry = {name: getattr(snapshot, name)[owner] for name in CORPUS_FIELDS}
+        entry["doc_texts"] = LazyDocument(db, doc_id, record['filename'], record['size'],
+                                          entry["doc_texts"].content_length)
+        entries[record['filename']] = entry
+    return entries
+
+def link_duplicate_uploads(uploads, content_hashes, owners):
+    """Simpan file unggahan yang isinya sudah ada di database sebagai duplikat, tanpa ekstraksi.
+    
+    Returns:
+        list: (record, doc_id) untuk duplicate_corpus_entries
+    """
+    records = [
+        {
+            'filename': f.name,
+            'size': f.size,
+            'filetype': f.type.split("/")[-1],
+            'content_hash': content_hashes[f.name],
+            'source_id': owners[content_hashes[f.name]]
+        }
+        for f in uploads if content_hashes[f.name] in owners
+    ]
+    doc_ids = db.add_duplicate_documents(records) or []
+    return list(zip(records, doc_ids))
+
 # ===== DATABASE INTEGRATION FUNCTIONS =====
 
 def load_documents_from_database():
-    """Load documents from database into session state"""
+    """Load documents from database into the shared corpus index"""
     # Get all processed documents from database
     processed_docs = db.get_all_processed_documents()
     
-    # Return if nothing to load
-    if not processed_docs:
-        return
-    
-    # Load each document and its sentences from database
-    for filename, doc_id in processed_docs.items():
-        # Skip if already in session state
-        if filename in st.session_state.processed_files:
-            continue
-        
-        # Get document content
-        doc = db.get_document(doc_id)
-        if not doc:
-            continue
-        
-        # Get sentences and processed tokens
-        sentences, processed_tokens = db.get_document_sentences(doc_id)
-        
-        if not sentences:
-            continue
-        
-        # Add to session state
-        st.session_state.doc_texts[filename] = doc["content"]
-        st.session_state.split_texts[filename] = sentences
-        st.session_state.processed_sentences[filename] = processed_tokens
-        st.session_state.processed_files.add(filename)
-        
-        # Create inverted index
-        file_index = {}
-        for idx, sentence in sentences:
-            # Extract words for the inverted index
-            if idx in processed_tokens:
-                # Use tokenized versions
-                words = processed_tokens[idx]['tokens']
-                for word in set(words):
-                    word = word.lower()
-                    if word not in file_index:
-                        file_index[word] = []
-                    if idx not in file_index[word]:
-                        file_index[word].append(idx)
-        
-        st.session_state.sentence_index[filename] = file_index
-        
-        # Add file stats
-        if filename not in st.session_state.file_stats:
-            st.session_state.file_stats[filename] = {
-                'sentences': len(sentences),
-                'words': sum(len(s[1].split()) for s in sentences),
-                'size': len(doc["content"])
-            }
+    # Only one session loads at a time; the others reuse its result
+    with corpus.loading_lock:
+        loaded_files = corpus.snapshot().processed_files
+        
+        # Only load documents that are not in the shared index yet
+        pending = {doc_id: filename for filename, doc_id in processed_docs.items()
+                   if filename not in loaded_files}
+        
+        # Return if nothing to load
+        if not pending:
+            bind_corpus_snapshot()
+            return
+        
+        # Filter in SQL only when part of the corpus is already loaded
+        doc_ids = None if len(pending) == len(processed_docs) else list(pending)
+        total_sentences = db.count_processed_sentences(doc_ids)
+        metadata = db.get_documents_metadata(list(pending))
+        
+        # Stored TF-IDF models; documents stored before they existed are fitted once and saved
+        tfidf_models = db.get_tfidf_models(doc_ids)
+        new_tfidf_models = {}
+        
+        # Duplicates have no sentences of their own; they share their owner's entry
+        duplicates = [
+            ({'filename': filename, 'size': size, 'source_id': source_id}, doc_id)
+            for doc_id, (filename, size, _, source_id) in metadata.items() if source_id is not None
+        ]
+        
+        progress_bar = st.progress(0.0)
+        status_text = st.empty()
+        loaded_sentences = 0
+        entries = {}
+        
+        # Stream all sentences of all pending documents through one cursor
+        for doc_id, filename, sentences, processed_tokens in db.iter_corpus(doc_ids):
+            _, size, content_length, _ = metadata.get(doc_id, (filename, 0, 0, None))
+            
+            document = LazyDocument(db, doc_id, filename, size, content_length)
+            if doc_id in tfidf_models:
+                file_tfidf = TfidfIndex.from_blobs(tfidf_models.pop(doc_id))
+            else:
+                file_tfidf = TfidfIndex.from_processed(sentences, processed_tokens)
+                new_tfidf_models[doc_id] = file_tfidf.to_blobs()
+            entries[filename] = build_corpus_entry(document, sentences, processed_tokens, file_tfidf)
+            
+            # Publish in batches so copy-on-write stays cheap for large corpora
+            if len(entries) >= CORPUS_PUBLISH_BATCH:
+                corpus.add_documents(entries)
+                entries = {}
+            
+            # Report progress
+            loaded_sentences += len(sentences)
+            progress_bar.progress(min(1.0, loaded_sentences / max(1, total_sentences)))
+            status_text.text(f"Loading {filename} ({loaded_sentences}/{total_sentences} sentences)")
+        
+        snapshot = corpus.add_documents(entries)
+        corpus.add_documents(duplicate_corpus_entries(snapshot, duplicates))
+        bind_corpus_snapshot()
+        db.save_tfidf_models(new_tfidf_models)
+        
+        progress_bar.empty()
+        status_text.empty()
 
 def process_and_store_documents(uploaded_files):
-    """Process and store documents in database"""
+    """Process and store documents in database.
+    
+    Extraction and NLP preprocessing run in a process pool; a single
+    writer thread commits finished documents in batched transactions.
+    Files are identified by a BLAKE2 hash of their content: unchanged
+    files are skipped, and files whose content is already stored share
+    the sentences and indexes of that document instead of being extracted.
+    """
     start_time = time.time()
     
     # No files to process
     if not uploaded_files:
         return
     
-    # Process each file
-    for uploaded_file in uploaded_files:
-        filename = uploaded_file.name
-        
-        # Skip if already processed
-        if filename in st.session_state.processed_files:
+    content_hashes = {f.name: get_content_hash(f) for f in uploaded_files}
+    stored_hashes = db.get_content_hashes()
+    
+    # Only documents in the shared index can lend their entry; other copies are extracted
+    loaded_ids = {document.doc_id for document in corpus.snapshot().doc_texts.values()}
+    owners = {
+        content_hash: doc_id
+        for content_hash, doc_id in db.find_documents_by_hash(set(content_hashes.values())).items()
+        if doc_id in loaded_ids
+    }
+    
+    # Skip unchanged files; only the first upload of each new content is extracted
+    pending = []
+    duplicates = []
+    first_uploads = set()
+    for f in uploaded_files:
+        content_hash = content_hashes[f.name]
+        if stored_hashes.get(f.name) == content_hash:
             continue
-        
-        # Extract text based on file type
-        if uploaded_file.type == "application/pdf":
-            text = extract_text_from_pdf(uploaded_file)
-        elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            text = extract_text_from_docx(uploaded_file)
-        elif uploaded_file.type == "text/plain":
-            text = extract_text_from_txt(uploaded_file)
+        if content_hash in owners or content_hash in first_uploads:
+            duplicates.append(f)
         else:
-            # Unsupported file type
-            st.warning(f"Unsupported file type: {uploaded_file.type} for {filename}")
-            continue
-        
-        if not text:
-            st.warning(f"Could not extract text from {filename}")
-            continue
-        
-        # Add document to database
-        filetype = uploaded_file.type.split("/")[-1]
-        doc_id = db.add_document(filename, text, uploaded_file.size, filetype)
-        
-        if not doc_id:
-            st.warning(f"Failed to add {filename} to database")
-            continue
-        
-        # Add to session state
-        st.session_state.doc_texts[filename] = text
-        
-        # Split text into sentences
-        sentences = split_into_sentences({filename: text})[filename]
-        
-        # Get filename from DB for processing
-        doc = db.get_document(doc_id)
-        if not doc:
-            continue
-        
-        # Process sentences
-        tokenized_corpus = []
-        processed_tokens = {}
-        
-        for idx, sentence in sentences:
-            # Basic preprocessing
-            clean_text = advanced_preprocess(sentence)
-            tokens = nltk.word_tokenize(clean_text)
-            
-            # Advanced processing for BM25 search
-            tokens_no_stop = remove_stopwords(tokens)
-            stemmed_tokens = stem_sentence(tokens_no_stop)
-            
-            # Store results
-            processed_tokens[idx] = {
-                'tokens': tokens_no_stop,
-                'stemmed': stemmed_tokens,
-                'length': len(sentence.split())
-            }
+            first_uploads.add(content_hash)
+            pending.append(f)
+    
+    # Link duplicates of stored documents before any of those documents is replaced
+    linked = link_duplicate_uploads(duplicates, content_hashes, owners)
+    corpus.add_documents(duplicate_corpus_entries(corpus.snapshot(), linked))
+    
+    stored = []
+    if pending:
+        progress_bar = st.progress(0.0)
+        status_text = st.empty()
         
-        # Store sentences in database
-        db.add_sentences(
-            doc_id, 
-            [(idx, sent) for idx, sent in sentences],
-            [processed_tokens[idx]['stemmed'] for idx, _ in sentences]
-        )
+        # Bounded queue keeps workers from running far ahead of the writer
+        write_queue = queue.Queue(maxsize=DB_WRITE_BATCH * 2)
+        writer = threading.Thread(target=run_ingest_writer, args=(write_queue, stored), daemon=True)
+        add_script_run_ctx(writer)
+        writer.start()
         
-        # Update session state
-        st.session_state.split_texts[filename] = sentences
-        st.session_state.processed_sentences[filename] = processed_tokens
-        st.session_state.processed_files.add(filename)
+        try:
+            with create_process_pool(min(PROCESS_WORKERS, len(pending)),
+                                     initializer=init_worker) as executor:
+                futures = {
+                    executor.submit(ingest_file, f.name, f.type, f.size, f.getvalue(),
+                                    stop_words, content_hashes[f.name]): f.name
+                    for f in pending
+                }
+                
+                for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    filename = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        st.warning(f"Failed to process {filename}: {str(e)}")
+                        continue
+                    
+                    if 'error' in result:
+                        st.warning(result['error'])
+                    else:
+                        write_queue.put(result)
+                    
+                    progress_bar.progress(done / len(pending))
+                    status_text.text(f"Processed {filename} ({done}/{len(pending)})")
+        finally:
+            write_queue.put(None)
+            writer.join()
         
-        # Create inverted index
-        file_index = {}
-        for idx, sentence in sentences:
-            # Extract words for the inverted index
-            if idx in processed_tokens:
-                # Use tokenized versions
-                words = processed_tokens[idx]['tokens']
-                for word in set(words):
-                    word = word.lower()
-                    if word not in file_index:
-                        file_index[word] = []
-                    if idx not in file_index[word]:
-                        file_index[word].append(idx)
-        
-        st.session_state.sentence_index[filename] = file_index
-        
-        # Add file stats
-        st.session_state.file_stats[filename] = {
-            'sentences': len(sentences),
-            'words': sum(len(s[1].split()) for s in sentences),
-            'size': len(text)
-        }
+        progress_bar.empty()
+        status_text.empty()
+    
+    # Publish to the shared index (content stays in the database)
+    entries = {}
+    for record, doc_id in stored:
+        filename = record['filename']
+        document = LazyDocument(db, doc_id, filename, record['size'], len(record['content']))
+        entries[filename] = build_corpus_entry(document, record['sentences'], record['processed_sentences'],
+                                               record['tfidf_index'])
+        
+        if len(entries) >= CORPUS_PUBLISH_BATCH:
+            corpus.add_documents(entries)
+            entries = {}
+    
+    snapshot = corpus.add_documents(entries)
+    
+    # Duplicates within this upload share the document stored above
+    new_owners = {record['content_hash']: doc_id for record, doc_id in stored}
+    linked = link_duplicate_uploads(duplicates, content_hashes, new_owners)
+    corpus.add_documents(duplicate_corpus_entries(snapshot, linked))
+    bind_corpus_snapshot()
+    
+    # Their first copy failed, so nothing was stored for them; they are retried on the next upload
+    orphans = [f.name for f in duplicates
+               if content_hashes[f.name] not in owners and content_hashes[f.name] not in new_owners]
+    if orphans:
+        st.warning(f"Skipped {', '.join(orphans)}: a file with the same content could not be processed")
     
     end_time = time.time()
     st.success(f"Documents processed and stored in {end_time - start_time:.2f} seconds")
 
 # ===== UI ELEMENTS =====
 
-def display_evaluation_results(eval_results, eval_method):
+def display_evaluation_results(eval_results, eval_method, match_spans=None):
     """Display evaluation results with detailed metrics"""
     if not eval_results:
         st.warning("No results found")
@@ -2134,7 +4731,12 @@ def display_evaluation_results(eval_results, eval_method):
         with st.container():
             st.subheader(f"Result #{i+1}")
             st.write(f"**Document:** {file}")
-            st.write(f"**Sentence:** {sentence}")
+            spans = (match_spans or {}).get((file, idx))
+            if spans:
+                # Highlight dari posisi match exact search, tanpa mencari ulang
+                st.write(f"**Sentence:** {ExactMatcher.highlight(sentence, spans)}")
+            else:
+                st.write(f"**Sentence:** {sentence}")
             
             # Create columns for metrics
             col1, col2 = st.columns(2)
@@ -2270,6 +4872,31 @@ def display_document_stats(stats):
         avg_sentences = stats["total_sentences"] / max(1, stats["processed_documents"])
         st.metric("Avg. Sentences/Doc", f"{avg_sentences:.1f}")
 
+def display_cache_stats(stats):
+    """Display disk cache size, hit rate and evictions"""
+    total = stats['total']
+    lookups = total['hits'] + total['misses']
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Entries", total['entries'])
+    
+    with col2:
+        st.metric("Size", f"{total['bytes'] / (1024 * 1024):.2f} MB")
+    
+    with col3:
+        st.metric("Hit Rate", f"{total['hits'] / lookups:.0%}" if lookups else "-")
+    
+    st.caption(f"In memory: {total['memory_entries']} entries, {total['memory_hits']} hits; "
+               f"{total['pending_writes']} writes pending")
+    
+    # Rincian per namespace (prefix kunci)
+    for namespace, counters in sorted(stats.items()):
+        if namespace != 'total':
+            st.caption(f"{namespace}: {counters['entries']} entries, "
+                       f"{counters['hits']} hits / {counters['misses']} misses")
+
 def display_recent_documents(recent_docs):
     """Display a list of recently added documents"""
     if not recent_docs:
@@ -2348,6 +4975,9 @@ def main():
         stats = db.get_document_stats()
         display_document_stats(stats)
         
+        st.header("Cache Statistics")
+        display_cache_stats(disk_cache.stats())
+        
         st.header("Controls")
         
         # Reset cache button
@@ -2372,9 +5002,15 @@ def main():
         with col1:
             search_method = st.radio(
                 "Select Search Method", 
-                ["BM25", "Cosine Similarity", "Exact Match"],
+                ["BM25", "BM25 (Vectorized)", "Cosine Similarity", "Exact Match", "Full-Text (FTS5)"],
                 horizontal=True
             )
+            scoring_scope = st.radio(
+                "Scoring Scope (BM25 / Cosine)",
+                ["Per Document", "Whole Corpus"],
+                horizontal=True,
+                help="Whole Corpus uses one IDF table for all documents and ranks all sentences together"
+            )
         
         with col2:
             eval_method = st.multiselect(
@@ -2386,17 +5022,51 @@ def main():
         keyword = st.text_input("Enter search keyword")
         
         if keyword and st.button("Search", type="primary"):
-            # Check if there are documents to search
-            if not st.session_state.split_texts:
+            # Check if there are documents to search (FTS5 reads straight from the database)
+            if not st.session_state.split_texts and search_method != "Full-Text (FTS5)":
                 st.warning("No documents loaded. Please upload documents first.")
             else:
                 # Perform search based on selected method
-                if search_method == "BM25":
-                    results = bm25_search(keyword, st.session_state.split_texts, st.session_state.processed_sentences)
+                match_spans = {}
+                if search_method == "Full-Text (FTS5)":
+                    results = fts_search(keyword)
+                elif search_method == "BM25" and scoring_scope == "Whole Corpus":
+                    results = bm25_search_global(
+                        keyword,
+                        st.session_state.split_texts,
+                        st.session_state.processed_sentences,
+                        bind_corpus_snapshot().statistics()
+                    )
+                elif search_method == "Cosine Similarity" and scoring_scope == "Whole Corpus":
+                    results = cosine_similarity_search_global(
+                        keyword,
+                        st.session_state.split_texts,
+                        bind_corpus_snapshot().statistics()
+                    )
+                elif search_method == "BM25 (Vectorized)":
+                    results = bm25_search_vectorized(
+                        keyword,
+                        st.session_state.split_texts,
+                        st.session_state.processed_sentences,
+                        st.session_state.bm25_index
+                    )
+                elif search_method == "BM25":
+                    results = bm25_search(
+                        keyword,
+                        st.session_state.split_texts,
+                        st.session_state.processed_sentences,
+                        st.session_state.bm25_index
+                    )
                 elif search_method == "Cosine Similarity":
-                    results = cosine_similarity_search(keyword, st.session_state.split_texts, st.session_state.processed_sentences)
+                    results = cosine_similarity_search(
+                        keyword,
+                        st.session_state.split_texts,
+                        st.session_state.processed_sentences,
+                        st.session_state.tfidf_index
+                    )
                 else:  # Exact Match
-                    results = exact_match_search(keyword, st.session_state.split_texts, st.session_state.sentence_index)
+                    results = exact_match_search(keyword, st.session_state.split_texts,
+                                                 st.session_state.sentence_index, match_spans)
                 
                 # Calculate total results found
                 total_results = sum(len(sentences) for sentences in results.values())
@@ -2408,7 +5078,7 @@ def main():
                 db.add_search_history(keyword, total_results)
                 
                 # Display results with detailed metrics
-                display_evaluation_results(eval_results, eval_method)
+                display_evaluation_results(eval_results, eval_method, match_spans)
     
     # Tab 2: Upload Documents
     with tab2:
@@ -2445,7 +5115,7 @@ def main():
             # Display document list with delete option
             st.subheader("Document List")
             
-            for doc_id, filename, content, size, filetype in docs:
+            for doc_id, filename, size, filetype in docs:
                 with st.container():
                     col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
                     
@@ -2470,19 +5140,9 @@ def main():
                         if st.button("Delete", key=delete_key):
                             # Delete document from database
                             if db.delete_document(doc_id):
-                                # Remove from session state
-                                if filename in st.session_state.doc_texts:
-                                    del st.session_state.doc_texts[filename]
-                                if filename in st.session_state.split_texts:
-                                    del st.session_state.split_texts[filename]
-                                if filename in st.session_state.processed_sentences:
-                                    del st.session_state.processed_sentences[filename]
-                                if filename in st.session_state.sentence_index:
-                                    del st.session_state.sentence_index[filename]
-                                if filename in st.session_state.file_stats:
-                                    del st.session_state.file_stats[filename]
-                                if filename in st.session_state.processed_files:
-                                    st.session_state.processed_files.remove(filename)
+                                # Remove from the shared index for every session
+                                corpus.remove_documents([filename])
+                                bind_corpus_snapshot()
                                 
                                 st.success(f"Document {filename} deleted successfully")
                                 st.experimental_rerun()
@@ -15,23 +15,50 @@ import concurrent.futures
 import traceback
 import hashlib
 import pickle
-from functools import lru_cache
+from functools import lru_cache, partial
+from array import array
+from collections.abc import Sequence
 import os
 import tempfile
 import re
+import multiprocessing
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+import math
+import heapq
+import bisect
+from collections import Counter, OrderedDict
+from scipy.sparse import csc_matrix
+from nlp_workers import WORD_RUN_PATTERN, index_sentence_shard, init_worker
 
 # ===== KONFIGURASI DAN PENGATURAN AWAL =====
 
 # Konfigurasi untuk caching
 CACHE_DIR = os.path.join(tempfile.gettempdir(), "doc_search_cache")
 os.makedirs(CACHE_DIR, exist_ok=True)
+CACHE_DB_PATH = os.path.join(CACHE_DIR, "cache.sqlite3")  # Satu file untuk semua entri cache
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Batas ukuran nilai yang disimpan sebelum eviksi LRU
+CACHE_EVICT_TARGET = 0.9  # Eviksi sampai ukuran turun ke fraksi ini dari batas
+CACHE_DEFAULT_TTL = 7 * 24 * 3600  # Detik sebelum entri kedaluwarsa
+CACHE_TTLS = {"sentences": 30 * 24 * 3600}  # TTL per namespace (prefix kunci)
+CACHE_TOUCH_BATCH = 256  # Akses yang dikumpulkan sebelum last_access ditulis
+CACHE_BUSY_TIMEOUT = 30  # Detik menunggu lock writer SQLite
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024  # Batas LRU di memori (nilai ter-pickle) di depan disk cache
+CACHE_WRITE_BATCH = 128  # Entri per transaksi writer background
+CACHE_WRITE_QUEUE = 4096  # Entri yang boleh menunggu ditulis ke disk
 
 # Konstanta untuk optimasi
 MAX_WORKERS = min(32, os.cpu_count() + 4)  # Jumlah optimal worker threads
+PROCESS_WORKERS = os.cpu_count() or 1  # Jumlah worker proses untuk pekerjaan CPU-bound
+INDEX_SHARD_SENTENCES = 2000  # Kalimat per shard saat membangun index
 CHUNK_SIZE = 1000  # Ukuran chunk untuk pembagian dokumen besar
 MAX_SYNONYM_CACHE_SIZE = 10000  # Batasan ukuran cache sinonim
 MAX_SENTENCES_FOR_DISPLAY = 100  # Batasan jumlah kalimat untuk ditampilkan
 MAX_RESULTS_TO_SHOW = 5  # Batasan jumlah hasil pencarian
+SEARCH_CACHE_BYTES = 32 * 1024 * 1024  # Batas ukuran cache hasil pencarian per sesi
+EVAL_CACHE_BYTES = 16 * 1024 * 1024  # Batas ukuran cache hasil evaluasi per sesi
 
 # Daftar stopwords bahasa Indonesia
 INDONESIAN_STOP_WORDS = set([
@@ -129,11 +156,14 @@ INDONESIAN_STOP_WORDS = set([
 ])
 
 # Inisialisasi session state untuk menyimpan data dokumen
+# Corpus di aplikasi ini sengaja per sesi: dokumen unggahan tidak disimpan ke
+# database dan tidak boleh terlihat oleh sesi lain. Indeks corpus bersama
+# lintas sesi (SharedCorpusIndex) hanya ada di gabungan.py.
 if 'doc_texts' not in st.session_state:
     st.session_state.doc_texts = {}  # {filename: text}
 
 if 'split_texts' not in st.session_state:
-    st.session_state.split_texts = {}  # {filename: [(idx, sentence)]}
+    st.session_state.split_texts = {}  # {filename: SentenceStore [(idx, sentence)]}
 
 if 'processed_files' not in st.session_state:
     st.session_state.processed_files = set()  # Set berisi nama file yang sudah diproses
@@ -144,16 +174,21 @@ if 'sentence_index' not in st.session_state:
 if 'processed_sentences' not in st.session_state:
     st.session_state.processed_sentences = {}  # {filename: {idx: {'tokens': [], 'stemmed': []}}}
 
+if 'bm25_index' not in st.session_state:
+    st.session_state.bm25_index = {}  # {filename: BM25Index}
+
 if 'file_stats' not in st.session_state:
     st.session_state.file_stats = {}  # {filename: {'size': size, 'sentences': count, 'words': count}}
 
-# Tambahkan cache untuk hasil pencarian - NEW
-if 'search_cache' not in st.session_state:
-    st.session_state.search_cache = {}  # {cache_key: results}
+if 'upload_hashes' not in st.session_state:
+    st.session_state.upload_hashes = {}  # {filename: hash isi file unggahan yang terakhir diproses}
 
-# Tambahkan cache untuk hasil evaluasi - NEW
-if 'eval_cache' not in st.session_state:
-    st.session_state.eval_cache = {}  # {cache_key: eval_results}
+if 'upload_fingerprints' not in st.session_state:
+    st.session_state.upload_fingerprints = {}  # {filename: (file_id, size) unggahan yang hash-nya sudah diperiksa}
+
+# Versi corpus, naik setiap kali dokumen ditambah, diubah atau dihapus
+if 'corpus_version' not in st.session_state:
+    st.session_state.corpus_version = 0
 
 # Inisialisasi bahasa untuk stopwords
 if 'stopwords_language' not in st.session_state:
@@ -166,47 +201,462 @@ def get_file_hash(file_content):
     """Menghasilkan hash untuk isi file sebagai kunci cache"""
     return hashlib.md5(file_content).hexdigest()
 
+HASH_CHUNK_SIZE = 1024 * 1024  # Byte per potongan saat menghitung hash isi file
+
+def get_content_hash(file_obj, chunk_size=HASH_CHUNK_SIZE):
+    """Hash BLAKE2b isi file unggahan, dibaca per potongan agar file besar tidak disalin utuh"""
+    hasher = hashlib.blake2b(digest_size=32)
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+        hasher.update(chunk)
+    file_obj.seek(0)
+    return hasher.hexdigest()
+
 def cache_key(prefix, *args):
     """Membuat kunci cache dengan prefix dan argumen"""
     key_parts = [str(arg) for arg in args]
     return f"{prefix}_{'_'.join(key_parts)}"
 
+EVAL_CACHE_VERSION = 1  # Naikkan saat algoritma ROUGE/METEOR/evaluasi berubah agar entri lama tidak terpakai
+
+_stopwords_fingerprint = (None, None)  # ((id, jumlah) stop_words, digest) terakhir
+
+def stopwords_fingerprint():
+    """Hash pendek dari stopwords aktif, berubah bersama bahasa stopwords"""
+    global _stopwords_fingerprint
+    key = (id(stop_words), len(stop_words))
+    if _stopwords_fingerprint[0] != key:
+        digest = hashlib.blake2b("\n".join(sorted(stop_words)).encode("utf-8"), digest_size=8).hexdigest()
+        _stopwords_fingerprint = (key, digest)
+    return _stopwords_fingerprint[1]
+
+def evaluation_cache_key(prefix, *parts):
+    """Kunci cache evaluasi yang sama di semua proses, replika dan deploy.
+    
+    BLAKE2b atas versi algoritma, stopwords aktif dan input yang sudah
+    dinormalisasi; hash() bawaan Python diacak per proses (PYTHONHASHSEED)
+    sehingga tidak bisa dipakai untuk cache persisten.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    for part in (EVAL_CACHE_VERSION, stopwords_fingerprint()) + parts:
+        data = str(part).encode("utf-8")
+        hasher.update(len(data).to_bytes(8, "little"))
+        hasher.update(data)
+    return f"{prefix}_{hasher.hexdigest()}"
+
+class DiskCache:
+    """Bounded persistent cache in a single SQLite file.
+    
+    Keys are grouped into namespaces by their prefix (sentences_, rouge_,
+    meteor_, eval_). Entries expire after the TTL of their namespace, and
+    once the stored values exceed max_bytes the least recently used ones
+    are evicted. Hit and miss counters are kept per namespace for the
+    lifetime of the process.
+    """
+
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES, ttls=None):
+        """Open (or create) the cache file"""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        # Satu koneksi yang dipakai bergantian oleh semua thread
+        self._conn = sqlite3.connect(path, timeout=CACHE_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._lock = threading.Lock()
+        # Statistik per proses: {namespace: count}
+        self._stats_lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+        # Akses yang belum ditulis ke last_access: {(namespace, key): timestamp}
+        self._touched = {}
+        
+        with self._writer() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS cache_entries
+                            (namespace TEXT NOT NULL,
+                             key TEXT NOT NULL,
+                             value BLOB,
+                             size INTEGER,
+                             expires_at REAL,
+                             last_access REAL,
+                             PRIMARY KEY (namespace, key))''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access)")
+            conn.commit()
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+    
+    @contextmanager
+    def _reader(self):
+        """The shared connection, held exclusively"""
+        with self._lock:
+            yield self._conn
+    
+    _writer = _reader
+    
+    @staticmethod
+    def split_key(key):
+        """Namespace is the key prefix up to the first underscore"""
+        namespace, separator, name = key.partition("_")
+        if not separator:
+            return "default", key
+        return namespace, name
+    
+    def expiry(self, key, ttl=None, now=None):
+        """Expiry timestamp for a new entry; ttl in seconds overrides the namespace TTL (0 = never)"""
+        if ttl is None:
+            ttl = self.ttls.get(self.split_key(key)[0], CACHE_DEFAULT_TTL)
+        if not ttl:
+            return None
+        return (time.time() if now is None else now) + ttl
+    
+    def get_blob(self, key):
+        """Return (pickled value, expires_at), or None on a miss or an expired entry"""
+        namespace, name = self.split_key(key)
+        now = time.time()
+        with self._reader() as conn:
+            row = conn.execute("SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                               (namespace, name)).fetchone()
+        
+        with self._stats_lock:
+            if row is None or (row[1] is not None and row[1] <= now):
+                self.misses[namespace] += 1
+                return None
+            self.hits[namespace] += 1
+            self._touched[(namespace, name)] = now
+            flush = len(self._touched) >= CACHE_TOUCH_BATCH
+        
+        # Recency is written in batches so a hit does not cost a write transaction
+        if flush:
+            with self._writer() as conn:
+                self._flush_touches(conn)
+                conn.commit()
+        return row
+    
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry"""
+        entry = self.get_blob(key)
+        if entry is None:
+            return None
+        try:
+            return pickle.loads(entry[0])
+        except Exception:
+            return None
+    
+    def set_blobs(self, entries):
+        """Store already pickled values given as (key, blob, expires_at) in one transaction"""
+        now = time.time()
+        rows = []
+        for key, blob, expires_at in entries:
+            namespace, name = self.split_key(key)
+            rows.append((namespace, name, blob, len(blob), expires_at, now))
+        if not rows:
+            return True
+        
+        with self._writer() as conn:
+            conn.executemany('''INSERT OR REPLACE INTO cache_entries
+                                (namespace, key, value, size, expires_at, last_access)
+                                VALUES (?, ?, ?, ?, ?, ?)''', rows)
+            # Perkiraan (entri yang ditimpa tidak dikurangi); dihitung ulang saat eviksi
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn, now)
+            conn.commit()
+        return True
+    
+    def set(self, key, value, ttl=None):
+        """Store a value; ttl in seconds overrides the namespace TTL (0 = never expires)"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return self.set_blobs([(key, blob, self.expiry(key, ttl))])
+    
+    def _flush_touches(self, conn):
+        """Write the batched access times on an open writer connection"""
+        with self._stats_lock:
+            touched, self._touched = self._touched, {}
+        conn.executemany("UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                         [(timestamp, namespace, name) for (namespace, name), timestamp in touched.items()])
+    
+    def _evict(self, conn, now):
+        """Drop expired entries, then least recently used ones down to CACHE_EVICT_TARGET of max_bytes"""
+        self._flush_touches(conn)
+        evicted = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)).rowcount
+        
+        # Keep the most recently used entries whose cumulative size fits the target
+        evicted += conn.execute('''DELETE FROM cache_entries WHERE rowid IN (
+                                       SELECT entry_id FROM (
+                                           SELECT rowid AS entry_id,
+                                                  SUM(size) OVER (ORDER BY last_access DESC, rowid DESC) AS kept
+                                           FROM cache_entries)
+                                       WHERE kept > ?)''',
+                                  (int(self.max_bytes * CACHE_EVICT_TARGET),)).rowcount
+        
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        with self._stats_lock:
+            self.evictions += evicted
+    
+    def clear(self):
+        """Remove every entry; hit and miss counters are kept"""
+        with self._writer() as conn:
+            conn.execute("DELETE FROM cache_entries")
+            conn.commit()
+            self._total_bytes = 0
+        with self._stats_lock:
+            self._touched = {}
+    
+    def stats(self):
+        """Return {namespace: {'entries', 'bytes', 'hits', 'misses'}} plus totals under 'total'"""
+        with self._reader() as conn:
+            rows = conn.execute('''SELECT namespace, COUNT(*), COALESCE(SUM(size), 0)
+                                   FROM cache_entries GROUP BY namespace''').fetchall()
+        
+        stats = {}
+        for namespace, entries, size in rows:
+            stats[namespace] = {'entries': entries, 'bytes': size, 'hits': 0, 'misses': 0}
+        with self._stats_lock:
+            for namespace in set(self.hits) | set(self.misses):
+                counters = stats.setdefault(namespace, {'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0})
+                counters['hits'] = self.hits[namespace]
+                counters['misses'] = self.misses[namespace]
+            evictions = self.evictions
+        
+        stats['total'] = {
+            field: sum(counters[field] for counters in stats.values())
+            for field in ('entries', 'bytes', 'hits', 'misses')
+        }
+        stats['total']['evictions'] = evictions
+        return stats
+
+class TieredCache:
+    """In-process LRU in front of a DiskCache, with write-behind.
+    
+    Values are pickled when they are stored, so callers never share
+    mutable objects with the cache. Lookups are served from memory when
+    possible and disk hits are promoted; writes land in memory at once
+    and are persisted by a background thread in batched transactions.
+    """
+    
+    def __init__(self, disk, max_bytes=MEMORY_CACHE_BYTES, batch_size=CACHE_WRITE_BATCH):
+        self.disk = disk
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        # {key: (blob, expires_at)} dalam urutan akses, yang paling lama di depan
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = Counter()
+        # Antrian berbatas: kalau writer tertinggal, penulis berikutnya menunggu
+        self._pending = queue.Queue(maxsize=CACHE_WRITE_QUEUE)
+        self._writer_thread = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer_thread.start()
+    
+    def _remember(self, key, blob, expires_at):
+        """Put an entry at the most recent end of the LRU and evict down to max_bytes"""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (blob, expires_at)
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+    
+    def get(self, key):
+        """Return the cached value from memory or disk, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                self._entries.move_to_end(key)
+                self.memory_hits[DiskCache.split_key(key)[0]] += 1
+            else:
+                entry = None
+        
+        if entry is None:
+            entry = self.disk.get_blob(key)
+            if entry is None:
+                return None
+            self._remember(key, entry[0], entry[1])
+        
+        try:
+            return pickle.loads(entry[0])
+        except Exception:
+            return None
+    
+    def set(self, key, value, ttl=None):
+        """Store a value in memory and queue it for the disk writer"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires_at = self.disk.expiry(key, ttl)
+        self._remember(key, blob, expires_at)
+        self._pending.put((key, blob, expires_at))
+        return True
+    
+    def _write_behind(self):
+        """Background writer: persist queued entries in batches"""
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                self.disk.set_blobs(batch)
+            except Exception:
+                # Cache bersifat best effort; entri tetap ada di memori
+                pass
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+    
+    def flush(self):
+        """Wait until every queued write has reached the disk"""
+        self._pending.join()
+    
+    def clear(self):
+        """Drop every entry from memory and disk"""
+        self.flush()
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self.disk.clear()
+    
+    def stats(self):
+        """DiskCache.stats() with memory hits counted as hits (also reported as 'memory_hits')"""
+        stats = self.disk.stats()
+        total = stats.pop('total')
+        with self._lock:
+            memory_hits = dict(self.memory_hits)
+            memory_bytes = self._bytes
+            memory_entries = len(self._entries)
+        
+        for namespace, counters in stats.items():
+            counters['memory_hits'] = 0
+        for namespace, hits in memory_hits.items():
+            counters = stats.setdefault(namespace, {'entries': 0, 'bytes': 0, 'hits': 0,
+                                                    'misses': 0, 'memory_hits': 0})
+            counters['hits'] += hits
+            counters['memory_hits'] = hits
+        
+        total['hits'] += sum(memory_hits.values())
+        total['memory_hits'] = sum(memory_hits.values())
+        total['memory_entries'] = memory_entries
+        total['memory_bytes'] = memory_bytes
+        total['pending_writes'] = self._pending.qsize()
+        stats['total'] = total
+        return stats
+
+# Satu cache per proses, dibagi semua sesi
+@st.cache_resource
+def get_disk_cache():
+    return TieredCache(DiskCache(CACHE_DB_PATH))
+
+disk_cache = get_disk_cache()
+
 def save_to_cache(key, data):
-    """Menyimpan data ke cache file"""
+    """Menyimpan data ke cache (memori langsung, disk di background)"""
     try:
-        cache_path = os.path.join(CACHE_DIR, f"{key}.pickle")
-        with open(cache_path, 'wb') as f:
-            pickle.dump(data, f)
-        return True
-    except:
+        return disk_cache.set(key, data)
+    except Exception:
         return False
 
 def load_from_cache(key):
-    """Memuat data dari cache file"""
+    """Memuat data dari cache memori, atau dari disk cache"""
     try:
-        cache_path = os.path.join(CACHE_DIR, f"{key}.pickle")
-        if os.path.exists(cache_path):
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
-    except:
-        pass
-    return None
+        return disk_cache.get(key)
+    except Exception:
+        return None
+
+class ResultCache:
+    """LRU berbatas ukuran untuk hasil pencarian dan evaluasi di session state.
+    
+    Ukuran entri dihitung dari panjang pickle-nya; entri yang paling lama
+    tidak dipakai dibuang begitu total melewati max_bytes. Kunci memuat
+    versi corpus, jadi hasil dari corpus lama tidak pernah dipakai lagi
+    setelah dokumen berubah dan akhirnya terbuang oleh LRU, tanpa perlu
+    mengosongkan cache.
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {key: (value, size)}, yang paling lama di depan
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, key, default=None):
+        """Ambil nilai dan tandai sebagai yang terakhir dipakai"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def put(self, key, value):
+        """Simpan nilai, lalu buang entri terlama sampai total kembali di bawah batas"""
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+        if size > self.max_bytes:
+            return
+        
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+    
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+# Tambahkan cache untuk hasil pencarian - NEW
+if 'search_cache' not in st.session_state:
+    st.session_state.search_cache = ResultCache(SEARCH_CACHE_BYTES)  # {cache_key: results}
+
+# Tambahkan cache untuk hasil evaluasi - NEW
+if 'eval_cache' not in st.session_state:
+    st.session_state.eval_cache = ResultCache(EVAL_CACHE_BYTES)  # {cache_key: eval_results}
 
 # Fungsi cache untuk hasil pencarian - NEW
-def get_search_cache_key(keyword, search_method):
-    """Membuat kunci cache untuk hasil pencarian"""
-    return f"search_{search_method}_{hashlib.md5(keyword.encode()).hexdigest()}"
+def get_search_cache_key(query):
+    """Kunci cache hasil pencarian: (query kanonik dan metodenya, parameter, versi corpus)"""
+    params = (MAX_RESULTS_TO_SHOW, stopwords_fingerprint())
+    return ("search", query.key, params, st.session_state.corpus_version)
 
 # Fungsi cache untuk hasil evaluasi - NEW
 def get_eval_cache_key(results, eval_method):
-    """Membuat kunci cache untuk hasil evaluasi"""
+    """Kunci cache hasil evaluasi: (isi hasil pencarian, metode evaluasi, versi corpus)"""
     sorted_files = sorted(results.keys())
     cache_data = []
     for file in sorted_files:
         sentences = sorted([(idx, sent) for idx, sent in results[file]], key=lambda x: x[0])
         cache_data.append((file, sentences))
     
-    return f"eval_{hashlib.md5(str((cache_data, eval_method)).encode()).hexdigest()}"
+    digest = hashlib.blake2b(str(cache_data).encode("utf-8"), digest_size=20).hexdigest()
+    return ("eval", digest, eval_method, stopwords_fingerprint(), st.session_state.corpus_version)
+
+# Fungsi untuk membuat process pool
+def create_process_pool(max_workers, initializer=None, initargs=()):
+    """Process pool untuk pekerjaan CPU-bound dengan worker "spawn".
+    
+    Server Streamlit multi-thread: proses hasil fork bisa mewarisi lock
+    yang sedang dipegang thread lain dan koneksi SQLite yang terbuka.
+    Worker spawn memulai interpreter baru, jadi fungsi yang dikirim ke
+    pool harus berasal dari nlp_workers (tanpa efek samping saat di-import),
+    bukan dari skrip Streamlit ini.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=initializer,
+        initargs=initargs
+    )
 
 # Fungsi untuk download NLTK resources dengan pengecekan error dan caching
 @st.cache_resource
@@ -702,7 +1152,7 @@ def split_into_sentences(doc_texts):
         results = list(executor.map(process_document, doc_texts.items()))
     
     for file, sentences in results:
-        split_texts[file] = sentences
+        split_texts[file] = as_sentence_store(sentences)
         
         # Simpan statistik dokumen
         if file not in st.session_state.file_stats:
@@ -716,6 +1166,760 @@ def split_into_sentences(doc_texts):
     st.info(f"Dokumen berhasil dibagi menjadi kalimat dalam {end_time - start_time:.2f} detik")
     return split_texts
 
+# ===== PENYIMPANAN KALIMAT =====
+
+class SentenceStore(Sequence):
+    """Sentences of a single document with O(1) lookup by sentence_idx.
+
+    Behaves like the [(idx, sentence), ...] list it replaces in
+    split_texts, but keeps all sentence text in one string with an offset
+    table. Lookups by idx are plain arithmetic when the ids are dense
+    (the usual 1..n numbering) and a dictionary lookup otherwise.
+    """
+
+    __slots__ = ("ids", "offsets", "text", "_first_id", "_id_positions")
+
+    def __init__(self, sentences=()):
+        self.ids = array('q')
+        self.offsets = array('q', [0])
+        parts = []
+        for idx, sentence in sentences:
+            self.ids.append(idx)
+            self.offsets.append(self.offsets[-1] + len(sentence))
+            parts.append(sentence)
+        self.text = "".join(parts)
+
+        self._first_id = self.ids[0] if self.ids else 0
+        dense = all(idx == self._first_id + position for position, idx in enumerate(self.ids))
+        self._id_positions = None
+        if not dense:
+            # Simpan posisi pertama untuk idx yang muncul lebih dari sekali
+            self._id_positions = {}
+            for position, idx in enumerate(self.ids):
+                self._id_positions.setdefault(idx, position)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _sentence_at(self, position):
+        return self.text[self.offsets[position]:self.offsets[position + 1]]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("sentence position out of range")
+        return self.ids[position], self._sentence_at(position)
+
+    def __iter__(self):
+        text = self.text
+        offsets = self.offsets
+        for position, idx in enumerate(self.ids):
+            yield idx, text[offsets[position]:offsets[position + 1]]
+
+    def position_of(self, idx):
+        """Position of a sentence_idx in the store, or None"""
+        if self._id_positions is not None:
+            return self._id_positions.get(idx)
+        position = idx - self._first_id
+        if 0 <= position < len(self.ids):
+            return position
+        return None
+
+    def get(self, idx, default=None):
+        """Sentence text for a sentence_idx"""
+        position = self.position_of(int(idx))
+        if position is None:
+            return default
+        return self._sentence_at(position)
+
+    def __contains__(self, item):
+        if isinstance(item, tuple) and len(item) == 2:
+            return self.get(item[0]) == item[1]
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple)) or hasattr(other, "position_of"):
+            return len(self) == len(other) and all(a == tuple(b) for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+def as_sentence_store(sentences):
+    """Wrap a [(idx, sentence)] list in a SentenceStore unless it already is one"""
+    # Duck typing: store dari rerun sebelumnya adalah instance kelas SentenceStore yang lain
+    if hasattr(sentences, "position_of"):
+        return sentences
+    return SentenceStore(sentences)
+
+# ===== INVERTED INDEX (POSTINGS) =====
+
+POSTING_DTYPE = np.int32  # Tipe data sentence idx, tf dan posisi di postings
+
+class PostingsIndex:
+    """Inverted index for the sentences of a single document.
+
+    Postings of all terms live in flat int32 arrays: term slot t owns
+    doc_ids[offsets[t]:offsets[t + 1]] (sorted sentence idx) with the
+    matching tfs, and posting p owns positions[pos_offsets[p]:pos_offsets[p + 1]]
+    (token positions inside that sentence). The index is immutable once
+    built, so it can be shared between corpus snapshots.
+    """
+
+    __slots__ = ("term_slots", "offsets", "doc_ids", "tfs", "pos_offsets", "positions")
+
+    def __init__(self, term_slots, offsets, doc_ids, tfs, pos_offsets, positions):
+        self.term_slots = term_slots  # {term: slot}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.pos_offsets = pos_offsets
+        self.positions = positions
+
+    @classmethod
+    def build(cls, tokenized_sentences):
+        """Build the index from (idx, tokens) pairs in one linear pass.
+
+        Tokens are lowercased; positions count every token that is passed
+        in. Sentences are expected in ascending idx order (split_texts
+        order) and are only sorted when they are not.
+        """
+        tokenized_sentences = list(tokenized_sentences)
+        if any(tokenized_sentences[i][0] > tokenized_sentences[i + 1][0]
+               for i in range(len(tokenized_sentences) - 1)):
+            tokenized_sentences.sort(key=lambda item: item[0])
+
+        # One bucket of occurrences per term, appended in sentence order
+        term_slots = {}
+        occ_idx = []
+        occ_pos = []
+        for idx, tokens in tokenized_sentences:
+            for position, token in enumerate(tokens):
+                token = token.lower()
+                slot = term_slots.get(token)
+                if slot is None:
+                    slot = term_slots[token] = len(occ_idx)
+                    occ_idx.append(array('i'))
+                    occ_pos.append(array('i'))
+                occ_idx[slot].append(idx)
+                occ_pos[slot].append(position)
+
+        if not term_slots:
+            empty = np.zeros(0, dtype=POSTING_DTYPE)
+            return cls({}, np.zeros(1, dtype=np.int64), empty, empty, np.zeros(1, dtype=np.int64), empty)
+
+        bucket_sizes = np.fromiter((len(bucket) for bucket in occ_idx), dtype=np.int64, count=len(occ_idx))
+        occ_offsets = np.concatenate(([0], np.cumsum(bucket_sizes)))
+        all_idx = np.concatenate([np.frombuffer(bucket, dtype=np.intc) for bucket in occ_idx]).astype(POSTING_DTYPE)
+        all_pos = np.concatenate([np.frombuffer(bucket, dtype=np.intc) for bucket in occ_pos]).astype(POSTING_DTYPE)
+
+        # A posting starts at every term boundary and every change of sentence
+        starts_posting = np.ones(len(all_idx), dtype=bool)
+        starts_posting[1:] = all_idx[1:] != all_idx[:-1]
+        starts_posting[occ_offsets[:-1]] = True
+
+        posting_starts = np.flatnonzero(starts_posting)
+        pos_offsets = np.append(posting_starts, len(all_idx)).astype(np.int64)
+        postings_per_term = np.add.reduceat(starts_posting.astype(np.int64), occ_offsets[:-1])
+
+        return cls(
+            term_slots,
+            np.concatenate(([0], np.cumsum(postings_per_term))).astype(np.int64),
+            all_idx[posting_starts],
+            np.diff(pos_offsets).astype(POSTING_DTYPE),
+            pos_offsets,
+            all_pos,
+        )
+
+    def __len__(self):
+        return len(self.term_slots)
+
+    def __contains__(self, term):
+        return term in self.term_slots
+
+    def __iter__(self):
+        return iter(self.term_slots)
+
+    def keys(self):
+        return self.term_slots.keys()
+
+    def _range(self, term):
+        slot = self.term_slots.get(term)
+        if slot is None:
+            return 0, 0
+        return self.offsets[slot], self.offsets[slot + 1]
+
+    def postings(self, term):
+        """Sorted sentence idx array for a term (empty if unknown)"""
+        start, end = self._range(term)
+        return self.doc_ids[start:end]
+
+    def get(self, term, default=None):
+        """Dict-style lookup returning the postings array"""
+        if term not in self.term_slots:
+            return default
+        return self.postings(term)
+
+    def __getitem__(self, term):
+        if term not in self.term_slots:
+            raise KeyError(term)
+        return self.postings(term)
+
+    def document_frequency(self, term):
+        start, end = self._range(term)
+        return int(end - start)
+
+    def term_frequencies(self, term):
+        """tf per sentence, aligned with postings(term)"""
+        start, end = self._range(term)
+        return self.tfs[start:end]
+
+    def token_positions(self, term, idx):
+        """Token positions of a term inside one sentence (empty if absent)"""
+        start, end = self._range(term)
+        i = start + np.searchsorted(self.doc_ids[start:end], idx)
+        if i >= end or self.doc_ids[i] != idx:
+            return self.positions[:0]
+        return self.positions[self.pos_offsets[i]:self.pos_offsets[i + 1]]
+
+    def _expand_run(self, run, partial_start, partial_end):
+        """Index terms a query run can stand for; partial runs may be cut off inside a token"""
+        if partial_start and partial_end:
+            return [term for term in self.term_slots if run in term]
+        if partial_start:
+            return [term for term in self.term_slots if term.endswith(run)]
+        if partial_end:
+            return [term for term in self.term_slots if term.startswith(run)]
+        return [run] if run in self.term_slots else []
+
+    def match_run_sequence(self, runs, partial_start=False, partial_end=False):
+        """Sorted idx of sentences containing runs as consecutive tokens.
+
+        With partial_start the first run may be the tail of a longer token,
+        with partial_end the last run may be the head of one (substring
+        matching). Only the postings of the query terms are touched.
+        """
+        last = len(runs) - 1
+        slots = [
+            self._expand_run(run, partial_start and j == 0, partial_end and j == last)
+            for j, run in enumerate(runs)
+        ]
+        if not runs or not all(slots):
+            return self.doc_ids[:0]
+
+        if len(runs) == 1:
+            terms = slots[0]
+            if len(terms) == 1:
+                return self.postings(terms[0])
+            return np.unique(np.concatenate([self.postings(term) for term in terms]))
+
+        # Setiap kemunculan run ke-j menjadi kunci (idx, posisi awal phrase);
+        # irisan kunci semua run = phrase utuh. Mulai dari run paling jarang.
+        slot_keys = [
+            np.concatenate([self._occurrence_keys(term, last - j) for term in terms])
+            for j, terms in enumerate(slots)
+        ]
+        matched = None
+        for keys in sorted(slot_keys, key=len):
+            matched = np.unique(keys) if matched is None else np.intersect1d(matched, keys)
+            if len(matched) == 0:
+                return self.doc_ids[:0]
+        return np.unique(matched >> 32).astype(POSTING_DTYPE)
+
+    def _occurrence_keys(self, term, shift):
+        """(idx << 32 | position + shift) for every occurrence of a term"""
+        start, end = self._range(term)
+        doc_ids = np.repeat(self.doc_ids[start:end].astype(np.int64), self.tfs[start:end])
+        positions = self.positions[self.pos_offsets[start]:self.pos_offsets[end]].astype(np.int64)
+        return (doc_ids << 32) | (positions + shift)
+
+# ===== INDEKS BM25 =====
+
+BM25_MAX_KEYWORD_BONUS = 1.5  # Bonus skor untuk kalimat yang mengandung keyword asli
+BM25_BLOCK_SIZE = 64  # Jumlah posting per blok untuk batas atas block-max WAND
+
+class BM25Index:
+    """Inverted BM25 index for the sentences of a single document.
+
+    Statistics follow rank_bm25.BM25Okapi (same IDF and epsilon floor), but
+    postings are kept per term so a query only touches the sentences that
+    contain at least one query term.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, epsilon=0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.postings = {}  # {term: {sentence_idx: tf}}
+        self.sentence_lengths = {}  # {sentence_idx: jumlah token stemmed}
+        self.word_counts = {}  # {sentence_idx: jumlah kata kalimat asli, untuk length bonus}
+        self.positions = {}  # {sentence_idx: posisi dalam split_texts[file]}
+        self.total_length = 0
+        self.last_position = -1
+        self.idf = {}
+        self._idf_dirty = True
+        self._cursors = {}  # {(term, avgdl): (sentence idx terurut, batas atas, batas atas per blok)}
+        self._sparse = None  # (split_texts[file], SparseBM25) untuk backend vektorisasi
+
+    @classmethod
+    def from_processed(cls, sentences, file_processed, **params):
+        """Build the index from split_texts[file] and processed_sentences[file]"""
+        index = cls(**params)
+        for position, (idx, sentence) in enumerate(sentences):
+            if idx in file_processed:
+                word_count = file_processed[idx].get('length', len(sentence.split()))
+                index.add_sentence(idx, file_processed[idx]['stemmed'], position, word_count)
+        return index
+
+    @property
+    def corpus_size(self):
+        return len(self.sentence_lengths)
+
+    def add_sentence(self, idx, stemmed_tokens, position, word_count=None):
+        """Add one sentence; IDF is recomputed lazily on the next query"""
+        if idx in self.sentence_lengths:
+            self.remove_sentence(idx)
+
+        for term, tf in Counter(stemmed_tokens).items():
+            self.postings.setdefault(term, {})[idx] = tf
+
+        self.sentence_lengths[idx] = len(stemmed_tokens)
+        self.word_counts[idx] = len(stemmed_tokens) if word_count is None else word_count
+        self.positions[idx] = position
+        self.total_length += len(stemmed_tokens)
+        self.last_position = max(self.last_position, position)
+        self._idf_dirty = True
+        self._cursors = {}
+        self._sparse = None
+
+    def remove_sentence(self, idx):
+        """Remove one sentence and its postings"""
+        length = self.sentence_lengths.pop(idx, None)
+        if length is None:
+            return
+
+        for term in list(self.postings):
+            term_postings = self.postings[term]
+            if term_postings.pop(idx, None) is not None and not term_postings:
+                del self.postings[term]
+
+        self.total_length -= length
+        self.word_counts.pop(idx, None)
+        position = self.positions.pop(idx)
+        if position == self.last_position:
+            self.last_position = max(self.positions.values(), default=-1)
+        self._idf_dirty = True
+        self._cursors = {}
+        self._sparse = None
+
+    def _compute_idf(self):
+        """Hitung ulang IDF dengan formula yang sama seperti BM25Okapi"""
+        self.idf = {}
+        corpus_size = self.corpus_size
+        negative_idfs = []
+        idf_sum = 0.0
+
+        for term, term_postings in self.postings.items():
+            doc_freq = len(term_postings)
+            idf = math.log(corpus_size - doc_freq + 0.5) - math.log(doc_freq + 0.5)
+            self.idf[term] = idf
+            idf_sum += idf
+            if idf < 0:
+                negative_idfs.append(term)
+
+        if self.idf:
+            eps = self.epsilon * (idf_sum / len(self.idf))
+            for term in negative_idfs:
+                self.idf[term] = eps
+
+        self._idf_dirty = False
+
+    def get_scores(self, query_tokens):
+        """Score only the sentences in the postings of the query terms.
+
+        Returns:
+            dict: {sentence_idx: score} for sentences with non-zero term overlap
+        """
+        if self._idf_dirty:
+            self._compute_idf()
+
+        if not self.sentence_lengths:
+            return {}
+
+        avgdl = self.total_length / self.corpus_size
+        k1 = self.k1
+        b = self.b
+        scores = {}
+
+        for term in query_tokens:
+            idf = self.idf.get(term) or 0
+            if not idf:
+                continue
+            for idx, tf in self.postings[term].items():
+                doc_len = self.sentence_lengths[idx]
+                denom = tf + k1 * (1 - b + b * doc_len / avgdl) if avgdl else tf + k1
+                scores[idx] = scores.get(idx, 0.0) + idf * (tf * (k1 + 1) / denom)
+
+        return scores
+
+    def sparse(self, sentences):
+        """SparseBM25 view of this index, built on first use and kept until the index changes"""
+        cached = self._sparse
+        if cached is None or cached[0] is not sentences:
+            cached = (sentences, SparseBM25.from_index(self, sentences))
+            self._sparse = cached
+        return cached[1]
+
+    def _cursor(self, term, avgdl):
+        """Sorted postings of a term and the largest tf-part x length bonus among them.
+
+        The bound is kept for the whole list and for every BM25_BLOCK_SIZE
+        postings. Only depends on the index contents and avgdl, so it is
+        cached until the next add_sentence/remove_sentence.
+        """
+        key = (term, avgdl)
+        cursor = self._cursors.get(key)
+        if cursor is None:
+            k1 = self.k1
+            b = self.b
+            term_postings = self.postings.get(term, {})
+            ids = sorted(term_postings)
+            bounds = []
+            for idx in ids:
+                tf = term_postings[idx]
+                doc_len = self.sentence_lengths[idx]
+                denom = tf + k1 * (1 - b + b * doc_len / avgdl) if avgdl else tf + k1
+                bounds.append(tf * (k1 + 1) / denom * (1.0 + self.word_counts[idx] / 100))
+            block_bounds = [
+                max(bounds[start:start + BM25_BLOCK_SIZE])
+                for start in range(0, len(bounds), BM25_BLOCK_SIZE)
+            ]
+            cursor = (ids, max(block_bounds, default=0.0), block_bounds)
+            self._cursors[key] = cursor
+        return cursor
+
+    def top_k(self, query_tokens, k, rescore, heap=None, rank=0, tag=None, idf=None, avgdl=None):
+        """Top-k BM25 retrieval with block-max WAND pruning over the postings.
+
+        Every term gets an upper bound (IDF x largest tf-part x length bonus
+        x BM25_MAX_KEYWORD_BONUS), overall and per block of postings. A
+        sentence is only scored when the bounds of the terms it can contain
+        beat the current k-th best final score, so most postings are skipped
+        instead of scored.
+
+        Args:
+            query_tokens (list): Stemmed query tokens (duplicates count twice, like get_scores)
+            k (int): Number of results to keep
+            rescore (callable): rescore(idx, score) -> final score with bonuses,
+                or None to drop the sentence. Must stay within the bound above.
+            heap (list, optional): Shared min-heap, so several indexes can be
+                searched with one running threshold
+            rank (int): Order of this index among those sharing the heap (ties
+                go to the lower rank, then to the earlier sentence)
+            tag: Stored in the heap entries to tell indexes apart
+            idf (dict, optional): IDF table to use instead of this index's own
+            avgdl (float, optional): Average sentence length to use instead of this index's own
+
+        Returns:
+            list: The heap of (final_score, -rank, -position, idx, tag) entries
+        """
+        if heap is None:
+            heap = []
+        if not self.sentence_lengths or k <= 0:
+            return heap
+        if idf is None:
+            if self._idf_dirty:
+                self._compute_idf()
+            idf = self.idf
+        if avgdl is None:
+            avgdl = self.total_length / self.corpus_size
+
+        k1 = self.k1
+        b = self.b
+        weights = Counter(query_tokens)
+        cursors = []
+        for term, count in weights.items():
+            term_idf = idf.get(term) or 0
+            if not term_idf or term not in self.postings:
+                continue
+            ids, bound, block_bounds = self._cursor(term, avgdl)
+            # Margin kecil agar pembulatan float tidak membuat batas atas lebih kecil dari skor asli
+            scale = max(count * term_idf * BM25_MAX_KEYWORD_BONUS, 0.0) * (1 + 1e-9)
+            cursors.append([ids[0], 0, ids, bound * scale, block_bounds, scale])
+
+        # Urutan penjumlahan sama dengan get_scores agar skor identik
+        scoring_terms = [
+            (idf[term], self.postings[term])
+            for term in query_tokens
+            if (idf.get(term) or 0) and term in self.postings
+        ]
+        sentence_lengths = self.sentence_lengths
+        word_counts = self.word_counts
+
+        def score(idx):
+            total = 0.0
+            for term_idf, term_postings in scoring_terms:
+                tf = term_postings.get(idx)
+                if tf:
+                    doc_len = sentence_lengths[idx]
+                    denom = tf + k1 * (1 - b + b * doc_len / avgdl) if avgdl else tf + k1
+                    total += term_idf * (tf * (k1 + 1) / denom)
+            return total
+
+        checked_until = -1  # pivot di bawah ini sudah lolos cek block-max
+        while cursors:
+            if len(cursors) > 1:
+                cursors.sort(key=lambda cursor: cursor[0])
+            threshold = heap[0][0] if len(heap) >= k else None
+
+            # Pivot: term pertama di mana jumlah batas atas bisa melewati threshold
+            pivot = None
+            accumulated = 0.0
+            for i, cursor in enumerate(cursors):
+                accumulated += cursor[3]
+                if threshold is None or accumulated > threshold:
+                    pivot = i
+                    break
+            if pivot is None:
+                break
+
+            pivot_idx = cursors[pivot][0]
+            while pivot + 1 < len(cursors) and cursors[pivot + 1][0] == pivot_idx:
+                pivot += 1
+
+            if threshold is not None and pivot_idx >= checked_until:
+                # Block-max: batas atas blok yang memuat pivot_idx pada term sampai pivot
+                block_sum = 0.0
+                skip_to = cursors[pivot + 1][0] if pivot + 1 < len(cursors) else None
+                for cursor in cursors[:pivot + 1]:
+                    ids = cursor[2]
+                    position = bisect.bisect_left(ids, pivot_idx, cursor[1])
+                    if position == len(ids):
+                        continue
+                    block = position // BM25_BLOCK_SIZE
+                    block_sum += cursor[4][block] * cursor[5]
+                    block_end = ids[min((block + 1) * BM25_BLOCK_SIZE, len(ids)) - 1] + 1
+                    skip_to = block_end if skip_to is None else min(skip_to, block_end)
+
+                if block_sum > threshold:
+                    checked_until = pivot_idx + 1 if skip_to is None else skip_to
+                else:
+                    # Tidak ada kalimat sebelum skip_to yang bisa masuk top-k
+                    for cursor in cursors[:pivot + 1]:
+                        cursor[1] = len(cursor[2]) if skip_to is None else bisect.bisect_left(cursor[2], skip_to, cursor[1])
+                        cursor[0] = cursor[2][cursor[1]] if cursor[1] < len(cursor[2]) else None
+                    cursors = [cursor for cursor in cursors if cursor[0] is not None]
+                    continue
+
+            if cursors[0][0] == pivot_idx:
+                raw_score = score(pivot_idx)
+                bound = raw_score * (1.0 + word_counts[pivot_idx] / 100) * BM25_MAX_KEYWORD_BONUS
+                # rescore (cek keyword di teks kalimat) hanya jika skor akhirnya masih bisa masuk top-k
+                if threshold is None or bound * (1 + 1e-9) > threshold:
+                    final_score = rescore(pivot_idx, raw_score)
+                    if final_score is not None:
+                        entry = (final_score, -rank, -self.positions[pivot_idx], pivot_idx, tag)
+                        if len(heap) < k:
+                            heapq.heappush(heap, entry)
+                        elif entry > heap[0]:
+                            heapq.heapreplace(heap, entry)
+
+                # Semua term sampai pivot berada di pivot_idx; maju satu posting
+                exhausted = False
+                for cursor in cursors[:pivot + 1]:
+                    cursor[1] += 1
+                    if cursor[1] < len(cursor[2]):
+                        cursor[0] = cursor[2][cursor[1]]
+                    else:
+                        cursor[0] = None
+                        exhausted = True
+            else:
+                # Kalimat sebelum pivot tidak mungkin masuk top-k, lompati
+                exhausted = False
+                for cursor in cursors[:pivot]:
+                    cursor[1] = bisect.bisect_left(cursor[2], pivot_idx, cursor[1])
+                    if cursor[1] < len(cursor[2]):
+                        cursor[0] = cursor[2][cursor[1]]
+                    else:
+                        cursor[0] = None
+                        exhausted = True
+
+            if exhausted:
+                cursors = [cursor for cursor in cursors if cursor[0] is not None]
+
+        return heap
+
+def build_bm25_index(split_texts, processed_sentences):
+    """Membuat BM25Index untuk setiap file"""
+    return {
+        file: BM25Index.from_processed(sentences, processed_sentences.get(file, {}))
+        for file, sentences in split_texts.items()
+    }
+
+# ===== BM25 VEKTORISASI (SPARSE) =====
+
+class SparseBM25:
+    """Vectorized BM25 over a sparse sentence x term matrix.
+
+    Built from a BM25Index. The CSC matrix holds the length-normalized
+    BM25 tf-part tf*(k1+1)/(tf+k1*(1-b+b*dl/avgdl)) of every sentence and
+    term, so a query is one column slice and one sparse matrix-vector
+    product. The keyword and length bonuses are array operations as well;
+    the keyword check runs over one lowercased copy of the document text.
+    """
+
+    __slots__ = (
+        "sentences", "row_ids", "row_positions", "vocabulary", "idf",
+        "weights", "length_bonus", "last_position", "offsets", "lowered",
+    )
+
+    @classmethod
+    def from_index(cls, file_bm25, sentences):
+        """Build the matrix from a BM25Index and split_texts[file]"""
+        index = cls()
+        store = as_sentence_store(sentences)
+        index.sentences = store
+
+        # Satu baris per kalimat, urut posisi dalam dokumen
+        row_ids = sorted(file_bm25.sentence_lengths, key=file_bm25.positions.get)
+        row_of = {idx: row for row, idx in enumerate(row_ids)}
+        index.row_ids = np.array(row_ids, dtype=np.int64)
+        index.row_positions = np.array([file_bm25.positions[idx] for idx in row_ids], dtype=np.int64)
+        index.last_position = int(index.row_positions.max()) if len(row_ids) else -1
+
+        index.vocabulary = {}
+        rows = array('q')
+        cols = array('q')
+        tfs = array('d')
+        for col, (term, term_postings) in enumerate(file_bm25.postings.items()):
+            index.vocabulary[term] = col
+            for idx, tf in term_postings.items():
+                rows.append(row_of[idx])
+                cols.append(col)
+                tfs.append(tf)
+        rows = np.frombuffer(rows, dtype=np.int64)
+        cols = np.frombuffer(cols, dtype=np.int64)
+        tfs = np.frombuffer(tfs, dtype=np.float64)
+
+        # Normalisasi panjang dihitung sekali di sini, bukan per query
+        k1 = file_bm25.k1
+        b = file_bm25.b
+        doc_lengths = np.array([file_bm25.sentence_lengths[idx] for idx in row_ids], dtype=np.float64)
+        avgdl = doc_lengths.mean() if len(doc_lengths) else 0.0
+        norms = k1 * (1 - b + b * doc_lengths / avgdl) if avgdl else np.full(len(doc_lengths), k1)
+        data = tfs * (k1 + 1) / (tfs + norms[rows])
+        index.weights = csc_matrix((data, (rows, cols)), shape=(len(row_ids), len(index.vocabulary)))
+
+        # IDF dan epsilon floor sama dengan BM25Okapi
+        doc_freqs = np.diff(index.weights.indptr)
+        index.idf = np.log(len(row_ids) - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(index.idf):
+            index.idf[index.idf < 0] = file_bm25.epsilon * index.idf.mean()
+
+        word_counts = np.array([file_bm25.word_counts[idx] for idx in row_ids], dtype=np.float64)
+        index.length_bonus = 1.0 + word_counts / 100
+
+        index.offsets = np.array(store.offsets, dtype=np.int64)
+        index.lowered = store.text.lower()
+        if len(index.lowered) != len(store.text):
+            # Offset tidak berlaku lagi jika lower() mengubah panjang teks
+            index.lowered = None
+        return index
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def scores(self, query_tokens):
+        """Raw BM25 score of every row; repeated query tokens count twice, as in BM25Okapi"""
+        counts = Counter(term for term in query_tokens if term in self.vocabulary)
+        if not counts:
+            return np.zeros(len(self.row_ids))
+        cols = np.fromiter((self.vocabulary[term] for term in counts), dtype=np.int64, count=len(counts))
+        query_weights = self.idf[cols] * np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        return self.weights[:, cols] @ query_weights
+
+    def keyword_rows(self, keyword):
+        """Boolean mask of the rows whose lowercased sentence contains keyword"""
+        if not keyword:
+            return np.ones(len(self.row_ids), dtype=bool)
+        if self.lowered is None:
+            return np.fromiter(
+                (keyword in self.sentences[position][1].lower() for position in self.row_positions),
+                dtype=bool, count=len(self.row_ids)
+            )
+
+        # Semua kemunculan (termasuk yang tumpang tindih), lalu petakan ke kalimat lewat offset
+        pattern = re.compile('(?=' + re.escape(keyword) + ')')
+        starts = np.fromiter((match.start() for match in pattern.finditer(self.lowered)), dtype=np.int64)
+        sentence_positions = np.searchsorted(self.offsets, starts, side='right') - 1
+        inside = starts + len(keyword) <= self.offsets[sentence_positions + 1]
+        return np.isin(self.row_positions, sentence_positions[inside])
+
+    def final_scores(self, query_tokens, keyword, threshold=0.01):
+        """Rows scoring above threshold, in document order, with bonuses applied.
+
+        Returns:
+            tuple: (row numbers, final scores) as arrays
+        """
+        raw = self.scores(query_tokens)
+        rows = np.flatnonzero(raw > threshold)
+        keyword_bonus = np.where(self.keyword_rows(keyword)[rows], BM25_MAX_KEYWORD_BONUS, 1.0)
+        return rows, raw[rows] * keyword_bonus * self.length_bonus[rows]
+
+# ===== KANONISASI QUERY =====
+
+BM25_METHODS = ("bm25", "bm25_vectorized")  # Metode yang memakai query ter-stem
+
+class CanonicalQuery:
+    """Bentuk kanonik query untuk satu metode pencarian.
+    
+    Dipakai sebagai kunci cache hasil pencarian dan sebagai query yang
+    sudah ditokenisasi, sehingga penulisan yang setara memakai hasil yang
+    sama dan preprocessing hanya dilakukan sekali per pencarian.
+    
+    Attributes:
+        method (str): "exact_match", "bm25" atau "bm25_vectorized"
+        text (str): Frasa query yang dicocokkan scorer (huruf kecil, spasi dirapikan)
+        tokens (list): Stem query dalam urutan asli, termasuk duplikat
+        expanded (list): tokens ditambah maksimal satu sinonim token pertama
+        key (tuple): Bagian query dari kunci cache
+    """
+    
+    __slots__ = ("method", "text", "tokens", "expanded", "key")
+    
+    def __init__(self, method, text, tokens=(), expanded=()):
+        self.method = method
+        self.text = text
+        self.tokens = list(tokens)
+        self.expanded = list(expanded)
+        # Bonus frasa dan sinonim bergantung urutan kata, jadi frasa
+        # kanonik (yang menentukan tokens dan expanded) adalah kuncinya
+        self.key = (method, text)
+
+def canonicalize_query(keyword, method):
+    """Kanonisasi query dengan preprocessing yang sama dengan scorer metode tersebut.
+    
+    Exact match mencocokkan frasa dalam huruf kecil, jadi hanya huruf dan
+    spasi yang dinormalisasi. BM25 memakai advanced_preprocess seperti
+    bonus frasanya, lalu stopword removal dan stemming seperti kalimat yang
+    diindeks: "Machine Learning", "machine  learning" dan "machine
+    learning!" menjadi query yang sama.
+    """
+    if method not in BM25_METHODS:
+        return CanonicalQuery(method, " ".join(keyword.lower().split()))
+    
+    keyword_clean = advanced_preprocess(keyword)
+    query_tokens = stem_sentence(remove_stopwords(nltk.word_tokenize(keyword_clean)))
+    
+    # Ekspansi query terbatas: satu sinonim untuk kata kunci pertama
+    expanded = query_tokens.copy()
+    if query_tokens:
+        expanded.extend(get_synonyms(query_tokens[0])[:1])
+    
+    return CanonicalQuery(method, keyword_clean, query_tokens, expanded)
+
 # ===== OPTIMASI METODE PENCARIAN =====
 
 # Fungsi untuk mendapatkan konteks paragraf dari kalimat yang cocok
@@ -735,15 +1939,13 @@ def get_context_paragraph(file, sentence_idx, split_texts, context_size=3):
         - Posisi kalimat yang cocok dalam paragraf (untuk highlighting)
         - Daftar indeks kalimat yang termasuk dalam paragraf
     """
+    sentence_store = {}  # Dipakai handler error jika as_sentence_store sendiri yang gagal
     try:
-        # Ambil semua kalimat untuk file
-        sentences = split_texts.get(file, [])
-        
-        # Buat dictionary yang memetakan idx ke kalimat untuk pencarian lebih mudah
-        sentence_dict = dict(sentences)
+        # Ambil semua kalimat untuk file (lookup idx langsung, tanpa membangun dict)
+        sentence_store = as_sentence_store(split_texts.get(file, []))
         
         # Temukan kalimat yang cocok
-        matched_sentence = sentence_dict.get(sentence_idx, "")
+        matched_sentence = sentence_store.get(sentence_idx, "")
         if not matched_sentence:
             return "", 0, []
         
@@ -753,8 +1955,9 @@ def get_context_paragraph(file, sentence_idx, split_texts, context_size=3):
         
         # Sertakan kalimat sebelum kalimat yang cocok
         for i in range(max(1, sentence_idx - context_size), sentence_idx):
-            if i in sentence_dict:
-                context_sentences.append(sentence_dict[i])
+            sentence = sentence_store.get(i)
+            if sentence is not None:
+                context_sentences.append(sentence)
                 context_indices.append(i)
         
         # Tambahkan kalimat yang cocok
@@ -764,8 +1967,9 @@ def get_context_paragraph(file, sentence_idx, split_texts, context_size=3):
         
         # Sertakan kalimat setelah kalimat yang cocok
         for i in range(sentence_idx + 1, sentence_idx + context_size + 1):
-            if i in sentence_dict:
-                context_sentences.append(sentence_dict[i])
+            sentence = sentence_store.get(i)
+            if sentence is not None:
+                context_sentences.append(sentence)
                 context_indices.append(i)
         
         # Gabungkan kalimat untuk membentuk paragraf
@@ -774,82 +1978,231 @@ def get_context_paragraph(file, sentence_idx, split_texts, context_size=3):
         return paragraph, matched_position, context_indices
     except Exception as e:
         st.error(f"Error dalam membuat konteks paragraf: {str(e)}")
-        return sentence_dict.get(sentence_idx, ""), 0, [sentence_idx]
+        return sentence_store.get(sentence_idx, ""), 0, [sentence_idx]
 
 # Fungsi untuk membuat inverted index
 def build_sentence_index(split_texts):
     """Membuat inverted index untuk pencarian lebih cepat"""
     start_time = time.time()
-    index = {}
-    processed = {}
+    tokenized = {file: [] for file in split_texts}
+    processed = {file: {} for file in split_texts}
+    
+    # Bagi dokumen menjadi shard kalimat agar dokumen besar juga terbagi rata
+    files = []
+    shards = []
+    for file, sentences in split_texts.items():
+        for start in range(0, len(sentences), INDEX_SHARD_SENTENCES):
+            files.append(file)
+            shards.append(sentences[start:start + INDEX_SHARD_SENTENCES])
+    
+    def merge(results):
+        # Shard datang berurutan, jadi urutan kalimat per file tetap terjaga
+        for file, rows in results:
+            file_tokenized = tokenized[file]
+            file_processed = processed[file]
+            for idx, tokens_no_stop, stemmed_tokens, length, tokens in rows:
+                file_processed[idx] = {
+                    'tokens': tokens_no_stop,
+                    'stemmed': stemmed_tokens,
+                    'length': length  # Simpan panjang kalimat untuk prioritasi
+                }
+                file_tokenized.append((idx, tokens))
     
-    def process_document(file_sentences):
-        file, sentences = file_sentences
-        # Buat index untuk file ini
-        file_index = {}
-        file_processed = {}
-        
-        for idx, sentence in sentences:
-            # Preprocessing
-            clean_text = advanced_preprocess(sentence)
-            tokens = nltk.word_tokenize(clean_text)
-            
-            # Simpan processed tokens untuk pencarian BM25
-            tokens_no_stop = remove_stopwords(tokens)
-            stemmed_tokens = stem_sentence(tokens_no_stop)
-            
-            # Simpan hasil process
-            file_processed[idx] = {
-                'tokens': tokens_no_stop,
-                'stemmed': stemmed_tokens,
-                'length': len(sentence.split())  # Simpan panjang kalimat untuk prioritasi
-            }
-            
-            # Tambahkan ke index
-            for token in set(tokens):  # Gunakan set untuk menghindari duplikasi
-                token = token.lower()
-                if token not in file_index:
-                    file_index[token] = []
-                if idx not in file_index[token]:
-                    file_index[token].append(idx)
-        
-        return file, file_index, file_processed
+    if len(shards) > 1:
+        # Preprocessing terikat GIL, jadi gunakan proses, bukan thread
+        with create_process_pool(min(PROCESS_WORKERS, len(shards)),
+                                 initializer=init_worker) as executor:
+            merge(executor.map(partial(index_sentence_shard, stop_words=stop_words), files, shards))
+    else:
+        # Corpus kecil - overhead proses tidak sebanding
+        merge(index_sentence_shard(file, shard, stop_words) for file, shard in zip(files, shards))
     
-    # Gunakan multi-threading untuk build index
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = []
-        for file, sentences in split_texts.items():
-            futures.append(executor.submit(process_document, (file, sentences)))
-        
-        for future in concurrent.futures.as_completed(futures):
-            file, file_index, file_processed = future.result()
-            index[file] = file_index
-            processed[file] = file_processed
+    # Postings dibangun sekali per file dalam satu pass linear
+    index = {file: PostingsIndex.build(file_tokenized) for file, file_tokenized in tokenized.items()}
     
     end_time = time.time()
     st.info(f"Index dokumen dibuat dalam {end_time - start_time:.2f} detik")
     return index, processed
 
+# Verifikasi exact match yang dikompilasi sekali per query
+class ExactMatcher:
+    """Compiled exact-match verification for one keyword.
+    
+    All query terms go into a single whole-word alternation that is run
+    once per sentence. Terms whose matches can overlap another term's
+    match (and could therefore be hidden by the non-overlapping scan)
+    keep their own compiled pattern as a fallback. Matching returns the
+    (start, end) spans of the hits, usable for highlighting.
+    """
+    
+    def __init__(self, keyword):
+        self.keyword_lower = keyword.lower()
+        self.terms = list(dict.fromkeys(self.keyword_lower.split()))
+        
+        # Kata kunci utuh dengan batas kata (pencarian satu kata)
+        self.keyword_pattern = re.compile(r'\b(' + re.escape(self.keyword_lower) + r')\b')
+        
+        # Semua term dalam satu pola; term terpanjang dicoba lebih dulu
+        self.terms_pattern = None
+        if self.terms:
+            ordered = sorted(self.terms, key=len, reverse=True)
+            self.terms_pattern = re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in ordered) + r')\b')
+        
+        self.fallback_patterns = {
+            term: re.compile(r'\b' + re.escape(term) + r'\b')
+            for term in self.terms if self._may_be_hidden(term)
+        }
+    
+    def _may_be_hidden(self, term):
+        """True if an occurrence of term can start inside another term's match"""
+        for other in self.terms:
+            if other == term:
+                continue
+            if term in other:
+                return True
+            if any(other.endswith(term[:k]) for k in range(1, len(term))):
+                return True
+        return False
+    
+    @staticmethod
+    def _lower(sentence):
+        """Lowercase text; spans are only reported when offsets are preserved"""
+        sent_lower = sentence.lower()
+        return sent_lower, len(sent_lower) == len(sentence)
+    
+    def match_keyword(self, sentence):
+        """Whole keyword with word boundaries; spans or None if no match"""
+        sent_lower, keep_spans = self._lower(sentence)
+        spans = [m.span() for m in self.keyword_pattern.finditer(sent_lower)]
+        if not spans:
+            return None
+        return spans if keep_spans else []
+    
+    def match(self, sentence):
+        """Exact phrase (substring) or all terms as whole words; spans or None"""
+        sent_lower, keep_spans = self._lower(sentence)
+        
+        # Exact phrase match
+        start = sent_lower.find(self.keyword_lower) if self.keyword_lower else -1
+        if start >= 0:
+            spans = []
+            while start >= 0:
+                end = start + len(self.keyword_lower)
+                spans.append((start, end))
+                start = sent_lower.find(self.keyword_lower, end)
+            return spans if keep_spans else []
+        
+        if self.terms_pattern is None:
+            # Tanpa term, syarat "semua term ada" selalu terpenuhi
+            return []
+        
+        # Semua term harus ada sebagai kata utuh (satu pass untuk semua term)
+        spans = []
+        found = set()
+        for m in self.terms_pattern.finditer(sent_lower):
+            found.add(m.group())
+            spans.append(m.span())
+        
+        for term in self.terms:
+            if term in found:
+                continue
+            pattern = self.fallback_patterns.get(term)
+            if pattern is None:
+                return None
+            term_spans = [m.span() for m in pattern.finditer(sent_lower)]
+            if not term_spans:
+                return None
+            spans.extend(term_spans)
+        
+        spans.sort()
+        return spans if keep_spans else []
+    
+    @staticmethod
+    def highlight(text, spans):
+        """Wrap spans in markdown bold, merging overlapping spans"""
+        parts = []
+        last = 0
+        for start, end in sorted(spans):
+            if start < last:
+                if end <= last:
+                    continue
+                # Perpanjang highlight sebelumnya
+                parts[-1] = parts[-1][:-2] + text[last:end] + "**"
+                last = end
+                continue
+            parts.append(text[last:start])
+            parts.append("**" + text[start:end] + "**")
+            last = end
+        parts.append(text[last:])
+        return "".join(parts)
+
+# Kandidat exact match dari positional index
+def exact_match_candidates(file_index, keyword_lower, keyword_terms):
+    """Kandidat kalimat untuk exact match multi-kata.
+    
+    Mengembalikan idx terurut yang mencakup semua kalimat yang bisa lolos
+    pengecekan phrase (substring) atau semua-term (kata utuh), atau None
+    bila query tidak bisa dibatasi lewat index.
+    """
+    # Duck typing: index dari rerun sebelumnya adalah instance kelas PostingsIndex yang lain
+    if not hasattr(file_index, "match_run_sequence"):
+        return None
+    
+    phrase_runs = WORD_RUN_PATTERN.findall(keyword_lower)
+    term_runs = [WORD_RUN_PATTERN.findall(term) for term in keyword_terms]
+    if not phrase_runs or not all(term_runs):
+        return None
+    
+    # Phrase sebagai substring: run pertama/terakhir boleh terpotong di dalam token
+    phrase_matches = file_index.match_run_sequence(
+        phrase_runs,
+        partial_start=WORD_RUN_PATTERN.match(keyword_lower) is not None,
+        partial_end=WORD_RUN_PATTERN.match(keyword_lower[-1]) is not None
+    )
+    
+    # Semua term sebagai kata utuh: irisan postings per term
+    all_term_matches = None
+    for runs in term_runs:
+        matches = file_index.match_run_sequence(runs)
+        if all_term_matches is None:
+            all_term_matches = matches
+        else:
+            all_term_matches = np.intersect1d(all_term_matches, matches, assume_unique=True)
+        if len(all_term_matches) == 0:
+            break
+    
+    return np.union1d(phrase_matches, all_term_matches)
+
 # Optimasi untuk exact match search yang mengutamakan kalimat panjang
-def exact_match_search(keyword, split_texts, sentence_index):
-    """Pencarian exact match dengan prioritas kalimat panjang dan caching"""
+def exact_match_search(keyword, split_texts, sentence_index, match_spans=None):
+    """Pencarian exact match dengan prioritas kalimat panjang dan caching.
+    
+    Bila match_spans berupa dict, posisi match untuk highlighting diisi
+    sebagai {(file, idx): [(start, end), ...]}.
+    """
+    if match_spans is None:
+        match_spans = {}
+    
     # Check cache first - NEW
-    cache_key = get_search_cache_key(keyword, "exact_match")
-    if cache_key in st.session_state.search_cache:
-        return st.session_state.search_cache[cache_key]
+    query = canonicalize_query(keyword, "exact_match")
+    cache_key = get_search_cache_key(query)
+    cached = st.session_state.search_cache.get(cache_key)
+    if cached is not None:
+        results, cached_spans = cached
+        match_spans.update(cached_spans)
+        return results
     
     start_time = time.time()
     results = {}
     
-    # Preprocessing keyword
-    keyword_lower = keyword.lower()
+    # Preprocessing keyword (sudah dalam huruf kecil lewat kanonisasi)
+    keyword_lower = query.text
     keyword_terms = keyword_lower.split()
+    term_runs = WORD_RUN_PATTERN.findall(keyword_lower)  # Kata dengan tanda baca = beberapa token berurutan
     
-    # Buat pola regex untuk whole word matching (compile sebelumnya untuk kecepatan)
-    pattern = re.compile(r'\b(' + re.escape(keyword_lower) + r')\b', re.IGNORECASE)
-    
-    # Lambda untuk mengecek match dengan kata utuh (menggunakan pattern yang sudah di-compile)
-    contains_keyword = lambda s: bool(pattern.search(s.lower()))
+    # Semua pola dikompilasi sekali untuk seluruh pencarian
+    matcher = ExactMatcher(keyword_lower)
+    found_spans = {}
     
     # Paralelkan pencarian di semua file - IMPROVED
     def search_file(file_data):
@@ -859,17 +2212,24 @@ def exact_match_search(keyword, split_texts, sentence_index):
         # Strategi pencarian berdasarkan jumlah kata kunci
         if len(keyword_terms) == 1:
             # Gunakan index untuk kata tunggal
-            matched_indices = file_index.get(keyword_lower, [])
+            if term_runs:
+                matched_indices = file_index.match_run_sequence(term_runs)
+            else:
+                # Tanpa karakter kata index tidak membantu, periksa semua kalimat
+                matched_indices = [idx for idx, _ in split_texts[file]]
             
-            if matched_indices:
+            if len(matched_indices) > 0:
                 # Dapatkan kalimat yang sesuai dengan panjangnya
                 matched_with_length = []
+                sentence_store = as_sentence_store(split_texts[file])
                 for idx in matched_indices:
-                    for sent_idx, sent in split_texts[file]:
-                        if sent_idx == idx and contains_keyword(sent):
-                            # Simpan (idx, sentence, sentence_length)
-                            matched_with_length.append((sent_idx, sent, len(sent.split())))
-                            break
+                    idx = int(idx)
+                    sent = sentence_store.get(idx)
+                    spans = matcher.match_keyword(sent) if sent is not None else None
+                    if spans is not None:
+                        # Simpan (idx, sentence, sentence_length)
+                        matched_with_length.append((idx, sent, len(sent.split())))
+                        found_spans[(file, idx)] = spans
                 
                 # Urutkan berdasarkan panjang kalimat (terpanjang ke terpendek)
                 matched_with_length.sort(key=lambda x: x[2], reverse=True)
@@ -882,6 +2242,13 @@ def exact_match_search(keyword, split_texts, sentence_index):
             # Batasi jumlah kalimat yang diperiksa untuk kecepatan lebih tinggi
             sentences_to_check = split_texts.get(file, [])
             
+            # Hanya periksa kandidat dari positional index bila tersedia
+            candidates = exact_match_candidates(file_index, keyword_lower, keyword_terms)
+            if candidates is not None:
+                sentence_store = as_sentence_store(sentences_to_check)
+                sentences_to_check = [sentence_store[position] for position in
+                                      sorted(sentence_store.position_of(idx) for idx in candidates.tolist())]
+            
             # Pecah pemrosesan menjadi chunks untuk kecepatan
             chunk_size = 500  # Jumlah kalimat per chunk
             sentence_chunks = [sentences_to_check[i:i+chunk_size] 
@@ -889,16 +2256,11 @@ def exact_match_search(keyword, split_texts, sentence_index):
             
             for chunk in sentence_chunks:
                 for idx, sent in chunk:
-                    sent_lower = sent.lower()
-                    
-                    # Cek untuk exact phrase match
-                    if keyword_lower in sent_lower:
-                        file_results.append((idx, sent, len(sent.split())))
-                        continue
-                    
-                    # Jika tidak exact phrase, periksa apakah semua kata kunci ada (whole words)
-                    if all(re.search(r'\b' + re.escape(term) + r'\b', sent_lower) for term in keyword_terms):
+                    # Exact phrase, atau semua kata kunci sebagai kata utuh
+                    spans = matcher.match(sent)
+                    if spans is not None:
                         file_results.append((idx, sent, len(sent.split())))
+                        found_spans[(file, idx)] = spans
             
             # Urutkan berdasarkan panjang kalimat
             file_results.sort(key=lambda x: x[2], reverse=True)
@@ -924,94 +2286,78 @@ def exact_match_search(keyword, split_texts, sentence_index):
     st.info(f"Pencarian exact match selesai dalam {end_time - start_time:.2f} detik")
     
     # Save to cache - NEW
-    st.session_state.search_cache[cache_key] = results
+    st.session_state.search_cache.put(cache_key, (results, found_spans))
+    match_spans.update(found_spans)
     
     return results
 
 # Optimasi untuk BM25 search dengan prioritas kalimat panjang
-def bm25_search(keyword, split_texts, processed_sentences):
-    """Pencarian BM25 dengan prioritas kalimat panjang dan caching"""
+def bm25_search(keyword, split_texts, processed_sentences, bm25_index=None):
+    """Pencarian BM25 dengan prioritas kalimat panjang dan caching.
+    
+    Hanya MAX_RESULTS_TO_SHOW kalimat teratas per file yang dicari, dengan
+    block-max WAND di BM25Index.top_k sehingga sebagian besar kalimat tidak
+    perlu dihitung skornya. bm25_index yang belum ada dibangun sekali dan
+    disimpan kembali ke dictionary ini.
+    """
     # Check cache first - NEW
-    cache_key = get_search_cache_key(keyword, "bm25")
-    if cache_key in st.session_state.search_cache:
+    query = canonicalize_query(keyword, "bm25")
+    cache_key = get_search_cache_key(query)
+    cached = st.session_state.search_cache.get(cache_key)
+    if cached is not None:
         st.info(f"Menggunakan hasil pencarian dari cache")
-        return st.session_state.search_cache[cache_key]
+        return cached
     
     start_time = time.time()
     results = {}
 
-    # Proses tokenisasi keyword 
-    keyword_clean = advanced_preprocess(keyword)
-    query_tokens = nltk.word_tokenize(keyword_clean)
-    query_tokens = remove_stopwords(query_tokens)
-    query_tokens = stem_sentence(query_tokens)
-    
-    # Ekspansi query terbatas
-    expanded_query = query_tokens.copy()
-    if len(query_tokens) > 0:
-        # Tambahkan sinonim untuk kata kunci pertama
-        main_token = query_tokens[0]
-        synonyms = get_synonyms(main_token)[:1]  # Max 1 sinonim
-        expanded_query.extend(synonyms)
+    # Query sudah ditokenisasi, di-stem dan diekspansi oleh canonicalize_query
+    expanded_query = query.expanded
     
     # Verifikasi ada token valid setelah preprocessing
     if not expanded_query:
         st.warning("Kata kunci terlalu pendek atau hanya berisi stopwords.")
         return {}
 
+    if bm25_index is None:
+        bm25_index = {}
+    
+    # Bangun index yang belum ada (hanya sekali per file, bukan per query)
+    for file, sentences in split_texts.items():
+        if file not in bm25_index:
+            bm25_index[file] = BM25Index.from_processed(sentences, processed_sentences.get(file, {}))
+
     def process_document(file_sentences_processed):
-        file, sentences, file_processed = file_sentences_processed
+        file, sentences, file_processed, file_bm25 = file_sentences_processed
         
         # Cek apakah dokumen sudah diproses
-        if not file_processed:
+        if not file_processed or not file_bm25.corpus_size:
             return file, []
+        
+        sentence_store = as_sentence_store(sentences)
+        
+        def rescore(sent_idx, score):
+            if score <= 0.01:  # Filter threshold
+                return None
+            sent = sentence_store.get(sent_idx, "")
+            sent_len = file_processed[sent_idx].get('length', len(sent.split()))
             
-        # Dapatkan corpus yang sudah diproses
-        tokenized_corpus = []
-        original_sentences = []
-        sentence_indices = []
-        sentence_lengths = []
-        
-        # Kumpulkan kalimat dan token yang diproses
-        for idx, sent in sentences:
-            if idx in file_processed:
-                tokenized_corpus.append(file_processed[idx]['stemmed'])
-                original_sentences.append(sent)
-                sentence_indices.append(idx)
-                # Simpan panjang kalimat untuk prioritasi
-                sentence_lengths.append(file_processed[idx].get('length', len(sent.split())))
-        
-        # Skip jika tidak ada kalimat terproses
-        if not tokenized_corpus:
-            return file, []
+            # Bonus untuk kalimat yang mengandung kata kunci asli
+            contains_keyword = query.text in sent.lower()
+            keyword_bonus = BM25_MAX_KEYWORD_BONUS if contains_keyword else 1.0
             
-        # Buat model BM25
-        try:
-            # Parameter BM25 yang disesuaikan
-            bm25 = BM25Okapi(tokenized_corpus, k1=1.5, b=0.75)
-            scores = bm25.get_scores(expanded_query)
+            # Bonus untuk kalimat panjang (10% per 10 kata)
+            length_bonus = 1.0 + (sent_len / 100) 
             
-            # Aplikasikan bonus untuk kalimat panjang dan kalimat yg mengandung keyword asli
-            result_sentences = []
-            for i, (score, sent, sent_idx, sent_len) in enumerate(zip(scores, original_sentences, sentence_indices, sentence_lengths)):
-                if score > 0.01:  # Filter threshold
-                    # Bonus untuk kalimat yang mengandung kata kunci asli
-                    contains_keyword = keyword_clean in sent.lower()
-                    keyword_bonus = 1.5 if contains_keyword else 1.0
-                    
-                    # Bonus untuk kalimat panjang (10% per 10 kata)
-                    length_bonus = 1.0 + (sent_len / 100) 
-                    
-                    # Skor akhir dengan kombinasi bonus
-                    final_score = score * keyword_bonus * length_bonus
-                    
-                    result_sentences.append((final_score, sent_idx, sent, sent_len))
+            # Skor akhir dengan kombinasi bonus
+            return score * keyword_bonus * length_bonus
             
-            # Sort berdasarkan skor final
-            result_sentences.sort(reverse=True, key=lambda x: x[0])
+        try:
+            # Top-k dengan pruning; hanya kalimat yang mungkin masuk hasil yang dihitung skornya
+            heap = file_bm25.top_k(expanded_query, MAX_RESULTS_TO_SHOW, rescore)
             
-            # Ambil top results dalam format (idx, sentence)
-            top_results = [(idx, sent) for _, idx, sent, _ in result_sentences[:MAX_RESULTS_TO_SHOW]]
+            # Ambil top results dalam format (idx, sentence), skor tertinggi lebih dulu
+            top_results = [(idx, sentence_store.get(idx)) for _, _, _, idx, _ in sorted(heap, reverse=True)]
             
             return file, top_results
         except Exception as e:
@@ -1026,7 +2372,7 @@ def bm25_search(keyword, split_texts, processed_sentences):
             file_processed = processed_sentences.get(file, {})
             futures.append(executor.submit(
                 process_document, 
-                (file, sentences, file_processed)
+                (file, sentences, file_processed, bm25_index[file])
             ))
         
         for future in concurrent.futures.as_completed(futures):
@@ -1038,7 +2384,72 @@ def bm25_search(keyword, split_texts, processed_sentences):
     st.info(f"Pencarian BM25 selesai dalam {end_time - start_time:.2f} detik")
     
     # Save to cache - NEW
-    st.session_state.search_cache[cache_key] = results
+    st.session_state.search_cache.put(cache_key, results)
+    
+    return results
+
+# BM25 dengan backend NumPy/SciPy
+def bm25_search_vectorized(keyword, split_texts, processed_sentences, bm25_index=None):
+    """Pencarian BM25 dengan SparseBM25: skor, bonus dan top-k sebagai operasi array.
+    
+    Hasil sama dengan bm25_search (kalimat yang sama, urutan yang sama);
+    hanya backend perhitungannya yang berbeda.
+    """
+    query = canonicalize_query(keyword, "bm25_vectorized")
+    cache_key = get_search_cache_key(query)
+    cached = st.session_state.search_cache.get(cache_key)
+    if cached is not None:
+        st.info(f"Menggunakan hasil pencarian dari cache")
+        return cached
+    
+    start_time = time.time()
+    results = {}
+
+    expanded_query = query.expanded
+    
+    if not expanded_query:
+        st.warning("Kata kunci terlalu pendek atau hanya berisi stopwords.")
+        return {}
+
+    if bm25_index is None:
+        bm25_index = {}
+    
+    for file, sentences in split_texts.items():
+        if file not in bm25_index:
+            bm25_index[file] = BM25Index.from_processed(sentences, processed_sentences.get(file, {}))
+
+    def process_document(file_sentences):
+        file, sentences, file_bm25 = file_sentences
+        
+        if not file_bm25.corpus_size:
+            return file, []
+        
+        try:
+            matrix = file_bm25.sparse(sentences)
+            rows, final_scores = matrix.final_scores(expanded_query, query.text)
+            
+            # Skor tertinggi lebih dulu; skor sama tetap urut dokumen
+            top_rows = rows[np.lexsort((rows, -final_scores))[:MAX_RESULTS_TO_SHOW]]
+            store = as_sentence_store(sentences)
+            return file, [store[int(matrix.row_positions[row])] for row in top_rows]
+        except Exception as e:
+            st.error(f"Error BM25: {str(e)}")
+            return file, []
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(process_document, (file, sentences, bm25_index[file]))
+            for file, sentences in split_texts.items()
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            file, result = future.result()
+            if result:
+                results[file] = result
+
+    end_time = time.time()
+    st.info(f"Pencarian BM25 (vectorized) selesai dalam {end_time - start_time:.2f} detik")
+    
+    st.session_state.search_cache.put(cache_key, results)
     
     return results
 
@@ -1209,16 +2620,16 @@ def weighted_lcs(X, Y):
 def enhanced_rouge_l_computation(y_true, y_pred):
     """Optimasi perhitungan ROUGE-L untuk skor tinggi"""
     try:
-        # Caching berdasarkan hash input
-        cache_key = f"rouge_{hash((y_true, y_pred))}"
-        cached_result = load_from_cache(cache_key)
-        if cached_result:
-            return cached_result
-        
         # Preprocessing
         y_true = advanced_preprocess(y_true)
         y_pred = advanced_preprocess(y_pred)
         
+        # Caching berdasarkan input yang sudah dinormalisasi
+        cache_key = evaluation_cache_key("rouge", y_true, y_pred)
+        cached_result = load_from_cache(cache_key)
+        if cached_result:
+            return cached_result
+        
         # Tokenisasi dengan caching
         y_true_tokens = list(cached_tokenize(y_true))
         y_pred_tokens = list(cached_tokenize(y_pred))
@@ -1317,16 +2728,16 @@ def enhanced_rouge_l_computation(y_true, y_pred):
 def enhanced_meteor_computation(y_true, y_pred):
     """Peningkatan perhitungan METEOR untuk skor tinggi"""
     try:
-        # Caching berdasarkan hash input
-        cache_key = f"meteor_{hash((y_true, y_pred))}"
-        cached_result = load_from_cache(cache_key)
-        if cached_result:
-            return cached_result
-        
         # Preprocessing dengan batasan ukuran
         y_true = advanced_preprocess(y_true)[:1000]
         y_pred = advanced_preprocess(y_pred)[:1000]
         
+        # Caching berdasarkan input yang sudah dinormalisasi
+        cache_key = evaluation_cache_key("meteor", y_true, y_pred)
+        cached_result = load_from_cache(cache_key)
+        if cached_result:
+            return cached_result
+        
         # Deteksi kalimat pendek
         is_short_sentence = len(y_true.split()) < 5 or len(y_pred.split()) < 5
         
@@ -1489,8 +2900,18 @@ def evaluate_against_ground_truth_optimized(matched_sentence, all_sentences, mat
         # Deteksi kalimat pendek
         is_short_sentence = len(matched_sentence.split()) < 5
         
-        # Caching evaluation berdasarkan matched sentence
-        cache_key = f"eval_{hash((matched_sentence, matched_idx))}"
+        # Kalimat pembanding dipilih lebih dulu karena hasil evaluasi bergantung pada isinya:
+        # kalimat terpanjang dalam dokumen selain kalimat yang cocok
+        compare_sentences = []
+        if len(all_sentences) > 1:
+            for idx, sent in all_sentences:
+                if idx != matched_idx:
+                    compare_sentences.append((idx, sent, len(sent.split())))
+            compare_sentences.sort(key=lambda x: x[2], reverse=True)
+            compare_sentences = [(idx, sent) for idx, sent, _ in compare_sentences[:5]]
+        
+        # Caching evaluation berdasarkan isi kalimat yang cocok dan kalimat pembanding
+        cache_key = evaluation_cache_key("eval", matched_sentence, *(sent for _, sent in compare_sentences))
         cached_result = load_from_cache(cache_key)
         if cached_result:
             return cached_result
@@ -1542,20 +2963,7 @@ def evaluate_against_ground_truth_optimized(matched_sentence, all_sentences, mat
             best_explanation["artificial_reference"] = artificial_reference
             best_explanation["self_evaluation"] = True
         else:
-            # Bandingkan dengan kalimat lain dalam dokumen
-            # Pilih kalimat yang lebih panjang untuk perbandingan
-            compare_sentences = []
-            for idx, sent in all_sentences:
-                if idx != matched_idx:
-                    compare_sentences.append((idx, sent, len(sent.split())))
-            
-            # Urutkan berdasarkan panjang (prioritaskan kalimat panjang)
-            compare_sentences.sort(key=lambda x: x[2], reverse=True)
-            
-            # Ambil beberapa kalimat terpanjang
-            compare_sentences = [(idx, sent) for idx, sent, _ in compare_sentences[:5]]
-            
-            # Evaluasi terhadap setiap kalimat pembanding
+            # Evaluasi terhadap setiap kalimat pembanding dalam dokumen
             for idx, ground_truth_sentence in compare_sentences:
                 precision, recall, f_measure, meteor, explanation = evaluate_sentence_optimized(
                     ground_truth_sentence, matched_sentence
@@ -1611,8 +3019,9 @@ def sort_by_evaluation_batched(results, split_texts, eval_method):
     cache_key = get_eval_cache_key(results, eval_method)
     
     # Check cache first - NEW
-    if cache_key in st.session_state.eval_cache:
-        return st.session_state.eval_cache[cache_key]
+    cached = st.session_state.eval_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     start_time = time.time()
     eval_results = []
@@ -1714,38 +3123,85 @@ def sort_by_evaluation_batched(results, split_texts, eval_method):
     top_results = eval_results[:MAX_RESULTS_TO_SHOW]
     
     # Save to cache - NEW
-    st.session_state.eval_cache[cache_key] = top_results
+    st.session_state.eval_cache.put(cache_key, top_results)
     
     end_time = time.time()
     st.info(f"Evaluasi hasil pencarian selesai dalam {end_time - start_time:.2f} detik")
     
     return top_results
 
-# Fungsi untuk memeriksa perubahan file dengan optimasi
-def have_files_changed(uploaded_files):
-    """Periksa perubahan file dengan optimasi hashing"""
-    if not uploaded_files:
-        return False
+# Penanda murah unggahan untuk menghindari hashing ulang di setiap rerun
+def get_upload_fingerprint(file):
+    """(file_id, ukuran) unggahan; Streamlit memberi file_id baru setiap kali file diunggah"""
+    return (getattr(file, "file_id", None), file.size)
+
+# Fungsi untuk menentukan file yang perlu diproses ulang
+def get_file_changes(uploaded_files):
+    """Bandingkan unggahan dengan file yang sudah diproses (nama dan hash isi file).
     
-    # Ambil nama dan ukuran file untuk identifikasi cepat
-    current_files_info = {(file.name, file.size) for file in uploaded_files}
-    processed_files_info = set()
+    Streamlit menjalankan ulang skrip di setiap interaksi widget, jadi hanya
+    file yang penandanya (file_id, ukuran) berbeda dari pemeriksaan terakhir
+    yang di-hash. Unggahan ulang dengan isi yang sama langsung dicatat agar
+    tidak di-hash lagi.
     
-    # Build info untuk file yang sudah diproses
-    for file_name in st.session_state.processed_files:
-        if file_name in st.session_state.file_stats:
-            file_size = st.session_state.file_stats[file_name].get('size', 0)
-            processed_files_info.add((file_name, file_size))
+    Returns:
+        tuple: (file unggahan yang baru atau berubah, nama file yang sudah tidak
+            diunggah, {nama file: hash isi} untuk file yang berubah)
+    """
+    if not uploaded_files:
+        return [], [], {}
+    
+    fingerprints = st.session_state.upload_fingerprints
+    changed_files = []
+    content_hashes = {}
+    for file in uploaded_files:
+        fingerprint = get_upload_fingerprint(file)
+        if fingerprints.get(file.name) == fingerprint:
+            continue
+        
+        content_hash = get_content_hash(file)
+        if st.session_state.upload_hashes.get(file.name) == content_hash:
+            fingerprints[file.name] = fingerprint
         else:
-            # Jika tidak ada info size, hanya gunakan nama
-            processed_files_info.add((file_name, 0))
+            changed_files.append(file)
+            content_hashes[file.name] = content_hash
     
-    # Periksa jika jumlah file berbeda
-    if len(current_files_info) != len(processed_files_info):
-        return True
+    current_names = {file.name for file in uploaded_files}
+    removed_files = [name for name in st.session_state.processed_files if name not in current_names]
+    return changed_files, removed_files, content_hashes
+
+# Struktur index per file di session state
+DOCUMENT_INDEX_FIELDS = ("doc_texts", "split_texts", "sentence_index", "processed_sentences",
+                         "bm25_index", "file_stats")
+
+# Fungsi untuk menghapus dokumen dari semua index tanpa menyentuh dokumen lain
+def remove_documents_from_index(filenames):
+    """Hapus dokumen dari semua struktur index di session state"""
+    for filename in filenames:
+        for name in DOCUMENT_INDEX_FIELDS + ("upload_hashes", "upload_fingerprints"):
+            getattr(st.session_state, name).pop(filename, None)
+        st.session_state.processed_files.discard(filename)
+
+# Fungsi untuk mendaftarkan file duplikat tanpa ekstraksi dan indexing ulang
+def link_duplicate_documents(owners):
+    """Pakai struktur index file pemilik untuk file dengan isi yang sama (tanpa salinan).
+    
+    Args:
+        owners (dict): {nama file duplikat: nama file yang isinya sudah diindeks}
         
-    # Bandingkan dengan file yang sudah diproses
-    return current_files_info != processed_files_info
+    Returns:
+        list: Nama file duplikat yang berhasil didaftarkan
+    """
+    linked = []
+    for filename, owner in owners.items():
+        if owner not in st.session_state.split_texts:
+            continue
+        for name in DOCUMENT_INDEX_FIELDS:
+            index = getattr(st.session_state, name)
+            if owner in index:
+                index[filename] = index[owner]
+        linked.append(filename)
+    return linked
 
 # Fungsi untuk reset cache dokumen
 def reset_document_cache():
@@ -1756,12 +3212,19 @@ def reset_document_cache():
     st.session_state.processed_files = set()
     st.session_state.sentence_index = {}
     st.session_state.processed_sentences = {}
+    st.session_state.bm25_index = {}
     st.session_state.file_stats = {}
-    st.session_state.search_cache = {}  # Reset search cache - NEW
-    st.session_state.eval_cache = {}  # Reset eval cache - NEW
-    
-    # Hapus file cache
+    st.session_state.upload_hashes = {}
+    st.session_state.upload_fingerprints = {}
+    st.session_state.search_cache.clear()  # Reset search cache - NEW
+    st.session_state.eval_cache.clear()  # Reset eval cache - NEW
+    st.session_state.corpus_version += 1
+    
+    # Kosongkan disk cache, juga file pickle dari cache per file versi lama
+    disk_cache.clear()
     for filename in os.listdir(CACHE_DIR):
+        if not filename.endswith(".pickle"):
+            continue
         file_path = os.path.join(CACHE_DIR, filename)
         try:
             if os.path.isfile(file_path):
@@ -1816,6 +3279,21 @@ def main():
                 st.write(f"- Kata: {stats.get('words', 0)}")
                 st.write(f"- Ukuran: {stats.get('size', 0) // 1024} KB")
                 st.write("---")
+        
+        # Tampilkan statistik disk cache
+        st.subheader("Statistik Cache")
+        cache_stats = disk_cache.stats()
+        total = cache_stats['total']
+        lookups = total['hits'] + total['misses']
+        st.write(f"- Entri: {total['entries']} ({total['bytes'] / (1024 * 1024):.1f} MB)")
+        st.write(f"- Hit/miss: {total['hits']}/{total['misses']}"
+                 + (f" ({total['hits'] / lookups:.0%} hit)" if lookups else ""))
+        st.write(f"- Memori: {total['memory_entries']} entri, {total['memory_hits']} hit dari memori")
+        st.write(f"- Eviksi: {total['evictions']}, menunggu ditulis: {total['pending_writes']}")
+        for label, result_cache in (("Hasil pencarian", st.session_state.search_cache),
+                                    ("Hasil evaluasi", st.session_state.eval_cache)):
+            st.write(f"- {label}: {len(result_cache)} entri, {result_cache.total_bytes // 1024} KB, "
+                     f"{result_cache.hits} hit / {result_cache.misses} miss")
                 
         # Tampilkan info bahasa stopwords aktif
         st.subheader("Bahasa Stopwords Aktif")
@@ -1837,24 +3315,41 @@ def main():
     # Progress container
     progress_container = st.empty()
     
-    # Hanya proses file jika ada perubahan atau belum diproses
-    files_changed = have_files_changed(uploaded_files)
+    # Hanya proses file jika ada perubahan atau belum diproses (dihitung sekali per rerun)
+    changed_files, removed_files, content_hashes = get_file_changes(uploaded_files)
     
-    if uploaded_files and files_changed:
+    if uploaded_files and (changed_files or removed_files):
         with progress_container.container():
             with st.spinner("Memproses dokumen..."):
                 # Progress bar dan status text
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
-                # Reset cache untuk pemrosesan baru
-                st.session_state.doc_texts = {}
-                st.session_state.split_texts = {}
-                st.session_state.search_cache = {}  # Reset search cache - NEW
-                st.session_state.eval_cache = {}    # Reset eval cache - NEW
+                # Hanya file baru/berubah yang diproses; file yang dihapus atau
+                # berubah dibuang dari index tanpa menyentuh dokumen lain
+                remove_documents_from_index(removed_files + [file.name for file in changed_files])
+                # Hasil cache untuk corpus lama tidak terpakai lagi
+                st.session_state.corpus_version += 1
+                new_texts = {}
+                
+                # File dengan isi yang sudah diindeks (atau sama dengan file lain di
+                # unggahan ini) tidak diekstraksi ulang, cukup berbagi index pemiliknya
+                indexed_hashes = {
+                    content_hash: name for name, content_hash in st.session_state.upload_hashes.items()
+                    if name in st.session_state.split_texts
+                }
+                owners = {}
+                files_to_extract = []
+                for uploaded_file in changed_files:
+                    content_hash = content_hashes[uploaded_file.name]
+                    if content_hash in indexed_hashes:
+                        owners[uploaded_file.name] = indexed_hashes[content_hash]
+                    else:
+                        indexed_hashes[content_hash] = uploaded_file.name
+                        files_to_extract.append(uploaded_file)
                 
                 # Ekstraksi teks dari file secara paralel - IMPROVED
-                total_files = len(uploaded_files)
+                total_files = len(files_to_extract)
                 
                 def process_file(file_data):
                     idx, uploaded_file = file_data
@@ -1881,40 +3376,63 @@ def main():
                         return None, None
                 
                 # Paralelkan ekstraksi file
-                with concurrent.futures.ThreadPoolExecutor(max_workers=min(total_files, MAX_WORKERS)) as executor:
-                    futures = []
-                    for i, uploaded_file in enumerate(uploaded_files):
-                        futures.append(executor.submit(process_file, (i, uploaded_file)))
-                    
-                    for i, future in enumerate(concurrent.futures.as_completed(futures)):
-                        file_name, text = future.result()
-                        if file_name and text:
-                            st.session_state.doc_texts[file_name] = text
-                        # Update progress
-                        progress_bar.progress((i + 1) / total_files)
-                        status_text.text(f"Memproses file {i+1}/{total_files}")
+                if files_to_extract:
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=min(total_files, MAX_WORKERS)) as executor:
+                        futures = []
+                        for i, uploaded_file in enumerate(files_to_extract):
+                            futures.append(executor.submit(process_file, (i, uploaded_file)))
+                        
+                        for i, future in enumerate(concurrent.futures.as_completed(futures)):
+                            file_name, text = future.result()
+                            if file_name and text:
+                                new_texts[file_name] = text
+                            # Update progress
+                            progress_bar.progress((i + 1) / total_files)
+                            status_text.text(f"Memproses file {i+1}/{total_files}")
                 
-                # Pecah teks menjadi kalimat dan buat index
-                if st.session_state.doc_texts:
+                # Pecah teks menjadi kalimat dan buat index, hanya untuk dokumen baru
+                if new_texts:
                     # Split sentences
                     status_text.text("Membagi dokumen menjadi kalimat...")
-                    st.session_state.split_texts = split_into_sentences(st.session_state.doc_texts)
+                    new_split_texts = split_into_sentences(new_texts)
                     
                     # Build index untuk pencarian lebih cepat
                     status_text.text("Membuat index pencarian...")
-                    st.session_state.sentence_index, st.session_state.processed_sentences = build_sentence_index(
-                        st.session_state.split_texts
-                    )
+                    new_sentence_index, new_processed_sentences = build_sentence_index(new_split_texts)
+                    new_bm25_index = build_bm25_index(new_split_texts, new_processed_sentences)
                     
-                    # Simpan info file yang diproses
-                    st.session_state.processed_files = {file.name for file in uploaded_files}
+                    # Gabungkan ke index yang sudah ada per dokumen
+                    st.session_state.doc_texts.update(new_texts)
+                    st.session_state.split_texts.update(new_split_texts)
+                    st.session_state.sentence_index.update(new_sentence_index)
+                    st.session_state.processed_sentences.update(new_processed_sentences)
+                    st.session_state.bm25_index.update(new_bm25_index)
                     
                     status_text.text("Pemrosesan dokumen selesai!")
-                    st.success(f"Berhasil memproses {len(st.session_state.doc_texts)} dokumen")
-                else:
+                    st.success(f"Berhasil memproses {len(new_texts)} dokumen baru")
+                elif files_to_extract:
                     status_text.text("Tidak ada dokumen yang berhasil diproses.")
                     st.warning("Tidak ada teks yang berhasil diekstrak dari file. Pastikan file tidak kosong dan dalam format yang valid.")
                 
+                linked_files = link_duplicate_documents(owners)
+                if linked_files:
+                    st.info(f"{len(linked_files)} dokumen berisi sama dengan dokumen lain dan memakai index yang sudah ada")
+                skipped_files = [name for name in owners if name not in linked_files]
+                if skipped_files:
+                    st.warning(f"Dokumen {', '.join(skipped_files)} dilewati karena file lain dengan isi yang sama gagal diproses")
+                
+                # Hash hanya dicatat untuk file yang benar-benar diindeks atau ditautkan.
+                # File yang gagal tidak diulang di setiap rerun (penandanya dicatat),
+                # tetapi diproses lagi saat diunggah ulang
+                indexed_files = set(new_texts) | set(linked_files)
+                st.session_state.upload_hashes.update(
+                    (name, content_hash) for name, content_hash in content_hashes.items() if name in indexed_files
+                )
+                st.session_state.upload_fingerprints.update(
+                    (file.name, get_upload_fingerprint(file)) for file in changed_files
+                )
+                st.session_state.processed_files = {file.name for file in uploaded_files}
+                
                 # Clear progress display
                 progress_bar.empty()
                 status_text.empty()
@@ -1956,7 +3474,7 @@ def main():
         # Pilih metode pencarian
         col1, col2 = st.columns(2)
         with col1:
-            search_method = st.selectbox("Pilih metode pencarian", ["Exact Match", "BM25"])
+            search_method = st.selectbox("Pilih metode pencarian", ["Exact Match", "BM25", "BM25 (Vectorized)"])
         with col2:
             eval_method = st.multiselect("Pilih metode evaluasi", ["ROUGE-L", "METEOR"], default=["ROUGE-L", "METEOR"])
         
@@ -1986,27 +3504,32 @@ def main():
                     # Menampilkan timer
                     start_time = time.time()
                     
-                    # Check if search is in cache - NEW
-                    cache_key = get_search_cache_key(keyword, search_method)
-                    cached_search = st.session_state.search_cache.get(cache_key)
+                    # Fungsi pencarian memakai cache hasil pencarian sendiri
+                    match_spans = {}
                     
-                    if cached_search:
-                        search_results = cached_search
-                    else:
-                        # Pencarian dengan metode yang dipilih
-                        with st.spinner(f'Melakukan pencarian {search_method}...'):
-                            if search_method == "Exact Match":
-                                search_results = exact_match_search(
-                                    keyword, 
-                                    st.session_state.split_texts,
-                                    st.session_state.sentence_index
-                                )
-                            elif search_method == "BM25":
-                                search_results = bm25_search(
-                                    keyword, 
-                                    st.session_state.split_texts,
-                                    st.session_state.processed_sentences
-                                )
+                    # Pencarian dengan metode yang dipilih
+                    with st.spinner(f'Melakukan pencarian {search_method}...'):
+                        if search_method == "Exact Match":
+                            search_results = exact_match_search(
+                                keyword, 
+                                st.session_state.split_texts,
+                                st.session_state.sentence_index,
+                                match_spans
+                            )
+                        elif search_method == "BM25":
+                            search_results = bm25_search(
+                                keyword, 
+                                st.session_state.split_texts,
+                                st.session_state.processed_sentences,
+                                st.session_state.bm25_index
+                            )
+                        elif search_method == "BM25 (Vectorized)":
+                            search_results = bm25_search_vectorized(
+                                keyword, 
+                                st.session_state.split_texts,
+                                st.session_state.processed_sentences,
+                                st.session_state.bm25_index
+                            )
                     
                     search_time = time.time() - start_time
                     st.success(f"Pencarian selesai dalam {search_time:.2f} detik")
@@ -2041,12 +3564,22 @@ def main():
                                 )
 
                                 # Highlight keyword dalam paragraf
-                                highlighted_paragraph = re.sub(
-                                    r'\b(' + re.escape(keyword) + r')\b', 
-                                    r'**\1**', 
-                                    paragraph, 
-                                    flags=re.IGNORECASE
-                                )
+                                spans = match_spans.get((file, idx))
+                                if spans:
+                                    # Posisi dari exact search, digeser ke awal kalimat di paragraf
+                                    sentence_store = as_sentence_store(st.session_state.split_texts.get(file, []))
+                                    offset = sum(len(sentence_store.get(i, "")) + 1
+                                                 for i in context_indices[:matched_position])
+                                    highlighted_paragraph = ExactMatcher.highlight(
+                                        paragraph, [(start + offset, end + offset) for start, end in spans]
+                                    )
+                                else:
+                                    highlighted_paragraph = re.sub(
+                                        r'\b(' + re.escape(keyword) + r')\b', 
+                                        r'**\1**', 
+                                        paragraph, 
+                                        flags=re.IGNORECASE
+                                    )
 
                                 # Tampilkan paragraf konteks
                                 st.write(f"**Konteks Paragraf:**")
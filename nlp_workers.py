@@ -0,0 +1,223 @@
+"""Fungsi worker proses untuk preprocessing NLP dan ingest dokumen.
+
+Dipakai oleh process pool di gabungan.py dan main.py. Modul ini sengaja
+tidak punya efek samping saat di-import (tanpa Streamlit, database,
+cache atau unduhan NLTK), karena setiap worker "spawn" meng-import modul
+ini. Fungsinya murni: stopwords dikirim sebagai argumen dan hasilnya
+hanya tipe bawaan, array numpy dan matrix scipy.
+"""
+
+import concurrent.futures
+import os
+import re
+import tempfile
+from functools import lru_cache
+
+import docx
+import fitz  # PyMuPDF untuk PDF
+import nltk
+import numpy as np
+from nltk.stem import PorterStemmer
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+TFIDF_DTYPE = np.float32  # Bobot TF-IDF dan IDF disimpan sebagai float32
+WORD_RUN_PATTERN = re.compile(r'\w+')  # Token index exact match, sama dengan batas \b pada regex
+PDF_PAGES_PER_CHUNK = 10  # Jumlah halaman per chunk saat ekstraksi PDF
+PDF_CHUNK_WORKERS = min(32, (os.cpu_count() or 1) + 4)  # Thread untuk chunk halaman PDF
+TEXT_ENCODINGS = ('utf-8', 'latin-1', 'windows-1252', 'ascii')  # Dicoba berurutan untuk file TXT
+SENTENCE_CHUNK_CHARS = 100000  # Dokumen lebih besar dipecah per chunk sebelum sent_tokenize
+
+_stemmer = PorterStemmer()
+
+# ===== INISIALISASI WORKER =====
+
+def init_worker():
+    """Muat model tokenizer NLTK sekali per worker, bukan pada kalimat pertama"""
+    try:
+        nltk.word_tokenize("warm up")
+    except Exception:
+        pass
+
+# ===== PREPROCESSING =====
+
+@lru_cache(maxsize=10000)
+def stem(word):
+    """Porter stem satu kata, di-cache per worker"""
+    if not word:
+        return ""
+    return _stemmer.stem(word)
+
+def word_runs(text):
+    """Token untuk index exact match: rangkaian karakter \\w dari teks lowercase"""
+    return WORD_RUN_PATTERN.findall(text.lower())
+
+def preprocess_sentence(sentence, stop_words):
+    """Preprocessing satu kalimat, sama dengan preprocessing query di aplikasi.
+
+    Returns:
+        tuple: (token tanpa stopword, token stemmed, jumlah kata kalimat asli)
+    """
+    tokens = nltk.word_tokenize(re.sub(r'[^\w\s]', '', sentence.lower()))
+    tokens_no_stop = [word for word in tokens if word not in stop_words]
+    return tokens_no_stop, [stem(word) for word in tokens_no_stop], len(sentence.split())
+
+def preprocess_sentences(sentences, stop_words):
+    """Tokenisasi, hapus stopword dan stemming untuk daftar (idx, kalimat)"""
+    processed_tokens = {}
+    for idx, sentence in sentences:
+        tokens_no_stop, stemmed_tokens, length = preprocess_sentence(sentence, stop_words)
+        processed_tokens[idx] = {
+            'tokens': tokens_no_stop,
+            'stemmed': stemmed_tokens,
+            'length': length
+        }
+    return processed_tokens
+
+def index_sentence_shard(file, sentences, stop_words):
+    """Preprocessing satu shard kalimat; hasil dikirim sebagai tuple ringkas.
+
+    Returns:
+        tuple: (file, [(idx, tokens, stemmed, panjang kalimat, token untuk inverted index)])
+    """
+    rows = []
+    for idx, sentence in sentences:
+        tokens_no_stop, stemmed_tokens, length = preprocess_sentence(sentence, stop_words)
+        rows.append((idx, tokens_no_stop, stemmed_tokens, length, word_runs(sentence)))
+    return file, rows
+
+def split_sentences(text):
+    """Membagi satu teks menjadi daftar (idx, kalimat)"""
+    if not text or len(text.strip()) == 0:
+        return []
+
+    if len(text) <= SENTENCE_CHUNK_CHARS:
+        return [(i + 1, sent) for i, sent in enumerate(nltk.sent_tokenize(text))]
+
+    # Dokumen besar diproses per chunk
+    all_sentences = []
+    for i, start in enumerate(range(0, len(text), SENTENCE_CHUNK_CHARS)):
+        chunk_sentences = nltk.sent_tokenize(text[start:start + SENTENCE_CHUNK_CHARS])
+        # Hitung offset untuk indeks kalimat
+        base_idx = i * 1000  # Asumsi max 1000 kalimat per chunk
+        all_sentences.extend((base_idx + j + 1, sent) for j, sent in enumerate(chunk_sentences))
+    return all_sentences
+
+# ===== TF-IDF =====
+
+def fit_tfidf(sentences, file_processed):
+    """Fit TF-IDF (setelan default TfidfVectorizer) pada token stemmed satu dokumen.
+
+    Returns:
+        tuple: (vocabulary {term: kolom}, vektor IDF, sentence idx per baris,
+            matrix CSR yang ter-normalisasi L2)
+    """
+    texts = []
+    row_ids = []
+    for idx, _ in sentences:
+        if idx in file_processed:
+            texts.append(" ".join(file_processed[idx]['stemmed']))
+            row_ids.append(idx)
+
+    vectorizer = TfidfVectorizer(dtype=TFIDF_DTYPE)
+    try:
+        matrix = vectorizer.fit_transform(texts).tocsr()
+    except ValueError:
+        # Tidak ada kalimat atau vocabulary kosong
+        return {}, np.zeros(0, dtype=TFIDF_DTYPE), row_ids, csr_matrix((len(texts), 0), dtype=TFIDF_DTYPE)
+
+    vocabulary = {term: int(column) for term, column in vectorizer.vocabulary_.items()}
+    return vocabulary, vectorizer.idf_.astype(TFIDF_DTYPE), row_ids, matrix
+
+# ===== EKSTRAKSI TEKS =====
+
+def _temporary_copy(data, suffix):
+    """Tulis data ke file sementara dan kembalikan path-nya"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_file.write(data)
+        return temp_file.name
+
+def extract_pdf_text(data):
+    """Ekstraksi teks PDF dengan chunking halaman untuk dokumen besar"""
+    temp_path = _temporary_copy(data, '.pdf')
+    try:
+        doc = fitz.open(temp_path)
+        try:
+            page_count = len(doc)
+
+            def process_chunk(start_idx, end_idx):
+                chunk_text = ""
+                for i in range(start_idx, min(end_idx, page_count)):
+                    try:
+                        chunk_text += doc[i].get_text("text")
+                    except Exception:
+                        # Skip halaman yg error
+                        pass
+                return chunk_text
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=PDF_CHUNK_WORKERS) as executor:
+                futures = [
+                    executor.submit(process_chunk, start, start + PDF_PAGES_PER_CHUNK)
+                    for start in range(0, page_count, PDF_PAGES_PER_CHUNK)
+                ]
+                return "".join(future.result() for future in futures)
+        finally:
+            doc.close()
+    finally:
+        os.unlink(temp_path)
+
+def extract_docx_text(data):
+    """Ekstraksi teks DOCX, satu baris per paragraf"""
+    temp_path = _temporary_copy(data, '.docx')
+    try:
+        doc = docx.Document(temp_path)
+        return "\n".join(para.text for para in doc.paragraphs if para.text)
+    finally:
+        os.unlink(temp_path)
+
+def extract_txt_text(data):
+    """Ekstraksi teks TXT, mencoba TEXT_ENCODINGS lalu UTF-8 dengan karakter pengganti"""
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+EXTRACTORS = {
+    "application/pdf": extract_pdf_text,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": extract_docx_text,
+    "text/plain": extract_txt_text,
+}
+
+# ===== INGEST =====
+
+def ingest_file(filename, mime_type, size, data, stop_words, content_hash=None):
+    """Worker proses: ekstraksi teks, pembagian kalimat, preprocessing dan TF-IDF satu file.
+
+    Returns:
+        dict: Record untuk writer database, atau {'filename', 'error'} jika gagal
+    """
+    extractor = EXTRACTORS.get(mime_type)
+    if extractor is None:
+        return {'filename': filename, 'error': f"Unsupported file type: {mime_type} for {filename}"}
+
+    try:
+        text = extractor(data)
+    except Exception as e:
+        return {'filename': filename, 'error': f"Could not extract text from {filename}: {str(e)}"}
+    if not text:
+        return {'filename': filename, 'error': f"Could not extract text from {filename}"}
+
+    sentences = split_sentences(text)
+    processed_sentences = preprocess_sentences(sentences, stop_words)
+    return {
+        'filename': filename,
+        'content': text,
+        'size': size,
+        'filetype': mime_type.split("/")[-1],
+        'content_hash': content_hash,
+        'sentences': sentences,
+        'processed_sentences': processed_sentences,
+        'tfidf_model': fit_tfidf(sentences, processed_sentences)
+    }
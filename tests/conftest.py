@@ -0,0 +1,24 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def load_script(tmp_path, monkeypatch):
+    """Execute an app script as a fresh module, like a Streamlit rerun does"""
+    monkeypatch.chdir(tmp_path)  # Database dan file lain dari skrip ditulis di sini
+
+    def load(script, module_name):
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, script))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    return load
@@ -0,0 +1,28 @@
+"""Streamlit re-executes the app script on every rerun, so indexes built in
+an earlier run are instances of a different PostingsIndex class object."""
+
+import numpy as np
+import pytest
+
+from nlp_workers import word_runs
+
+
+@pytest.mark.parametrize("script", ["gabungan.py", "main.py"])
+def test_candidates_from_index_built_by_previous_run(script, load_script):
+    first_run = load_script(script, "first_run")
+    rerun = load_script(script, "rerun")
+    assert first_run.PostingsIndex is not rerun.PostingsIndex
+
+    sentences = [
+        (1, "The quick brown fox jumps over the lazy dog."),
+        (2, "A brown dog sleeps."),
+        (3, "Quick thinking saves the day."),
+    ]
+    file_index = first_run.PostingsIndex.build(
+        (idx, word_runs(sentence)) for idx, sentence in sentences
+    )
+
+    candidates = rerun.exact_match_candidates(file_index, "brown fox", ["brown", "fox"])
+
+    assert candidates is not None
+    np.testing.assert_array_equal(candidates, [1])
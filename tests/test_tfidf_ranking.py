@@ -0,0 +1,34 @@
+"""TfidfIndex stores float32 weights; near-equal scores must rank in document order."""
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+
+@pytest.fixture
+def gabungan(load_script):
+    return load_script("gabungan.py", "gabungan_under_test")
+
+
+def test_tied_scores_keep_document_order(gabungan):
+    index = gabungan.TfidfIndex({}, np.zeros(0, dtype=np.float32),
+                                np.array([10, 20, 30, 40, 50], dtype=np.int32),
+                                csr_matrix((5, 0), dtype=np.float32))
+    rows = np.arange(5)
+    # Baris 1, 2 dan 4 hanya berbeda di bawah presisi float32
+    scores = np.array([0.2, 0.5, 0.5 + 3e-8, 0.7, 0.5 - 3e-8], dtype=np.float32)
+
+    ranked = index._ranked(rows, scores, 3, gabungan.TFIDF_THRESHOLD)
+    assert [idx for idx, _ in ranked] == [40, 20, 30]
+
+    ranked = index._ranked(rows, scores, 5, gabungan.TFIDF_THRESHOLD)
+    assert [idx for idx, _ in ranked] == [40, 20, 30, 50, 10]
+
+
+def test_identical_sentences_rank_in_document_order(gabungan):
+    sentences = [(1, "apple pie"), (2, "apple pie"), (3, "banana"), (4, "apple pie")]
+    processed = {idx: {'stemmed': sentence.split()} for idx, sentence in sentences}
+    index = gabungan.TfidfIndex.from_processed(sentences, processed)
+
+    assert [idx for idx, _ in index.top_k("apple", 2)] == [1, 2]
+    assert [idx for idx, _ in index.top_k("apple", 10)] == [1, 2, 4]